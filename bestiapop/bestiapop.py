@@ -60,14 +60,15 @@ from tqdm import tqdm
 # or from the source directory as `python bestiapop.py`
 if "bestiapop" in sys.modules:
     from .connectors import (silo_connector, nasapower_connector)
-    from .common import bestiapop_utils
+    from .common import (bestiapop_utils, block_cache, climate_grid, decoded_grid_cache, rate_limiter, rechunked_store, response_cache, update_manifest, valid_cell_mask)
     from .producers import output
 else:
     from connectors import (silo_connector, nasapower_connector)
-    from common import bestiapop_utils
+    from common import (bestiapop_utils, block_cache, climate_grid, decoded_grid_cache, rate_limiter, rechunked_store, response_cache, update_manifest, valid_cell_mask)
     from producers import output
 
 from datetime import datetime as datetime
+from datetime import date
 from numpy import array
 from pathlib import Path
 
@@ -85,9 +86,9 @@ class Arguments():
 
         self.parser.add_argument(
             "-a", "--action",
-            help="The type of operation to want to perform: download-nc4-file (it will only download a particular NetCDF4 file from the cloud to your local disk, the source can be specified with the --data-source parameter), convert-nc4 (it will only convert a local or cloud file from NC4/HDF5 format to the output format specified with --output-type), generate-climate-file (the default action, it will generate a particular climate file like MET (for APSIM) or WTH (for DSSAT) using the parameters passed in as years, climate variable, etc.)",
+            help="The type of operation to want to perform: download-nc4-file (it will only download a particular NetCDF4 file from the cloud to your local disk, the source can be specified with the --data-source parameter), convert-nc4 (it will only convert a local or cloud file from NC4/HDF5 format to the output format specified with --output-type), generate-climate-file (the default action, it will generate a particular climate file like MET (for APSIM) or WTH (for DSSAT) using the parameters passed in as years, climate variable, etc.), rechunk-store (it will convert the SILO NetCDF4 files found in the input directory into a point-major store, saved to a ""bpop-store"" folder inside the input directory, which is much faster to read when generating climate files. The store covers the years, climate variables and lat/lon bounding box passed in)",
             type=str,
-            choices=["download-nc4-file", "convert-nc4", "generate-climate-file"],
+            choices=["download-nc4-file", "convert-nc4", "generate-climate-file", "rechunk-store"],
             default="generate-climate-file",
             required=True
         )
@@ -120,7 +121,7 @@ class Arguments():
 
         self.parser.add_argument(
             "-cf", "--coordinates-file",
-            help="A CSV file containing two columns: first one with a single latitude value, and the second one with a single longitude value. BestiaPop will iterate over these combinations.",
+            help="A CSV file containing two columns: first one with a single latitude value, and the second one with a single longitude value (e.g. the coordinates of weather stations). Each combination is snapped to the grid cell of the data source it falls in, every distinct grid cell is extracted only once and one output is then generated for each of the original combinations.",
             type=self.extract_coord_from_file,
             default=None,
             required=False
@@ -156,6 +157,126 @@ class Arguments():
             required=False
         )
 
+        self.parser.add_argument(
+            "-lz", "--lazy",
+            help="This switch will open all the NetCDF4 files required by ""generate-climate-file"" as a single lazy dataset backed by Dask, extracting all the values with a single computation that runs in parallel on a pool of threads. It requires ""-i"" and the ""dask"" package, and replaces the ""-m"" switch when both are used.",
+            action="store_true",
+            required=False
+        )
+
+        self.parser.add_argument(
+            "-up", "--update",
+            help="This switch will update the MET, WTH or CSV files already present in the output directory instead of generating them again. Only the days after the last day contained in the files are extracted (when extracting from the cloud, only those days are requested from the API), and they are appended to the files. The last day of every file is recorded in a ""bpop-update-manifest"" file inside the output directory. Climate files that do not exist yet are generated in full. This switch replaces the ""-m"" switch when both are used.",
+            action="store_true",
+            required=False
+        )
+
+        self.parser.add_argument(
+            "-gc", "--grid-cache",
+            help="This switch will decode every NetCDF4 file read from the input directory only once, into an uncompressed file saved to a ""bpop-grid-cache"" folder inside the input directory. Subsequent reads (by other worker processes when using ""-m"", by every lat/lon combination of a coordinates file or by later runs) map that file read-only instead of decompressing the NetCDF4 file again. Note that decoded files are much larger than the original NetCDF4 files.",
+            action="store_true",
+            required=False
+        )
+
+        self.parser.add_argument(
+            "-ac", "--api-concurrency",
+            help="The maximum number of requests that will be sent to SILO's or NASA POWER's API at the same time when generating climate files from the cloud. Defaults to 8. Use 1 to query one lat/lon combination at a time. With ""-m"", this limit is shared by all the worker processes.",
+            type=int,
+            default=8,
+            required=False
+        )
+
+        self.parser.add_argument(
+            "-af", "--api-format",
+            help="The format SILO's API is asked to return data in when generating climate files from the cloud. ""csv"" payloads are several times smaller than ""json"" ones and are faster to parse. Defaults to ""json"".",
+            type=str,
+            choices=["json", "csv"],
+            default="json",
+            required=False
+        )
+
+        self.parser.add_argument(
+            "-dc", "--download-concurrency",
+            help="The maximum number of NetCDF4 files downloaded at the same time by the download-nc4-file action when the ""-m"" switch is used. Interrupted downloads are resumed the next time the same files are requested. Defaults to 4.",
+            type=int,
+            default=4,
+            required=False
+        )
+
+        self.parser.add_argument(
+            "-ds", "--download-segments",
+            help="The maximum number of connections used to download each NetCDF4 file by the download-nc4-file action. Large files are split into byte ranges downloaded in parallel and verified against the size and ETag announced by the server. Use 1 to download each file over a single connection. Defaults to 4.",
+            type=int,
+            default=4,
+            required=False
+        )
+
+        self.parser.add_argument(
+            "-am", "--api-mode",
+            help="How grid cells are requested from NASA POWER's API when generating climate files from the cloud. ""point"" requests each grid cell on its own, ""regional"" requests bounding boxes of up to 10 by 10 degrees at once, which replaces hundreds of requests with a handful of them when extracting large areas. Defaults to ""point"".",
+            type=str,
+            choices=["point", "regional"],
+            default="point",
+            required=False
+        )
+
+        self.parser.add_argument(
+            "-cs", "--cloud-source",
+            help="Where SILO data is read from when generating climate files from the cloud. ""api"" uses SILO's API, ""s3"" reads the values straight out of SILO's NetCDF4 files in S3, fetching only the chunks covering the requested coordinates with parallel range requests. The chunks of every file are indexed once and the index is kept in the "".bestiapop"" folder of the user's home directory. Defaults to ""api"".",
+            type=str,
+            choices=["api", "s3"],
+            default="api",
+            required=False
+        )
+
+        self.parser.add_argument(
+            "-s3e", "--s3-endpoint-url",
+            help="The URL of the S3 service holding SILO's NetCDF4 files when ""-cs s3"" is used, to read them from a mirror or an S3 compatible service (e.g. MinIO) instead of Amazon S3. Example: -s3e ""http://localhost:9000"".",
+            type=str,
+            default=None,
+            required=False
+        )
+
+        self.parser.add_argument(
+            "-bcs", "--block-cache-size",
+            help="The maximum amount of memory, in megabytes, used to cache the blocks of the NetCDF4 files read from S3 when ""-cs s3"" is used. Blocks are shared by all the points and variables of a run, so that the same bytes are only fetched once. Use 0 to disable the in-memory cache. Defaults to 256.",
+            type=float,
+            default=256,
+            required=False
+        )
+
+        self.parser.add_argument(
+            "-bcd", "--block-cache-dir",
+            help="A folder (ideally on a local SSD) where the blocks of the NetCDF4 files read from S3 are also cached, so that they are reused by later runs. Up to 10 GB are used, the least recently used blocks are removed first. Example: -bcd ""C:\\Temp\\bpop-blocks"". Defaults to None (blocks are only cached in memory).",
+            type=str,
+            default=None,
+            required=False
+        )
+
+        self.parser.add_argument(
+            "-arl", "--api-rate-limit",
+            help="The average number of requests per second that will be sent to SILO's or NASA POWER's API by BestiaPop when generating climate files from the cloud. With ""-m"", this rate and the number of requests in flight (""-ac"") are shared by all the worker processes. Failed requests are retried with an exponential backoff and the number of requests in flight is reduced automatically when the API starts throttling. Defaults to 10. Use 0 to disable rate limiting.",
+            type=float,
+            default=10,
+            required=False
+        )
+
+        self.parser.add_argument(
+            "-rct", "--response-cache-ttl",
+            help="The amount of hours the payloads returned by SILO's or NASA POWER's API are kept in a local cache (inside a "".bestiapop"" folder in your home directory) and re-used instead of being downloaded again. Example: -rct 168 (one week). Cached payloads do not contain the days published (or revised) after they were downloaded, so a run can return data up to this amount of hours old. Defaults to 0 (the cache is disabled).",
+            type=float,
+            default=0,
+            required=False
+        )
+
+        self.parser.add_argument(
+            "-rcs", "--response-cache-size",
+            help="The maximum amount of disk space, in megabytes, used by the API response cache. When the cache grows above this size, the least recently used payloads are removed. Defaults to 1024.",
+            type=float,
+            default=1024,
+            required=False
+        )
+
         self.parser.add_argument(
             "-o", "--output-directory",
             help="This argument is required and represents the directory that we will use to (a) save any output (MET, CSV, etc.) when you are generating a climate file or (b) save files converted from NetCDF4 format to CSV or MET. If no folder is passed in, the current directory is assumed to the right directory. Examples: (1) download files to a local disk: -o ""C:\\some\\folder\\path""",
@@ -179,6 +300,8 @@ class Arguments():
         #TODO check why we are getting error with the following line activated.
         #self.logger.info("A file has been provided with coordinate values, processing it...")
         coordinate_list_table = pd.read_csv(file, names=['lat', 'lon'])
+        # Rows that are not numeric (like a "lat,lon" header) are dropped
+        coordinate_list_table = coordinate_list_table.apply(pd.to_numeric, errors='coerce').dropna()
         coordinate_list_array = [[row.lat, row.lon] for i, row in coordinate_list_table.iterrows()]
         return coordinate_list_array
 
@@ -206,7 +329,7 @@ class CLIMATEBEAST():
 
         Args:
             logger (str): A pointer to an initialized Argparse logger
-            action (str): the type of action to be performed by BestiaPop. Available choices are: download-nc4-file (it will only download a particular NetCDF4 file from the cloud to your local disk, the source can be specified with the --data-source parameter), convert-nc4 (it will only convert a local or cloud file from NC4/HDF5 format to the output format specified with --output-type), generate-climate-file (the default action, it will generate a particular climate file like MET (for APSIM) or WTH (for DSSAT) using the parameters passed in as years, climate variable, etc.)
+            action (str): the type of action to be performed by BestiaPop. Available choices are: download-nc4-file (it will only download a particular NetCDF4 file from the cloud to your local disk, the source can be specified with the --data-source parameter), convert-nc4 (it will only convert a local or cloud file from NC4/HDF5 format to the output format specified with --output-type), generate-climate-file (the default action, it will generate a particular climate file like MET (for APSIM) or WTH (for DSSAT) using the parameters passed in as years, climate variable, etc.), rechunk-store (it will convert local SILO NetCDF4 files into a point-major store that generate-climate-file reads from when it is found in the input directory)
             data_source (str): the source database for the climate data: SILO (Australia only) or NASAPOWER (world wide)
             input_path (str): if the NetCDF files to be processed are stored locally, this path will be used to look for all the files required to extract data from the different year, latitude and longitude ranges
             output_path (str): the path where generated output files will be stored
@@ -216,12 +339,27 @@ class CLIMATEBEAST():
             lat_range (str): a start and end latitude separated by a "space", example: "-41.15 -41.05". This string gets broken down into numpy.ndarray array afterwards. 
             lon_range (str): a start and end latitude separated by a "space", example: "145.5 145.6". This string gets broken down into numpy.ndarray array afterwards.
             multiprocessing (bool): a switch that tells BestiaPop to process records using parallel computing with python's multiprocessing module.
+            lazy (bool, optional): a switch that tells BestiaPop to open all the local NetCDF4 files as a single lazy Dask-backed dataset and extract the values in parallel. Defaults to False.
+            grid_cache (bool, optional): a switch that tells BestiaPop to decode local NetCDF4 files once into a "bpop-grid-cache" folder inside the input directory and to read them from there, see DecodedGridCache. Defaults to False.
+            api_concurrency (int, optional): the maximum number of requests sent to SILO's or NASA POWER's API at the same time when data is fetched from the cloud. Defaults to 8.
+            response_cache_ttl (float, optional): the amount of hours the payloads returned by the APIs are kept in the local response cache, see APIResponseCache. Use 0 to disable the cache. Defaults to 0 (the cache is disabled).
+            response_cache_size (float, optional): the maximum size of the local response cache in megabytes. Defaults to 1024.
+            api_format (str, optional): the format SILO's API is asked to return data in: "json" or "csv". Defaults to "json".
+            api_rate_limit (float, optional): the average amount of requests per second sent to SILO's or NASA POWER's API, see AdaptiveRateLimiter. Use 0 to disable rate limiting. Defaults to 10.
+            api_mode (str, optional): how grid cells are requested from NASA POWER's API: "point" or "regional", see NASAPowerClimateDataConnector.get_regional_tiles. Defaults to "point".
+            cloud_source (str, optional): where SILO data is read from when no input directory is provided: "api" (SILO's API) or "s3" (SILO's NetCDF4 files in S3, see ChunkReferenceReader). Defaults to "api".
+            s3_endpoint_url (str, optional): the URL of the S3 service holding SILO's NetCDF4 files. Defaults to None (Amazon S3).
+            block_cache_size (float, optional): the maximum amount of memory, in megabytes, used to cache the blocks of SILO's NetCDF4 files read from S3, see BlockCache. Use 0 to disable the in-memory cache. Defaults to 256.
+            block_cache_dir (str, optional): the folder where the blocks of SILO's NetCDF4 files read from S3 are also cached on disk. Defaults to None (blocks are only cached in memory).
+            download_concurrency (int, optional): the maximum number of NetCDF4 files downloaded at the same time by the download-nc4-file action in parallel mode, see DownloadManager. Defaults to 4.
+            download_segments (int, optional): the maximum number of connections used to download each NetCDF4 file by the download-nc4-file action, see DownloadManager.download_file_segmented. Defaults to 4.
+            update (bool, optional): a switch that tells BestiaPop to update the MET, WTH or CSV files already present in the output directory with the days after their last day, instead of generating them again, see UpdateManifest. Defaults to False.
 
         Returns:
             CLIMATEBEAST: A class object with access to CLIMATEBEAST methods
     """
 
-    def __init__(self, action, data_source, output_path, output_type, input_path, climate_variables, year_range, lat_range, lon_range, multiprocessing, logger=None):
+    def __init__(self, action, data_source, output_path, output_type, input_path, climate_variables, year_range, lat_range, lon_range, multiprocessing, logger=None, lazy=False, grid_cache=False, api_concurrency=8, response_cache_ttl=0, response_cache_size=1024, api_format="json", api_rate_limit=10, update=False, api_mode="point", download_concurrency=4, download_segments=4, cloud_source="api", s3_endpoint_url=None, block_cache_size=256, block_cache_dir=None):
 
         if logger == None:
             # Setup logging
@@ -253,6 +391,20 @@ class CLIMATEBEAST():
         # Initializing variables
         # For parallel multiprocessing
         self.multiprocessing = multiprocessing
+        self.lazy = lazy
+        self.api_concurrency = api_concurrency
+        self.response_cache_ttl = response_cache_ttl
+        self.response_cache_size = response_cache_size
+        self.api_format = api_format
+        self.api_rate_limit = api_rate_limit
+        self.api_mode = api_mode
+        self.download_concurrency = download_concurrency
+        self.download_segments = download_segments
+        self.cloud_source = cloud_source
+        self.s3_endpoint_url = s3_endpoint_url
+        self.block_cache_size = block_cache_size
+        self.block_cache_dir = block_cache_dir
+        self.update = update
         self.total_parallel_climate_df = pd.DataFrame()
         self.final_parallel_lon_range = np.empty(0)
 
@@ -266,6 +418,12 @@ class CLIMATEBEAST():
             self.input_path = Path(input_path)
         else:
             self.input_path = None
+
+        # Folder used to cache decoded NetCDF4 grids, next to the NetCDF4 files themselves
+        self.grid_cache_dir = None
+        if grid_cache == True and self.input_path is not None:
+            input_folder = self.input_path if self.input_path.is_dir() == True else self.input_path.parent
+            self.grid_cache_dir = input_folder/decoded_grid_cache.DecodedGridCache.cache_folder_name
             
         # Avoid capturing output path if output type is dataframe:
         if self.output_type == 'dataframe':
@@ -301,6 +459,30 @@ class CLIMATEBEAST():
             self.outputdir = None
             pass
 
+    def get_response_cache(self):
+        """Create the cache used to store the payloads returned by the climate APIs
+
+        Returns:
+            APIResponseCache: the response cache, or None if it was disabled
+        """
+
+        if not self.response_cache_ttl or self.response_cache_ttl <= 0:
+            return None
+
+        return response_cache.APIResponseCache(ttl_hours=self.response_cache_ttl, max_size_mb=self.response_cache_size)
+
+    def get_block_cache(self):
+        """Create the cache used to store the blocks of the NetCDF4 files read from S3
+
+        Returns:
+            BlockCache: the block cache, or None if it was disabled (no memory and no folder assigned to it)
+        """
+
+        if (not self.block_cache_size or self.block_cache_size <= 0) and self.block_cache_dir is None:
+            return None
+
+        return block_cache.BlockCache(max_memory_mb=max(0, self.block_cache_size or 0), disk_dir=self.block_cache_dir)
+
     def process_parallel_records(self, action):
         """Perform selected actions on NetCDF4 file in parallel mode 
 
@@ -309,12 +491,24 @@ class CLIMATEBEAST():
         """
 
         # Creating instances of required BestiaPop classes
-        self.beastutils = bestiapop_utils.MyUtilityBeast(input_path=self.input_path)
+        self.beastutils = bestiapop_utils.MyUtilityBeast(input_path=self.input_path, grid_cache_dir=self.grid_cache_dir)
 
         # Let's check what's inside the "action" variable and invoke the corresponding function
         if action == "download-nc4-file":
-            # TODO
-            self.logger.info("Parallel Computing for {} not implemented yet".format(action))
+            self.logger.info('Action {} invoked'.format(action))
+
+            # Files are downloaded concurrently by threads, since the work is bound by the network rather than the CPU
+            if self.data_source == "silo":
+                self.logger.info('Downloading SILO NetCDF4 files for years {} to {}, {} files at a time over up to {} connections each'.format(self.year_range[0], self.year_range[-1], self.download_concurrency, self.download_segments))
+                self.beastutils.download_nc4_files_from_cloud(self.year_range, self.climate_variables, self.outputdir, self.data_source, max_concurrency=self.download_concurrency, segments=self.download_segments)
+
+            if self.data_source == "nasapower":
+                self.logger.info('Downloading NASAPOWER NetCDF4 file not implemented yet')
+
+        elif action == "rechunk-store":
+            # The store is written as a single set of memory mapped arrays, so it is generated sequentially
+            self.logger.info("Action {} does not run in parallel, generating the store sequentially".format(action))
+            self.process_records(action)
 
         elif action == "convert-nc4":
             # TODO
@@ -364,7 +558,14 @@ class CLIMATEBEAST():
 
                 multiproc_manager = mp.Manager()
                 self.multiproc_event = multiproc_manager.Event()
-                worker_pool = mp.Pool(mp.cpu_count())
+
+                # When data is fetched from an API, all the workers draw from a single rate and concurrency
+                # budget kept in shared memory, instead of each one of them sending its own amount of requests
+                shared_limiter_states = {}
+                if self.input_path is None:
+                    shared_limiter_states[self.data_source] = rate_limiter.AdaptiveRateLimiter.create_process_shared_state(requests_per_second=self.api_rate_limit, max_concurrency=self.api_concurrency)
+
+                worker_pool = mp.Pool(mp.cpu_count(), initializer=rate_limiter.AdaptiveRateLimiter.set_process_shared_states, initargs=(shared_limiter_states,))
                 worker_jobs = worker_pool.map_async(self.process_parallel_met, parallel_var_range)
                 worker_pool.close()
                 #worker_pool.join() # block until all processes have finished
@@ -432,7 +633,11 @@ class CLIMATEBEAST():
                     silo = silo_connector.SILOClimateDataConnector(
                         climate_variables=self.climate_variables,
                         data_source=self.data_source,
-                        input_path=self.input_path
+                        input_path=self.input_path,
+                        api_concurrency=self.api_concurrency,
+                        response_cache=self.get_response_cache(),
+                        api_format=self.api_format,
+                        api_rate_limit=self.api_rate_limit
                     )
 
                     if self.parallel_var == "lat":
@@ -458,7 +663,11 @@ class CLIMATEBEAST():
                     nasapower = nasapower_connector.NASAPowerClimateDataConnector(
                         climate_variables=self.climate_variables,
                         data_source=self.data_source,
-                        input_path=self.input_path
+                        input_path=self.input_path,
+                        api_concurrency=self.api_concurrency,
+                        response_cache=self.get_response_cache(),
+                        api_rate_limit=self.api_rate_limit,
+                        api_mode=self.api_mode
                     )
 
                     if self.parallel_var == "lat":
@@ -524,11 +733,14 @@ class CLIMATEBEAST():
             print("\x1b[47m \x1b[32mYou scared away the PopBeast. Parallel processing interrupted\x1b[0m \x1b[39m" + "\n")
             self.multiproc_event.set()
 
-    def process_records(self, action):
+    def process_records(self, action, coordinate_aliases=None, manifest=None, block_cache=None):
         """Processing records for non-parallel computing
 
         Args:
             action (str): the type of action to be performed as per `bestiapop -a` parameter
+            coordinate_aliases (dict, optional): a dictionary where keys are (lat, lon) tuples of grid cells and values are lists of (lat, lon) tuples of the stations that were snapped to each cell, see `DATAOUTPUT.generate_output`. Defaults to None.
+            manifest (UpdateManifest, optional): the manifest of the output directory, used when updating existing climate files. It is saved by the caller, which allows several calls to share it. Defaults to None (the manifest is loaded and saved by this function).
+            block_cache (BlockCache, optional): the cache the NetCDF4 files read from S3 go through, which allows several calls to share it. Defaults to None (a new cache is created, see get_block_cache).
         """
 
         # Let's check what's inside the "action" variable and invoke the corresponding function
@@ -539,10 +751,9 @@ class CLIMATEBEAST():
             beastutils = bestiapop_utils.MyUtilityBeast(input_path=self.input_path)
 
             if self.data_source == "silo":
-                for year in self.year_range:
-                    for variable in self.climate_variables:
-                        self.logger.info('Downloading SILO NetCDF4 file for year {}'.format(year))
-                        beastutils.download_nc4_file_from_cloud(year, variable, self.outputdir)
+                # Files are downloaded one at a time (each one still over several connections), see process_parallel_records to download several at once
+                self.logger.info('Downloading SILO NetCDF4 files for years {} to {}'.format(self.year_range[0], self.year_range[-1]))
+                beastutils.download_nc4_files_from_cloud(self.year_range, self.climate_variables, self.outputdir, self.data_source, max_concurrency=1, segments=self.download_segments)
 
             if self.data_source == "nasapower":
                 for year in self.year_range:
@@ -561,28 +772,110 @@ class CLIMATEBEAST():
             if self.output_type == "json":
                 self.logger.info('Action {} not implemented yet'.format(action))
 
+        elif action == "rechunk-store":
+            self.logger.info('Action {} invoked'.format(action))
+
+            if self.data_source != "silo":
+                self.logger.error('Action {} is only available for SILO NetCDF4 files'.format(action))
+                return
+
+            if self.input_path is None or self.input_path.is_dir() == False:
+                self.logger.error('Action {} requires an input directory (-i) containing the SILO NetCDF4 files in the format "year.variable.nc"'.format(action))
+                return
+
+            # The store is written inside the input directory, which is where generate-climate-file looks for it
+            store = rechunked_store.RechunkedClimateStore(
+                store_path=self.input_path/rechunked_store.RechunkedClimateStore.store_folder_name,
+                data_source=self.data_source
+            )
+
+            store.create_store(
+                input_dir=self.input_path,
+                year_range=self.year_range,
+                climate_variables=self.climate_variables,
+                lat_range=self.lat_range,
+                lon_range=self.lon_range
+            )
+
         elif action == "generate-climate-file":    
             self.logger.info('Extracting data and converting to {} format'.format(self.output_type))
 
             # Creating instances of required BestiaPop classes
-            beastutils = bestiapop_utils.MyUtilityBeast(input_path=self.input_path)
+            # Blocks of the NetCDF4 files read from S3 are cached for all the points and variables of the run
+            if block_cache is None and self.input_path is None and self.cloud_source == "s3":
+                block_cache = self.get_block_cache()
+
+            beastutils = bestiapop_utils.MyUtilityBeast(input_path=self.input_path, grid_cache_dir=self.grid_cache_dir, s3_endpoint_url=self.s3_endpoint_url, block_cache=block_cache)
+            self.data_output = output.DATAOUTPUT(self.data_source)
+
+            # When updating existing climate files, only the days after the
+            # last day contained in all of them need to be extracted
+            start_date = None
+            year_range = self.year_range
+            save_manifest = False
+
+            if self.update == True and self.output_type not in ["met", "wth", "csv"]:
+                self.logger.warning('Only MET, WTH and CSV files can be updated, all days will be extracted')
+                manifest = None
+
+            elif self.update == True:
+                if manifest is None:
+                    manifest = update_manifest.UpdateManifest(self.outputdir, self.data_source)
+                    manifest.load()
+                    save_manifest = True
+
+                cell_mask = valid_cell_mask.ValidCellMask(self.data_source)
+                cell_mask.load()
+
+                start_date = self.data_output.get_update_start_date(self.outputdir, self.output_type, self.lat_range, self.lon_range, manifest, coordinate_aliases, cell_mask)
+
+                if start_date is not None:
+                    # Data for the current day is never available yet
+                    if start_date >= date.today():
+                        self.logger.info('Climate files are already up to date')
+                        return
+
+                    self.logger.info('Updating climate files with the days from {}'.format(start_date))
+                    year_range = np.array([x for x in self.year_range if x >= start_date.year])
+
+                    if len(year_range) == 0:
+                        self.logger.info('Climate files already contain all the years requested')
+                        return
+
+            else:
+                manifest = None
 
             # 1. Let's invoke generate_climate_dataframe with the appropriate options
-            if self.input_path is None:
+            if self.input_path is None and self.data_source == "silo" and self.cloud_source == "s3":
+                # The NetCDF4 files are read straight from S3, the same way local files are read
+                final_df_latlon_tuple_list = beastutils.generate_climate_dataframe_from_disk(
+                    year_range=year_range,
+                    climate_variables=self.climate_variables, 
+                    lat_range=self.lat_range,
+                    lon_range=self.lon_range,
+                    input_dir=self.input_path,
+                    data_source=self.data_source
+                )
+            elif self.input_path is None:
                 if self.data_source == "silo":
                     # Initialize BestiaPop required class instances
                     silo = silo_connector.SILOClimateDataConnector(
                         climate_variables=self.climate_variables,
                         data_source=self.data_source,
-                        input_path=self.input_path
+                        input_path=self.input_path,
+                        api_concurrency=self.api_concurrency,
+                        response_cache=self.get_response_cache(),
+                        api_format=self.api_format,
+                        api_rate_limit=self.api_rate_limit
                     )
 
                     final_df_latlon_tuple_list = silo.generate_climate_dataframe_from_silo_cloud_api(
-                        year_range=self.year_range,
+                        year_range=year_range,
                         climate_variables=self.climate_variables, 
                         lat_range=self.lat_range,
                         lon_range=self.lon_range,
-                        input_dir=self.input_path
+                        input_dir=self.input_path,
+                        start_date=start_date
                     )
 
                 elif self.data_source == "nasapower":
@@ -591,18 +884,32 @@ class CLIMATEBEAST():
                         climate_variables=self.climate_variables,
                         data_source=self.data_source,
                         input_path=self.input_path,
+                        api_concurrency=self.api_concurrency,
+                        response_cache=self.get_response_cache(),
+                        api_rate_limit=self.api_rate_limit,
+                        api_mode=self.api_mode
                     )
 
                     final_df_latlon_tuple_list = nasapower.generate_climate_dataframe_from_nasapower_cloud_api(
-                        year_range=self.year_range,
+                        year_range=year_range,
                         climate_variables=self.climate_variables, 
                         lat_range=self.lat_range,
                         lon_range=self.lon_range,
-                        input_dir=self.input_path
+                        input_dir=self.input_path,
+                        start_date=start_date
                     )
+            elif self.lazy == True:
+                final_df_latlon_tuple_list = beastutils.generate_climate_dataframe_from_lazy_dataset(
+                    year_range=year_range,
+                    climate_variables=self.climate_variables, 
+                    lat_range=self.lat_range,
+                    lon_range=self.lon_range,
+                    input_dir=self.input_path,
+                    data_source=self.data_source
+                )
             else:
                 final_df_latlon_tuple_list = beastutils.generate_climate_dataframe_from_disk(
-                    year_range=self.year_range,
+                    year_range=year_range,
                     climate_variables=self.climate_variables, 
                     lat_range=self.lat_range,
                     lon_range=self.lon_range,
@@ -611,17 +918,26 @@ class CLIMATEBEAST():
 
 
             # 2. Generate Output
-            # Obtain an instance of the DATAOUTPUT class
-            self.data_output = output.DATAOUTPUT(self.data_source)
             self.total_climate_met_df = final_df_latlon_tuple_list[0]
             self.final_lon_range = final_df_latlon_tuple_list[1]
+
+            # There may be no new days yet when updating
+            if manifest is not None and self.total_climate_met_df.empty == True:
+                self.logger.info('There are no new days to add to the climate files')
+                return
+
             data_results = self.data_output.generate_output(
                 final_daily_df=self.total_climate_met_df,
                 lat_range=self.lat_range,
                 lon_range=self.final_lon_range,
                 outputdir=self.outputdir,
-                output_type=self.output_type
+                output_type=self.output_type,
+                coordinate_aliases=coordinate_aliases,
+                update_manifest=manifest
             )
+
+            if save_manifest == True and manifest.modified == True:
+                manifest.save()
             
             # Return dataframe if this was the selected output
             # (it can only be run when running as package since it's not an option in the commandline)
@@ -675,8 +991,29 @@ def main():
     
     try:
         if coordinates_range:
-            # Iterate over range of lat/lon
-            for coord in tqdm(coordinates_range):
+            # Snap all the lat/lon combinations to the grid of the data source in a single step,
+            # so that combinations (stations) sharing a grid cell only require one extraction
+            grid = climate_grid.ClimateGrid(pargs.data_source)
+            station_coordinates = np.array(coordinates_range, dtype=float)
+            cell_lats, cell_lons, cell_positions = grid.get_unique_cells(station_coordinates[:, 0], station_coordinates[:, 1])
+            logger.info("{} lat/lon combinations were snapped to {} distinct grid cells".format(len(station_coordinates), len(cell_lats)))
+
+            coordinates_manifest = None
+            if pargs.update == True:
+                coordinates_manifest = update_manifest.UpdateManifest(pargs.output_directory, pargs.data_source)
+                coordinates_manifest.load()
+
+            # All the grid cells read the same NetCDF4 files from S3, so they share a single block cache
+            # (created along with the first CLIMATEBEAST instance)
+            coordinates_block_cache = None
+
+            # Iterate over the distinct grid cells
+            for cell_position in tqdm(range(len(cell_lats))):
+                cell_lat = cell_lats[cell_position]
+                cell_lon = cell_lons[cell_position]
+                # The original lat/lon combinations that fall in this grid cell (without duplicates)
+                cell_stations = list(dict.fromkeys((float(x[0]), float(x[1])) for x in station_coordinates[cell_positions == cell_position]))
+
                 # Grab an instance of the CLIMATEBEAST class
                 myclimatebeast = CLIMATEBEAST(
                                     action=pargs.action,
@@ -686,15 +1023,36 @@ def main():
                                     input_path=pargs.input_directory,
                                     climate_variables=pargs.climate_variable,
                                     year_range=pargs.year_range,
-                                    lat_range=[coord[0]],
-                                    lon_range=[coord[1]],
+                                    lat_range=[cell_lat],
+                                    lon_range=[cell_lon],
                                     multiprocessing=pargs.multiprocessing,
-                                    logger=logger)
+                                    logger=logger,
+                                    lazy=pargs.lazy,
+                                    grid_cache=pargs.grid_cache,
+                                    api_concurrency=pargs.api_concurrency,
+                                    response_cache_ttl=pargs.response_cache_ttl,
+                                    response_cache_size=pargs.response_cache_size,
+                                    api_format=pargs.api_format,
+                                    api_rate_limit=pargs.api_rate_limit,
+                                    update=pargs.update,
+                                    api_mode=pargs.api_mode,
+                                    download_concurrency=pargs.download_concurrency,
+                                    download_segments=pargs.download_segments,
+                                    cloud_source=pargs.cloud_source,
+                                    s3_endpoint_url=pargs.s3_endpoint_url,
+                                    block_cache_size=pargs.block_cache_size,
+                                    block_cache_dir=pargs.block_cache_dir)
+                if coordinates_block_cache is None and pargs.input_directory is None and pargs.cloud_source == "s3":
+                    coordinates_block_cache = myclimatebeast.get_block_cache()
                 # Reduce logging verbosity
                 logger.setLevel(logging.WARNING)
                 # Start to process the records
                 # NOTE: multiprocessing not enabled for this mode
-                myclimatebeast.process_records(pargs.action)
+                myclimatebeast.process_records(pargs.action, coordinate_aliases={(cell_lat, cell_lon): cell_stations}, manifest=coordinates_manifest, block_cache=coordinates_block_cache)
+
+            # All the grid cells share the same manifest, which is only written once at the end
+            if coordinates_manifest is not None and coordinates_manifest.modified == True:
+                coordinates_manifest.save()
     except Exception as e:
         # Grab an instance of the CLIMATEBEAST class
         myclimatebeast = CLIMATEBEAST(
@@ -708,9 +1066,36 @@ def main():
                             pargs.latitude_range,
                             pargs.longitude_range,
                             multiprocessing=pargs.multiprocessing,
-                            logger=logger)
+                            logger=logger,
+                            lazy=pargs.lazy,
+                            grid_cache=pargs.grid_cache,
+                            api_concurrency=pargs.api_concurrency,
+                            response_cache_ttl=pargs.response_cache_ttl,
+                            response_cache_size=pargs.response_cache_size,
+                            api_format=pargs.api_format,
+                            api_rate_limit=pargs.api_rate_limit,
+                            update=pargs.update,
+                            api_mode=pargs.api_mode,
+                            download_concurrency=pargs.download_concurrency,
+                            download_segments=pargs.download_segments,
+                            cloud_source=pargs.cloud_source,
+                            s3_endpoint_url=pargs.s3_endpoint_url,
+                            block_cache_size=pargs.block_cache_size,
+                            block_cache_dir=pargs.block_cache_dir)
         # Start to process the records
-        if pargs.multiprocessing == True:
+        # NOTE: lazy mode already runs in parallel, so it takes precedence over multiprocessing
+        # NOTE: updates are processed sequentially, so that a single process writes the update manifest
+        # NOTE: reads from S3 are processed sequentially, each file being read with parallel range requests
+        if pargs.lazy == True:
+            logger.info("\x1b[47m \x1b[32mLazy Dask mode selected \x1b[0m \x1b[39m")
+            myclimatebeast.process_records(pargs.action)
+        elif pargs.update == True:
+            logger.info("\x1b[47m \x1b[32mUpdate mode selected \x1b[0m \x1b[39m")
+            myclimatebeast.process_records(pargs.action)
+        elif pargs.input_directory is None and pargs.data_source == "silo" and pargs.cloud_source == "s3":
+            logger.info("\x1b[47m \x1b[32mS3 range reads selected \x1b[0m \x1b[39m")
+            myclimatebeast.process_records(pargs.action)
+        elif pargs.multiprocessing == True:
             logger.info("\x1b[47m \x1b[32mMultiProcessing selected \x1b[0m \x1b[39m")
             myclimatebeast.process_parallel_records(pargs.action)
         else:
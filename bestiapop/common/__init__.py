@@ -1,4 +1,18 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2019-2020 Diego Perez (@darkquassar / https://linkedin.com/in/diegope) & Jonathan Ojeda (@JJguri / https://www.jojeda.com/)
 
-from . import bestiapop_utils
\ No newline at end of file
+from . import api_fetcher
+from . import bestiapop_utils
+from . import block_cache
+from . import chunk_reference_index
+from . import climate_grid
+from . import climate_series
+from . import decoded_grid_cache
+from . import download_manager
+from . import download_manifest
+from . import hyperslab_reader
+from . import rate_limiter
+from . import rechunked_store
+from . import response_cache
+from . import update_manifest
+from . import valid_cell_mask
\ No newline at end of file
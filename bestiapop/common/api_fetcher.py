@@ -0,0 +1,363 @@
+
+import asyncio
+import logging
+import numpy as np
+import random
+import requests
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+
+class ConcurrentAPIFetcher():
+    """This class will provide methods to issue many HTTP requests to a climate API concurrently
+
+        Climate APIs like SILO's DataDrill return the data for a single lat/lon combination per request, and most of
+        the time spent by BestiaPop when generating climate files from the cloud is spent waiting for the network.
+        The fetcher issues a batch of requests in parallel using asyncio, with a semaphore bounding the number of
+        requests in flight. The requests themselves are performed by the requests library inside a thread pool, so
+        no additional HTTP library is required.
+
+        All requests go through a single requests.Session whose connection pool is sized to the number of requests
+        in flight, so keep-alive connections are re-used across requests instead of paying for a new TCP and TLS
+        handshake every time. The time taken by every request, the size of every payload and the time taken to
+        decode it are recorded, see get_latency_stats.
+
+        Responses are handed over as raw bytes to a decoder provided by the caller (see the connectors'
+        decode_api_payload), which runs inside the thread pool as well. JSON payloads are parsed in full (with
+        the "orjson" package when it is available) and the decoder collects the values into arrays right away,
+        so the parsed objects of a payload are released as soon as it has been decoded.
+
+        When a response cache is provided, requests that carry a cache key are answered from the cache whenever
+        possible and every new payload that could be decoded is stored in it, see APIResponseCache.
+
+        Transient failures (connection errors, timeouts and HTTP 429 or 5xx answers) are retried with an
+        exponential backoff and random jitter, waiting at least as long as the API asks for in the "Retry-After"
+        header. When a rate limiter is provided, every attempt waits for its turn first, see AdaptiveRateLimiter.
+
+        Args:
+            max_concurrency (int, optional): the maximum number of requests in flight at the same time. Defaults to 8.
+            timeout (int, optional): the number of seconds to wait for each response. Defaults to 120.
+            response_cache (APIResponseCache, optional): the cache used to store the payloads. Defaults to None (no caching).
+            rate_limiter (AdaptiveRateLimiter, optional): the limiter keeping the requests under the API's limits. Defaults to None (no rate limiting).
+            max_retries (int, optional): the number of times a failed request is retried before giving up. Defaults to 5.
+
+    """
+
+    # HTTP status codes signalling that the API is throttling us or is temporarily unavailable
+    retry_status_codes = (429, 500, 502, 503, 504)
+
+    # The wait before retry "n" is a random amount of seconds between 0 and min(backoff_max, backoff_base * 2^n)
+    backoff_base = 1
+    backoff_max = 60
+
+    def __init__(self, max_concurrency=8, timeout=120, response_cache=None, rate_limiter=None, max_retries=5):
+
+        # Setup logging
+        # We need to pass the "logger" to any Classes or Modules that may use it
+        # in our script
+        try:
+            import coloredlogs
+            logger = logging.getLogger('POPBEAST.API_FETCHER')
+            if 'bestiapop' in __name__:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="WARNING", logger=logger)
+            else:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="DEBUG", logger=logger)
+
+        except ModuleNotFoundError:
+            logger = logging.getLogger('POPBEAST.API_FETCHER')
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(message)s')
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(formatter)
+            console_handler.setLevel(logging.DEBUG)
+            logger.addHandler(console_handler)
+            if 'bestiapop' in __name__:
+                logger.setLevel(logging.WARNING)
+            else:
+                logger.setLevel(logging.INFO)
+
+        # Setting up class variables
+        self.logger = logger
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.timeout = timeout
+        self.response_cache = response_cache
+        self.rate_limiter = rate_limiter
+        self.max_retries = max(0, int(max_retries))
+
+        # Keep-alive connections are pooled per host, one per request in flight
+        self.session = requests.Session()
+        pooled_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_concurrency)
+        self.session.mount("https://", pooled_adapter)
+        self.session.mount("http://", pooled_adapter)
+
+        # Latency (in seconds) of every request answered by the API, plus the count of the ones that were not
+        # and of the ones that had to be retried
+        self.latencies = []
+        self.failed_requests = 0
+        self.retried_requests = 0
+
+        # Size (in bytes) and decoding time (in seconds) of every payload downloaded from the API
+        self.payload_sizes = []
+        self.decode_times = []
+        self._stats_lock = threading.Lock()
+
+    def fetch_payloads(self, request_list, payload_decoder=None):
+        """Perform a batch of GET requests concurrently and decode their payloads
+
+        Args:
+            request_list (list): a list of (key, url, params) or (key, url, params, cache_key) tuples, where "key" is any hashable value used to identify the request in the results and "cache_key" is the key of the payload in the response cache
+            payload_decoder (function, optional): a function that receives the raw payload (bytes) and returns the decoded data. It must raise an exception if the payload is not valid. Defaults to None (payloads are returned as bytes).
+
+        Returns:
+            dict: a dictionary where keys are the request keys and values are either the decoded payload or the Exception raised while fetching or decoding it
+        """
+
+        if not request_list:
+            return {}
+
+        # asyncio.run cannot be called from a thread that is already running an event loop
+        # (e.g. inside a Jupyter notebook), in which case the batch is run from a separate thread
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.fetch_all(request_list, payload_decoder))
+
+        with ThreadPoolExecutor(max_workers=1) as loop_executor:
+            return loop_executor.submit(asyncio.run, self.fetch_all(request_list, payload_decoder)).result()
+
+    async def fetch_all(self, request_list, payload_decoder=None):
+        """Coroutine performing all the requests of a batch, with at most max_concurrency requests in flight
+
+        Args:
+            request_list (list): a list of (key, url, params) or (key, url, params, cache_key) tuples
+            payload_decoder (function, optional): a function that receives the raw payload (bytes) and returns the decoded data. Defaults to None.
+
+        Returns:
+            dict: a dictionary where keys are the request keys and values are either the decoded payload or an Exception
+        """
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        loop = asyncio.get_running_loop()
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as request_executor:
+
+            async def fetch_one(key, url, params, cache_key=None):
+                async with semaphore:
+                    try:
+                        return key, await loop.run_in_executor(request_executor, self.fetch_payload, url, params, cache_key, payload_decoder)
+                    except Exception as e:
+                        self.logger.debug('Request {} failed: {}'.format(key, e))
+                        return key, e
+
+            results = await asyncio.gather(*[fetch_one(*request) for request in request_list])
+
+        return dict(results)
+
+    def get(self, url, params):
+        """Perform a single GET request through the pooled session, retrying transient failures and recording its latency
+
+        Args:
+            url (str): the URL of the API endpoint
+            params (dict): the query string parameters
+
+        Returns:
+            requests.Response: the response returned by the API. If the API kept answering with an HTTP 429 or 5xx status after all retries, that last response is returned.
+        """
+
+        for attempt in range(self.max_retries + 1):
+
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            request_start = time.perf_counter()
+
+            try:
+                r = self.session.get(url, params=params, timeout=self.timeout)
+            except Exception as e:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.release()
+
+                with self._stats_lock:
+                    self.failed_requests += 1
+
+                # Only network errors are worth retrying, anything else is a bug or a bad request
+                if attempt == self.max_retries or not isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+                    raise
+
+                self.wait_before_retry(attempt, url, e)
+                continue
+
+            latency = time.perf_counter() - request_start
+            throttled = r.status_code in self.retry_status_codes
+            retry_after = self.get_retry_after(r) if throttled == True else None
+
+            if self.rate_limiter is not None:
+                self.rate_limiter.release(latency=latency, throttled=throttled, retry_after=retry_after)
+
+            with self._stats_lock:
+                self.latencies.append(latency)
+
+            if throttled == False or attempt == self.max_retries:
+                return r
+
+            self.wait_before_retry(attempt, url, "HTTP {}".format(r.status_code), retry_after)
+
+    def wait_before_retry(self, attempt, url, reason, retry_after=None):
+        """Sleep before retrying a request, using an exponential backoff with full jitter
+
+        Args:
+            attempt (int): the number of the attempt that just failed, starting at 0
+            url (str): the URL of the API endpoint, for logging
+            reason (object): what made the attempt fail, for logging
+            retry_after (float, optional): the amount of seconds the API asked us to wait. Defaults to None.
+        """
+
+        # The random jitter keeps concurrent requests from retrying all at the same time
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+
+        with self._stats_lock:
+            self.retried_requests += 1
+
+        self.logger.debug('Request to {} failed ({}), retry {} of {} in {:.1f} seconds'.format(url, reason, attempt + 1, self.max_retries, delay))
+        time.sleep(delay)
+
+    def get_retry_after(self, r):
+        """Obtain the amount of seconds the API asked us to wait through the "Retry-After" header of a response
+
+        Args:
+            r (requests.Response): the response returned by the API
+
+        Returns:
+            float: the amount of seconds to wait, or None if the response does not carry a valid "Retry-After" header
+        """
+
+        retry_after = r.headers.get("Retry-After")
+
+        if retry_after is None:
+            return None
+
+        # The header contains either an amount of seconds or an HTTP date
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+
+        try:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError, IndexError):
+            return None
+
+    def fetch_payload(self, url, params, cache_key=None, payload_decoder=None):
+        """Perform a single GET request and decode its payload, using the response cache when a cache key is provided
+
+        Args:
+            url (str): the URL of the API endpoint
+            params (dict): the query string parameters
+            cache_key (tuple, optional): the key of the payload in the response cache, see APIResponseCache.get_entry_key. Defaults to None.
+            payload_decoder (function, optional): a function that receives the raw payload (bytes) and returns the decoded data. It must raise an exception if the payload is not valid. Defaults to None (the payload is returned as bytes).
+
+        Returns:
+            object: the decoded payload
+        """
+
+        use_cache = self.response_cache is not None and cache_key is not None
+
+        if use_cache == True:
+            payload = self.response_cache.get(cache_key)
+            if payload is not None:
+                try:
+                    return payload if payload_decoder is None else payload_decoder(payload)
+                except Exception as e:
+                    self.logger.warning('Could not decode cached payload, it will be downloaded again: {}'.format(e))
+
+        r = self.get(url, params)
+        r.raise_for_status()
+        payload = r.content
+
+        # Decode before caching, so that error messages returned by the API are never cached
+        decode_start = time.perf_counter()
+        decoded_payload = payload if payload_decoder is None else payload_decoder(payload)
+
+        with self._stats_lock:
+            self.payload_sizes.append(len(payload))
+            self.decode_times.append(time.perf_counter() - decode_start)
+
+        if use_cache == True:
+            self.response_cache.put(cache_key, payload)
+
+        return decoded_payload
+
+    def get_latency_stats(self):
+        """Summarize the latency of all the requests performed so far
+
+        Returns:
+            dict: a dictionary with the amount of answered, failed and retried requests, the mean, median, 95th percentile and maximum latency in seconds, the total and mean size of the downloaded payloads in bytes and the mean time taken to decode them in seconds (None when there is nothing to summarize)
+        """
+
+        with self._stats_lock:
+            latencies = np.array(self.latencies)
+            failed_requests = self.failed_requests
+            retried_requests = self.retried_requests
+            payload_sizes = np.array(self.payload_sizes)
+            decode_times = np.array(self.decode_times)
+
+        stats = {
+            "requests": len(latencies),
+            "failed": failed_requests,
+            "retried": retried_requests,
+            "mean": None,
+            "p50": None,
+            "p95": None,
+            "max": None,
+            "total_bytes": int(payload_sizes.sum()),
+            "mean_bytes": None,
+            "mean_decode": None
+        }
+
+        if len(latencies) > 0:
+            stats["mean"] = float(latencies.mean())
+            stats["p50"] = float(np.percentile(latencies, 50))
+            stats["p95"] = float(np.percentile(latencies, 95))
+            stats["max"] = float(latencies.max())
+
+        if len(payload_sizes) > 0:
+            stats["mean_bytes"] = float(payload_sizes.mean())
+            stats["mean_decode"] = float(decode_times.mean())
+
+        return stats
+
+    def log_latency_stats(self):
+        """Log a summary of the latency of all the requests performed so far
+        """
+
+        stats = self.get_latency_stats()
+
+        if self.response_cache is not None:
+            self.logger.info('API response cache: {} hits, {} misses'.format(self.response_cache.hits, self.response_cache.misses))
+
+        if stats["retried"] > 0:
+            self.logger.info('API requests retried: {}'.format(stats["retried"]))
+
+        if self.rate_limiter is not None and self.rate_limiter.throttled_responses > 0:
+            self.logger.info('API throttled {} requests, concurrency limit is now {}'.format(self.rate_limiter.throttled_responses, self.rate_limiter.concurrency_limit))
+
+        if stats["requests"] == 0:
+            self.logger.info('No API requests were answered ({} failed)'.format(stats["failed"]))
+            return
+
+        self.logger.info('API requests: {} answered, {} failed. Latency (s): mean {:.3f} - p50 {:.3f} - p95 {:.3f} - max {:.3f}'.format(
+            stats["requests"], stats["failed"], stats["mean"], stats["p50"], stats["p95"], stats["max"]))
+
+        if stats["mean_bytes"] is not None:
+            self.logger.info('API payloads: {:.1f} MB downloaded, {:.1f} KB per payload. Decoding time (s): mean {:.4f}'.format(
+                stats["total_bytes"] / (1024 * 1024), stats["mean_bytes"] / 1024, stats["mean_decode"]))
+
+    def close(self):
+        """Close all the pooled connections
+        """
+
+        self.session.close()
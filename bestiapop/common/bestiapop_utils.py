@@ -2,12 +2,12 @@
 import logging
 import numpy as np
 import os
-import requests
 import pandas as pd
 import s3fs
 import sys
 import xarray as xr
 
+from collections import OrderedDict
 from pathlib import Path
 from tqdm import tqdm
 
@@ -15,10 +15,10 @@ from tqdm import tqdm
 # imported as a package, run from commandline with `python -m bestiapop`
 # or from the source directory as `python bestiapop.py`
 if "bestiapop" in sys.modules:
-    from bestiapop.connectors import (silo_connector, nasapower_connector)
+    from bestiapop.common import (chunk_reference_index, climate_grid, decoded_grid_cache, download_manager, hyperslab_reader, rechunked_store, valid_cell_mask)
     from bestiapop.producers import output
 else:
-    from connectors import (silo_connector, nasapower_connector)
+    from common import (chunk_reference_index, climate_grid, decoded_grid_cache, download_manager, hyperslab_reader, rechunked_store, valid_cell_mask)
     from producers import output
 
 class MyUtilityBeast():
@@ -26,10 +26,18 @@ class MyUtilityBeast():
 
         Args:
             logger (str): A pointer to an initialized Argparse logger
+            input_path (str, optional): the folder where local NetCDF4 files are stored. Defaults to None.
+            max_open_files (int, optional): the maximum number of NetCDF4 files that will be kept open at the same time by load_cdf_file. When the limit is reached, the least recently used file is closed. Defaults to 16.
+            cdf_engine (str, optional): how NetCDF4 files are read by load_cdf_file. "h5py" reads only the chunks intersecting the requested coordinates (see HyperslabReader, and ChunkReferenceReader for files stored in S3), "xarray" opens the full dataset with xarray. Defaults to "h5py".
+            grid_cache_dir (str, optional): when provided, local NetCDF4 files are decoded once into uncompressed memory-mapped files stored in this folder (see DecodedGridCache) and read from there. Defaults to None.
+            chunk_index_dir (str, optional): the folder where the chunk indexes of the NetCDF4 files stored in S3 are kept, see ChunkReferenceIndex. Defaults to None (a "bpop-chunk-index" folder inside the ".bestiapop" folder in the user's home directory).
+            s3_endpoint_url (str, optional): the URL of the S3 service holding the NetCDF4 files, to read them from a mirror or an S3 compatible service (e.g. MinIO) instead of Amazon S3. Defaults to None (Amazon S3).
+            s3_concurrency (int, optional): the maximum number of range requests sent at the same time to read each NetCDF4 file stored in S3. Defaults to 8.
+            block_cache (BlockCache, optional): the cache the NetCDF4 files stored in S3 are read through. It can be shared by several instances, so that all the points and variables of a run reuse the same blocks. Defaults to None (every read is sent to S3).
 
     """
 
-    def __init__(self, input_path=None):
+    def __init__(self, input_path=None, max_open_files=16, cdf_engine="h5py", grid_cache_dir=None, chunk_index_dir=None, s3_endpoint_url=None, s3_concurrency=8, block_cache=None):
 
         # Setup logging
         # We need to pass the "logger" to any Classes or Modules that may use it 
@@ -52,15 +60,63 @@ class MyUtilityBeast():
         self.logger = logger
         self.input_path = input_path
 
+        # Pool of open NetCDF4 datasets, ordered from least to most recently used.
+        # This allows every point and variable in a run to share a single handle
+        # per "year.variable.nc" file instead of reopening it (and re-reading
+        # all of its HDF5 metadata) for each lookup.
+        self.max_open_files = max_open_files
+        self.cdf_file_pool = OrderedDict()
+        self.cdf_engine = cdf_engine
+        self.grid_cache_dir = grid_cache_dir
+        self.chunk_index_dir = chunk_index_dir
+        self.s3_endpoint_url = s3_endpoint_url
+        self.s3_concurrency = s3_concurrency
+        self.block_cache = block_cache
+
+        # The S3 file system is created the first time a file is read from S3, and shared by all of them
+        self.s3_fs = None
+
+    def get_s3_filesystem(self):
+        """Obtain the (anonymous) S3 file system holding the NetCDF4 files, creating it the first time
+
+        Returns:
+            s3fs.S3FileSystem: the S3 file system
+        """
+
+        if self.s3_fs is None:
+            client_kwargs = {"endpoint_url": self.s3_endpoint_url} if self.s3_endpoint_url is not None else {}
+            self.s3_fs = s3fs.S3FileSystem(anon=True, client_kwargs=client_kwargs)
+
+        return self.s3_fs
+
+    def get_nc4_file_url(self, year, climate_variable, data_source="silo"):
+        """Obtain the URL of the NetCDF4 file holding a year of a climate variable in the cloud
+
+        Args:
+            year (int): the year we require data for. SILO stores climate data as separate years like so: 2018.daily_rain.nc
+            climate_variable (str): the climate variable short name as per SILO nomenclature, see https://www.longpaddock.qld.gov.au/silo/about/climate-variables/
+            data_source (str, optional): the climate database the file belongs to. Only SILO provides NetCDF4 files for download. Defaults to "silo".
+
+        Returns:
+            tuple: a tuple consisting of (a) the URL of the file and (b) the name of the file. The tuple is ordered as follows: (url, filename)
+        """
+
+        filename = str(year) + "." + climate_variable + ".nc"
+        url = 'https://s3-ap-southeast-2.amazonaws.com/silo-open-data/annual/{}/{}'.format(climate_variable, filename)
+
+        return (url, filename)
+
     def download_nc4_file_from_cloud(self, year, climate_variable, output_path = Path().cwd(), data_source="silo", skip_certificate_checks=False):
         """Downloads a file from AWS S3 bucket or other cloud API
 
         Args:
-            year (int): the year we require data for. SILO stores climate data as separate years like so: daily_rain.2018.nc
+            year (int): the year we require data for. SILO stores climate data as separate years like so: 2018.daily_rain.nc
             climate_variable (str): the climate variable short name as per SILO nomenclature, see https://www.longpaddock.qld.gov.au/silo/about/climate-variables/
             output_path (str, optional): The target folder where files should be downloaded. Defaults to Path().cwd().
             skip_certificate_checks (bool, optional): ask the requests library to skip certificate checks, useful when attempting to download files behind a proxy. Defaults to False.
 
+        Returns:
+            int: the size of the downloaded file in bytes, None if it could not be downloaded
         """
 
         # This function connects to the public S3 site for SILO and downloads the specified file
@@ -71,71 +127,66 @@ class MyUtilityBeast():
         # The above will save to the current directory, however, you can also pass
         # your own like: download_nc4_file_from_cloud(2011,'daily_rain','C:\\Downloads\\SILO\2011')
 
-        # We use TQDM to show a progress bar of the download status
+        # Incomplete downloads are kept in a ".part" file and resumed on the next call, and files already
+        # present are only downloaded again if they changed in the server, see DownloadManager
 
         if data_source == "silo":
-            filename = str(year) + "." + climate_variable + ".nc"
-            url = 'https://s3-ap-southeast-2.amazonaws.com/silo-open-data/annual/{}/{}'.format(climate_variable, filename)
-
-            # Get pointer to URL
-            try:
-                req = requests.get(url, stream=True)
-            except requests.exceptions.SSLError:
-                self.logger.warning("Could not download file due to Certificate issues, potentially caused by your proxy. Relaxing Certificate Checking and attempting again...")
-                self.logger.warning('Skipping SSL certificate checks for {}/{}'.format(climate_variable, filename))
-                req = requests.get(url, stream=True, verify=False)
-
-            # Set initial file size and total file size
-            first_byte = 0
-            total_file_size = int(req.headers.get("Content-Length", 0))
-
-            if first_byte >= total_file_size:
-                return total_file_size
-
-            progressbar = tqdm(
-                                total=total_file_size,
-                                initial=first_byte,
-                                unit='B',
-                                ascii=True,
-                                unit_scale=True,
-                                desc=url.split('/')[-1])
-
-            # Write file in chunks
-            # Let's first check whether the file has already been downloaded
-            # if it has, let's return without downloading it again
-            output_file = output_path/filename
-            if output_file.is_file() == True:
-                if output_file.exists() == True:
-                    self.logger.info('File {} already exists. Skipping download...'.format(output_file))
-                    return
-
-            chunk_size = 1024
-            try:
-                with open(output_file, 'ab') as f:
-                    self.logger.info('Downloading file {}...'.format(output_file))
-                    for chunk in req.iter_content(chunk_size=chunk_size):
-                        if chunk:
-                            f.write(chunk)
-                            progressbar.update(1024)
-
-            except:
+            download_results = self.download_nc4_files_from_cloud([year], [climate_variable], output_path, data_source, max_concurrency=1, skip_certificate_checks=skip_certificate_checks)
+            downloaded_size = list(download_results.values())[0]
+
+            if isinstance(downloaded_size, Exception):
                 self.logger.error("Could not download SILO file")
+                return None
 
-            progressbar.close()
+            return downloaded_size
 
         elif data_source == "nasapower":
             None
 
-    def load_cdf_file(self, sourcepath, data_category, year=None):
+    def download_nc4_files_from_cloud(self, year_range, climate_variables, output_path = Path().cwd(), data_source="silo", max_concurrency=4, skip_certificate_checks=False, segments=4):
+        """Downloads the NetCDF4 files for several years and climate variables from AWS S3 bucket or other cloud API concurrently
+
+        Args:
+            year_range (numpy.ndarray): a numpy array with all the years for which we are seeking data
+            climate_variables (list): the climate variable short names as per SILO nomenclature, see https://www.longpaddock.qld.gov.au/silo/about/climate-variables/
+            output_path (str, optional): The target folder where files should be downloaded. Defaults to Path().cwd().
+            data_source (str, optional): the climate database the files belong to. Only SILO provides NetCDF4 files for download. Defaults to "silo".
+            max_concurrency (int, optional): the maximum number of files downloaded at the same time. Defaults to 4.
+            skip_certificate_checks (bool, optional): ask the requests library to skip certificate checks, useful when attempting to download files behind a proxy. Defaults to False.
+            segments (int, optional): the maximum number of connections used to download each file, see DownloadManager.download_file_segmented. Defaults to 4.
+
+        Returns:
+            dict: a dictionary where keys are the paths of the downloaded files and values are either their size in bytes or the Exception raised while downloading them
+        """
+
+        if data_source != "silo":
+            self.logger.info('Downloading {} NetCDF4 files not implemented yet'.format(data_source))
+            return {}
+
+        download_list = []
+        for year in year_range:
+            for climate_variable in climate_variables:
+                url, filename = self.get_nc4_file_url(year, climate_variable, data_source)
+                download_list.append((url, Path(output_path)/filename))
+
+        downloader = download_manager.DownloadManager(max_concurrency=max_concurrency, skip_certificate_checks=skip_certificate_checks, segments=segments)
+
+        try:
+            return downloader.download_files(download_list)
+        finally:
+            downloader.close()
+
+    def load_cdf_file(self, sourcepath, data_category, year=None, data_source="silo"):
         """This function loads a NetCDF4 file either from the cloud or locally
 
         Args:
             sourcepath (str): when loading a NetCDF4 file locally, this specifies the source folder. Only the "folder" must be specified, the actual file name will be further qualified by BestiaPop grabbing data from the year and climate variable paramaters passed to the SILO class.
             data_category (str): the short name variable, examples: daily_rain, max_temp, etc.
             year (int, optional): the year we want to extract data from, it is used to compose the final AWS S3 URL or to qualify the full path to the local NetCDF4 file we would like to load. Defaults to None.
+            data_source (str, optional): the climate database the file belongs to, used by the "h5py" engine to map coordinates to grid indices. Defaults to "silo".
 
         Returns:
-            dict: a dictionary containing two items, "value_array" which is a xarray DataSet object and "data_year" which is the year that the NetCDF4 file contains data for, extracted by looking at the contents of the NetCDF4 file itself.
+            dict: a dictionary containing two items, "value_array" which is a xarray DataSet object (or a HyperslabReader object when using the "h5py" engine) and "data_year" which is the year that the NetCDF4 file contains data for, extracted by looking at the contents of the NetCDF4 file itself. The dataset is owned by the file pool of this class and must not be closed by the caller, use close_cdf_files instead.
         """
 
         # This function loads the ".nc" file using the xarray library and
@@ -145,9 +196,39 @@ class MyUtilityBeast():
         # assume we need to fetch from the cloud
         if self.input_path is None:
             self.silo_file = "silo-open-data/annual/{}/{}.{}.nc".format(data_category, year, data_category)
-            fs_s3 = s3fs.S3FileSystem(anon=True)
-            self.remote_file_obj = fs_s3.open(self.silo_file, mode='rb')
-            da_data_handle = xr.open_dataset(self.remote_file_obj, engine='h5netcdf')
+            pool_key = self.silo_file
+        else:
+            pool_key = str(sourcepath)
+
+        # If the file is already open, mark it as the most recently used and return it
+        if pool_key in self.cdf_file_pool:
+            self.cdf_file_pool.move_to_end(pool_key)
+            self.logger.debug('Reusing open handle to netCDF4 file {}'.format(pool_key))
+            return self.cdf_file_pool[pool_key]
+
+        remote_file_obj = None
+
+        if self.input_path is None:
+            fs_s3 = self.get_s3_filesystem()
+            da_data_handle = None
+
+            # Files are read through an index of their chunks, which only fetches the byte ranges
+            # of the chunks needed instead of letting HDF5 walk the file with many small requests
+            if self.cdf_engine == "h5py":
+                try:
+                    da_data_handle = chunk_reference_index.ChunkReferenceIndex(self.chunk_index_dir, data_source=data_source).open(fs_s3, self.silo_file, data_category, max_concurrency=self.s3_concurrency, block_cache=self.block_cache)
+                except ValueError as e:
+                    self.logger.warning('Could not index the chunks of {}, reading it through HDF5 instead: {}'.format(self.silo_file, e))
+
+            if da_data_handle is None:
+                if self.block_cache is not None:
+                    remote_file_obj = self.block_cache.open(fs_s3, self.silo_file)
+                else:
+                    remote_file_obj = fs_s3.open(self.silo_file, mode='rb')
+                if self.cdf_engine == "h5py":
+                    da_data_handle = hyperslab_reader.HyperslabReader(remote_file_obj, data_source=data_source)
+                else:
+                    da_data_handle = xr.open_dataset(remote_file_obj, engine='h5netcdf')
             self.logger.debug('Loaded netCDF4 file {} from Amazon S3'.format(self.silo_file))
 
         else:
@@ -157,25 +238,164 @@ class MyUtilityBeast():
             # rain we shall call the function as:
             # load_file(sourcepath, sourcefile, 'daily_rain')
             self.logger.info('Loading netCDF4 file {} from Disk'.format(sourcepath))
-            da_data_handle = xr.open_dataset(sourcepath, engine='h5netcdf')
+            if self.grid_cache_dir is not None:
+                da_data_handle = decoded_grid_cache.DecodedGridCache(self.grid_cache_dir, data_source=data_source).open(sourcepath, data_category)
+            elif self.cdf_engine == "h5py":
+                da_data_handle = hyperslab_reader.HyperslabReader(sourcepath, data_source=data_source)
+            else:
+                da_data_handle = xr.open_dataset(sourcepath, engine='h5netcdf')
 
         # Extracting the "year" from within the file itself.
         # For this we get a sample of the values and then 
         # convert the first value to a year. Assuming we are dealing
         # with single year files as per SILO S3 files, this shouldn't
         # represent a problem
-        da_sample = da_data_handle.time.head().values[1]
-        data_year = da_sample.astype('datetime64[Y]').astype(int) + 1970
+        if isinstance(da_data_handle, hyperslab_reader.HyperslabReader):
+            data_year = da_data_handle.get_data_year()
+        else:
+            da_sample = da_data_handle.time.head().values[1]
+            data_year = da_sample.astype('datetime64[Y]').astype(int) + 1970
 
         # Storing the pointer to the data and the year in a dict
         data_dict = {
             "value_array": da_data_handle, 
             "data_year": data_year,            
+            "remote_file_obj": remote_file_obj,
         }
 
+        # Add the file to the pool, evicting the least recently used one if we went over the limit
+        self.cdf_file_pool[pool_key] = data_dict
+
+        while len(self.cdf_file_pool) > self.max_open_files:
+            evicted_key, evicted_data = self.cdf_file_pool.popitem(last=False)
+            self.close_cdf_file_handle(evicted_key, evicted_data)
+
         # returning our dictionary with relevant values
         return data_dict
 
+    def get_cdf_file_version(self, sourcepath):
+        """Obtain an identifier of the version of a NetCDF4 file, which changes whenever the file is replaced
+
+        Args:
+            sourcepath (str): the path to the local NetCDF4 file or, when reading from the cloud, its S3 key
+
+        Returns:
+            str: the absolute path, size and modification time of a local file, or the S3 URL and ETag of a file in S3
+        """
+
+        if self.input_path is None:
+            file_info = self.get_s3_filesystem().info(sourcepath)
+            s3_url = "{}/{}".format(self.s3_endpoint_url.rstrip("/"), sourcepath) if self.s3_endpoint_url is not None else "s3://{}".format(sourcepath)
+            return "{}|{}".format(s3_url, file_info.get("ETag", file_info.get("size")))
+
+        source_stat = os.stat(sourcepath)
+
+        return "{}|{}|{}".format(Path(sourcepath).resolve(), source_stat.st_size, source_stat.st_mtime_ns)
+
+    def close_cdf_file_handle(self, pool_key, data_dict):
+        """Close a single NetCDF4 file handle that was opened by load_cdf_file
+
+        Args:
+            pool_key (str): the path or S3 key of the file, only used for logging purposes
+            data_dict (dict): the dictionary returned by load_cdf_file for that file
+        """
+
+        data_dict["value_array"].close()
+        if data_dict.get("remote_file_obj") is not None:
+            data_dict["remote_file_obj"].close()
+        self.logger.debug('Closed handle to netCDF4 file {}'.format(pool_key))
+
+    def close_cdf_files(self):
+        """Close all the NetCDF4 file handles kept open by load_cdf_file
+        """
+
+        while self.cdf_file_pool:
+            pool_key, data_dict = self.cdf_file_pool.popitem(last=False)
+            self.close_cdf_file_handle(pool_key, data_dict)
+
+    def get_climate_data_block(self, value_array, climate_variable, lat_range, lon_range, data_source="silo"):
+        """Extract all daily values of a climate variable for every lat/lon combination with a single read
+
+        Args:
+            value_array (xarray.Dataset or HyperslabReader): the xarray Dataset or HyperslabReader object to extract values from
+            climate_variable (str): the climate variable short name as per SILO nomenclature, see https://www.longpaddock.qld.gov.au/silo/about/climate-variables/
+            lat_range (numpy.ndarray): a numpy array of latitude values to extract data from
+            lon_range (numpy.ndarray): a numpy array of longitude values to extract data from
+            data_source (str, optional): the climate database the file belongs to, used to map coordinates to grid indices. Defaults to "silo".
+
+        Returns:
+            numpy.ndarray: a 3D array ordered as (day, latitude, longitude) where the series of a single lat/lon combination can be obtained with data_block[:, lat_index, lon_index]. Coordinates that are not part of the file are filled with NaN.
+        """
+
+        # The HyperslabReader only reads the chunks within the bounding box of the requested coordinates
+        if isinstance(value_array, hyperslab_reader.HyperslabReader):
+            return value_array.read_block(climate_variable, lat_range, lon_range)
+
+        # Map the requested coordinates to their position within the file's axes
+        # using integer grid indices instead of float equality
+        grid = climate_grid.ClimateGrid(data_source)
+        lat_positions = grid.get_positions(grid.to_index(lat_range), value_array.lat.values)
+        lon_positions = grid.get_positions(grid.to_index(lon_range), value_array.lon.values)
+
+        # Keep the dtype of the file so that rounding behaves exactly as when reading the values directly
+        data_block = np.full((value_array.sizes['time'], len(lat_positions), len(lon_positions)), np.nan, dtype=np.result_type(value_array[climate_variable].dtype, np.float32))
+        lat_found = lat_positions >= 0
+        lon_found = lon_positions >= 0
+
+        if lat_found.any() and lon_found.any():
+            # Selecting all coordinates at once, by position, lets xarray/h5netcdf read the
+            # hyperslab in one go rather than reopening chunks for every point
+            data_block[np.ix_(np.arange(value_array.sizes['time']), lat_found, lon_found)] = value_array[climate_variable].isel(lat=lat_positions[lat_found], lon=lon_positions[lon_found]).transpose('time', 'lat', 'lon').values
+
+        return data_block
+
+    def get_yearly_wide_data(self, lat, lon, year, climate_values, climate_variables):
+        """Build a dataframe with all the climate variables of a lat/lon combination for a year, one row per day and one column per climate variable
+
+        Args:
+            lat (float): the latitude the values belong to
+            lon (float): the longitude the values belong to
+            year (int): the year the values belong to
+            climate_values (dict): a dictionary where keys are climate variable short names and values are the daily series (numpy.ndarray) for the year, starting on the first day of the year. The series of the current year only contain the days published so far.
+            climate_variables (list): all the climate variables requested, the ones missing from climate_values are filled with NaN
+
+        Raises:
+            ValueError: if there was "NO" data available for a climate variable under this lat/lon combination (the second day of the series is NaN), the caller should ignore this lat/lon combination.
+
+        Returns:
+            pandas.core.frame.DataFrame: a dataframe containing the lon, lat, year and days columns plus one column per climate variable
+        """
+
+        # Checking if this is a leap-year
+        if (( year%400 == 0) or (( year%4 == 0 ) and ( year%100 != 0))):
+            days = np.arange(1,367,1)
+        else:
+            days = np.arange(1,366,1)
+
+        # The file of the current year only holds the days published so far (and a variable may be published
+        # a day later than the rest), so only the days available for all the climate variables are kept
+        if climate_values:
+            days = days[:min(len(x) for x in climate_values.values())]
+
+        df = pd.DataFrame({'lon': lon, 'lat': lat, 'year': year, 'days': days})
+
+        for climate_variable in climate_variables:
+            if climate_variable not in climate_values:
+                df[climate_variable] = np.nan
+                continue
+
+            # We round values to a single decimal, same as the connectors do
+            data_values = np.round(climate_values[climate_variable][:len(days)], decimals=1)
+
+            # We assume that, if the first value is "NaN" then the rest of the values will also be null
+            if len(data_values) == 0 or np.isnan(data_values[min(1, len(data_values) - 1)]) == True:
+                self.logger.warning("THERE ARE NO VALUES FOR LAT {} LON {} VARIABLE {}".format(lat, lon, climate_variable))
+                raise ValueError('no_data_for_lat_lon')
+
+            df[climate_variable] = data_values
+
+        return df
+
     def get_years_list(self, year_range):
 
         # Check whether a year range with "-" was provided for the year.
@@ -197,77 +417,27 @@ class MyUtilityBeast():
         # If this is the case, generate a list out of it
         # NOTE: for some reason I get a list within a list from the argparse...
 
-        # Let's define whether the float range will be defined on steps of 
-        # 0.05 (SILO) or 0.5 (NASAPOWER)
-        if climate_data_source == "silo":
-            float_step = 0.05
-        elif climate_data_source == "nasapower":
-            float_step = 0.5
-        
-        if coordinate_type == "latitude":
-            if isinstance(coordinate_range, np.ndarray):
-                # The user passed in a file with an array of latitudes
-                # this file was processed during the argument parsing phase
-                # and a numpy.ndarray was returned. Nothing else to do.
-                return coordinate_range
-            else:
-                if len(coordinate_range) > 1:
-                    if coordinate_range[0] > coordinate_range[1]:
-                        # We are clearly dealing with negative numbers
-                        # User has mistakenly swapped the order of numbers
-                        # we need to silently swap them back
-                        first_lat = coordinate_range[1]
-                        last_lat = coordinate_range[0]
-                    else:
-                        first_lat = coordinate_range[0]
-                        last_lat = coordinate_range[1]
-
-                    # Find absolute distance to account for missing values
-                    # numpy.arange erratic behaviour with floats: https://numpy.org/doc/stable/reference/generated/numpy.arange.html
-                    lat_value_count = np.round((abs(first_lat-last_lat) / float_step), decimals=0)
-                    lat_range = np.arange(first_lat,last_lat,float_step).round(decimals=2)
-                    
-                    # Check the number spread
-                    if int(lat_value_count+1) != len(lat_range):
-                        lat_range = np.arange(first_lat,np.round((last_lat+float_step), decimals=2),float_step).round(decimals=2).tolist()
-                        if int(lat_value_count+1) != len(lat_range):
-                            # Must get rid of last float
-                            lat_range = np.delete(lat_range,(len(lat_range)-1),0)
-                else:
-                    # when only a single lat is passed in
-                    lat_range = coordinate_range
-
-                return lat_range
-
-        elif coordinate_type == "longitude":
-            if coordinate_range:
-                if len(coordinate_range) > 1:
-                    if coordinate_range[0] > coordinate_range[1]:
-                        # User has mistakenly swapped the order of numbers
-                        # we need to silently swap them back
-                        first_lon = coordinate_range[1]
-                        last_lon = coordinate_range[0]
-                    else:
-                        first_lon = coordinate_range[0]
-                        last_lon = coordinate_range[1]
-
-                    # Find absolute distance to account for missing values
-                    # numpy.arange erratic behaviour with floats: https://numpy.org/doc/stable/reference/generated/numpy.arange.html
-                    lon_value_count = np.round((abs(first_lon-last_lon) / float_step), decimals=0)
-                    lon_range = np.arange(first_lon,last_lon,float_step).round(decimals=2)
-
-                    # Check the number spread
-                    if int(lon_value_count+1) != len(lon_range):
-                        lon_range = np.arange(first_lon,np.round((last_lon+float_step), decimals=2),float_step).round(decimals=2).tolist()
-                        if int(lon_value_count+1) != len(lon_range):
-                            # Must get rid of last float
-                            lon_range = np.delete(lon_range,(len(lon_range)-1),0)
+        # The range is built on the integer indices of the grid used by the data source,
+        # 0.05 (SILO) or 0.5 (NASAPOWER) degrees, and then converted back to coordinates.
+        # This way we avoid numpy.arange erratic behaviour with floats: https://numpy.org/doc/stable/reference/generated/numpy.arange.html
+        grid = climate_grid.ClimateGrid(climate_data_source)
 
-                else:
-                    # when only a single lon is passed in
-                    lon_range = coordinate_range
+        if isinstance(coordinate_range, np.ndarray):
+            # The user passed in a file with an array of coordinates
+            # this file was processed during the argument parsing phase
+            # and a numpy.ndarray was returned. Nothing else to do.
+            return coordinate_range
+
+        if not coordinate_range:
+            return coordinate_range
 
-                return lon_range
+        if len(coordinate_range) > 1:
+            # The order in which the user passed in both ends of the range does not matter,
+            # get_index_range always returns the indices in ascending order
+            coordinate_range = grid.to_coordinate(grid.get_index_range(coordinate_range[0], coordinate_range[1]))
+
+        # when only a single coordinate is passed in, it is returned as is
+        return coordinate_range
 
     def generate_climate_dataframe_from_disk(self, year_range, climate_variables, lat_range, lon_range, input_dir, data_source="silo"):
         """This function generates a dataframe containing (a) climate values (b) for every variable requested (c) for every day of the year (d) for every year passed in as argument. The values will be sourced from Disk.
@@ -293,18 +463,51 @@ class MyUtilityBeast():
         # empty df to append all the met_df to
         total_climate_df = pd.DataFrame()
 
-        # create an empty list to keep track of lon coordinates
-        # where there are no values
-        empty_lon_coordinates = []
+        # create an empty set to keep track of lat/lon combinations
+        # where there are no values, and another one for the lon
+        # coordinates where at least one latitude has values.
+        # Both are keyed on integer grid indices.
+        empty_cells = set()
+        lons_with_data = set()
+
+        # Map all coordinates to integer grid indices once, so that
+        # the loops below never need to compare floats
+        grid = climate_grid.ClimateGrid(data_source)
+        lat_indices = np.atleast_1d(grid.to_index(lat_range)).tolist()
+        lon_indices = np.atleast_1d(grid.to_index(lon_range)).tolist()
+
+        # Load the mask of grid cells that contain data. Cells are not skipped based on the mask here, since the
+        # values read from the files already show which cells are empty, but its grid is rebuilt from the first
+        # NetCDF4 file that gets opened when it was not built from that version of the file (see ValidCellMask)
+        cell_mask = valid_cell_mask.ValidCellMask(data_source)
+        cell_mask.load()
+        cell_mask_checked = False
+
+        # If a point-major store was generated inside the input directory (see the "rechunk-store" action),
+        # it contains everything that was requested and the NetCDF4 files it was generated from did not
+        # change since, read from it instead of the NetCDF4 files
+        if self.input_path is not None and input_dir.is_dir() == True:
+            store = rechunked_store.RechunkedClimateStore(input_dir/rechunked_store.RechunkedClimateStore.store_folder_name, data_source=data_source)
+            if store.exists() == True:
+                if store.covers(year_range, climate_variables, lat_range, lon_range) == False:
+                    self.logger.warning('The point-major store {} does not cover all the requested years, variables or coordinates. Reading from NetCDF4 files instead.'.format(store.store_path))
+                elif store.is_fresh(input_dir, year_range, climate_variables) == False:
+                    self.logger.warning('The NetCDF4 files in {} changed since the point-major store {} was generated. Reading from NetCDF4 files instead, run the "rechunk-store" action again to update the store.'.format(input_dir, store.store_path))
+                else:
+                    self.logger.info('Reading data from point-major store {}'.format(store.store_path))
+                    return self.generate_climate_dataframe_from_store(store, year_range, climate_variables, lat_range, lon_range, data_source)
 
-        # Initialize BestiaPop required class instances
-        silo = silo_connector.SILOClimateDataConnector(data_source=data_source, input_path=self.input_path, climate_variables=climate_variables)
-        nasapower = nasapower_connector.NASAPowerClimateDataConnector(data_source=data_source, input_path=self.input_path, climate_variables=climate_variables)
+        # Dataframes for every lat/lon/year combination, concatenated once at the end
+        climate_dfs = []
 
         # Loading and/or Downloading the files
         for year in tqdm(year_range, file=sys.stdout, ascii=True, desc="Total Progress"):
             self.logger.debug('Processing data for year {}'.format(year))
 
+            # All the climate variables for this year are read first, so that every lat/lon
+            # combination can then be extracted in a single pass into a wide (day x variable) record
+            year_blocks = {}
+
             for climate_variable in tqdm(climate_variables, ascii=True, desc="Climate Variable"):
                 self.logger.debug('Processing data for climate variable {}'.format(climate_variable))
 
@@ -326,71 +529,282 @@ class MyUtilityBeast():
                         self.logger.error('Could not find file {}. Please make sure you have downloaded the required netCDF4 files in the format "year.variable.nc" to the input directory. Skipping...'.format(sourcepath))
                         continue
                     
-                    data = self.load_cdf_file(sourcepath, climate_variable)
+                    data = self.load_cdf_file(sourcepath, climate_variable, data_source=data_source)
+
+                # otherwise read the file straight from the S3 bucket
+                else:
+                    data = self.load_cdf_file(None, climate_variable, year=year, data_source=data_source)
 
-                # Now iterating over lat and lon combinations
-                # Each year-lat-lon matrix generates a different file
+                if cell_mask_checked == False:
+                    source_version = self.get_cdf_file_version(sourcepath if self.input_path is not None else self.silo_file)
+                    if cell_mask.matches_dataset(data['value_array'], source_version) == False:
+                        cell_mask.build_from_dataset(data['value_array'], climate_variable, source_version)
+                    cell_mask_checked = True
 
-                for lat in tqdm(lat_range, ascii=True, desc="Latitude"):
+                # Pull the whole lat/lon hyperslab for this year and variable in a single read
+                # instead of performing one selection per lat/lon combination.
+                year_blocks[climate_variable] = self.get_climate_data_block(data['value_array'], climate_variable, lat_range, lon_range, data_source)
 
-                    for lon in lon_range:
+            if not year_blocks:
+                continue
 
-                        # Skipping any longitude points that have already been proven to not contain any data
-                        # This adds a slight performance improvement too
-                        if lon in empty_lon_coordinates:
-                            continue
+            # Now iterating over lat and lon combinations
+            # Each year-lat-lon matrix generates a different file
 
-                        self.logger.debug('Processing Variable {} - Lat {} - Lon {} for Year {}'.format(climate_variable, lat, lon, year))
+            for lat_index, lat in enumerate(tqdm(lat_range, ascii=True, desc="Latitude")):
 
-                        # here we are checking whether the get_values_from_cdf function
-                        # returns with a ValueError (meaning there were no values for
-                        # that particular lat & long combination). If it does return
-                        # with an error, we skip this loop and don't produce any output files
+                for lon_index, lon in enumerate(lon_range):
+
+                    # Skipping any lat/lon combinations where a previous year had no values
+                    cell = (lat_indices[lat_index], lon_indices[lon_index])
+                    if cell in empty_cells:
+                        continue
+
+                    self.logger.debug('Processing Lat {} - Lon {} for Year {}'.format(lat, lon, year))
+
+                    # here we are checking whether the get_yearly_wide_data function
+                    # returns with a ValueError (meaning there were no values for
+                    # that particular lat & long combination). If it does return
+                    # with an error, we skip this loop and don't produce any output files
+                
+                    try:
+                        var_year_lat_lon_df = self.get_yearly_wide_data(
+                                                                    lat=lat, 
+                                                                    lon=lon, 
+                                                                    year=year,
+                                                                    climate_values={x: year_blocks[x][:, lat_index, lon_index] for x in year_blocks},
+                                                                    climate_variables=climate_variables
+                                                                )
+
+                    except ValueError:
+                        self.logger.warning("Lat {} Lon {} will be skipped for the rest of the years".format(lat, lon))
+                        # Append empty lat/lon combination to list
+                        empty_cells.add(cell)
+                        continue
                     
-                        try:
-                            # Local file, read from input directory
-                            if data_source == "silo":
-                                var_year_lat_lon_df = silo.get_yearly_data(
-                                                                            lat=lat, 
-                                                                            lon=lon, 
-                                                                            value_array=data['value_array'], 
-                                                                            year=year,
-                                                                            year_range=year_range,
-                                                                            climate_variable=climate_variable
-                                                                        )
-                            elif data_source == "nasapower":
-                                var_year_lat_lon_df = nasapower.get_yearly_data(
-                                                                            lat=lat, 
-                                                                            lon=lon, 
-                                                                            value_array=data['value_array'], 
-                                                                            year=year,
-                                                                            year_range=year_range,
-                                                                            climate_variable=climate_variable
-                                                                        )
-
-                        except ValueError:
-                            self.logger.warning("This longitude value will be skipped for the rest of the climate variables and years")
-                            self.logger.warning("Deleting lon {} in array position {}".format(lon, np.where(lon_range == lon)[0][0]))
-                            # Append empty lon value to list
-                            empty_lon_coordinates.append(lon)
-                            continue
-                        
-                        # delete the var_year_lat_lon_df back to zero.
-                        total_climate_df = total_climate_df.append(var_year_lat_lon_df)
-                        del var_year_lat_lon_df
-
-                # We reached the end of the year loop
-                # we need must close the open handle to the s3fs file to free up resources
-                if self.input_path is None:
+                    lons_with_data.add(cell[1])
+
+                    climate_dfs.append(var_year_lat_lon_df)
+                    del var_year_lat_lon_df
+
+        if self.input_path is None and self.block_cache is not None:
+            self.logger.info('Block cache: {} memory hits, {} disk hits, {} misses ({:.1f} MB fetched from S3)'.format(self.block_cache.memory_hits, self.block_cache.disk_hits, self.block_cache.misses, self.block_cache.fetched_bytes / (1024 * 1024)))
+
+        if climate_dfs:
+            total_climate_df = pd.concat(climate_dfs, ignore_index=True)
+
+        # All points and variables have been extracted, release the NetCDF4 file handles
+        self.close_cdf_files()
+
+        # Cache the mask if it was built during this run
+        if cell_mask.modified == True:
+            cell_mask.save()
+
+        # Remove any lon values without data for all latitudes from longitude array so as to avoid empty MET generation
+        final_lon_range = np.unique(np.asarray(lon_range)[np.isin(lon_indices, list(lons_with_data))])
+
+        # Return results
+        return (total_climate_df, final_lon_range)
+
+    def generate_climate_dataframe_from_lazy_dataset(self, year_range, climate_variables, lat_range, lon_range, input_dir, data_source="silo"):
+        """This function generates a dataframe containing (a) climate values (b) for every variable requested (c) for every day of the year (d) for every year passed in as argument. The values will be sourced from Disk, opening all the required NetCDF4 files as a single lazy Dask-backed dataset.
+        Args:
+            year_range (numpy.ndarray): a numpy array with all the years for which we are seeking data.
+            climate_variables (str): the climate variable short name as per SILO or NASAPOWER nomenclature. For SILO check https://www.longpaddock.qld.gov.au/silo/about/climate-variables/.
+            lat_range (numpy.ndarray): a numpy array of latitude values to extract data from
+            lon_range (numpy.ndarray): a numpy array of longitude values to extract data from
+            input_dir (pathlib.Path): the local folder where the "year.variable.nc" files are located
+        Returns:
+            tuple: a tuple consisting of (a) the final dataframe containing values for all years, latitudes and longitudes for a particular climate variable, (b) the curated list of longitude ranges (which excludes all those lon values where there were no actual data points). The tuple is ordered as follows: (final_dataframe, final_lon_range)
+        """
+
+        # All the "year.variable.nc" files are combined into a single dataset: files for the same year
+        # are merged (one variable each) and years are concatenated along the time axis. Nothing is read
+        # until the values for all the requested lat/lon combinations are computed, in parallel, by Dask.
+
+        try:
+            import dask
+        except ModuleNotFoundError:
+            self.logger.warning('Lazy mode requires the "dask" package, which could not be found. Install it with "pip install dask". Falling back to reading one file at a time...')
+            return self.generate_climate_dataframe_from_disk(year_range, climate_variables, lat_range, lon_range, input_dir, data_source)
+
+        if input_dir.is_dir() == False:
+            self.logger.error('Lazy mode requires an input directory containing NetCDF4 files in the format "year.variable.nc". Cannot proceed.')
+            return (pd.DataFrame(), np.empty(0))
+
+        # Only years for which all the climate variables are available can be combined
+        # since all variables share the same time axis inside the combined dataset
+        available_years = []
+        file_matrix = []
+        for year in year_range:
+            year_files = [input_dir/"{}.{}.nc".format(year, x) for x in climate_variables]
+            missing_files = [str(x) for x in year_files if x.exists() == False]
+            if missing_files:
+                self.logger.error('Could not find file(s) {}. Please make sure you have downloaded the required netCDF4 files in the format "year.variable.nc" to the input directory. Skipping year {}...'.format(", ".join(missing_files), year))
+                continue
+            available_years.append(year)
+            file_matrix.append([str(x) for x in year_files])
+
+        if not available_years:
+            return (pd.DataFrame(), np.empty(0))
+
+        self.logger.info('Opening {} NetCDF4 files as a single lazy dataset'.format(len(available_years) * len(climate_variables)))
+        combined_dataset = xr.open_mfdataset(
+            file_matrix,
+            engine='h5netcdf',
+            combine='nested',
+            concat_dim=['time', None],
+            chunks={'time': -1},
+            parallel=True
+        )
+
+        # Rebuild the grid of the mask of cells that contain data from the first day of the combined dataset
+        # when it was not built from the first file of the dataset (see ValidCellMask). Only that day will be read.
+        cell_mask = valid_cell_mask.ValidCellMask(data_source)
+        cell_mask.load()
+        source_version = self.get_cdf_file_version(file_matrix[0][0])
+        if cell_mask.matches_dataset(combined_dataset, source_version) == False:
+            cell_mask.build_from_dataset(combined_dataset, climate_variables[0], source_version)
+            cell_mask.save()
+
+        # Map the requested coordinates to their position within the dataset's axes
+        grid = climate_grid.ClimateGrid(data_source)
+        lat_indices = np.atleast_1d(grid.to_index(lat_range)).tolist()
+        lon_indices = np.atleast_1d(grid.to_index(lon_range)).tolist()
+        lat_positions = grid.get_positions(lat_indices, combined_dataset.lat.values)
+        lon_positions = grid.get_positions(lon_indices, combined_dataset.lon.values)
+        lat_found = lat_positions >= 0
+        lon_found = lon_positions >= 0
+
+        # A single lazy selection for all variables, computed in parallel by Dask's threaded scheduler. The work
+        # is NumPy/HDF5 I/O, so threads are enough and, unlike worker processes started with "spawn", they do
+        # not require the calling script to be guarded by an "if __name__ == '__main__'" block
+        data_blocks = {}
+        if lat_found.any() and lon_found.any():
+            selection = combined_dataset[climate_variables].isel(lat=lat_positions[lat_found], lon=lon_positions[lon_found]).transpose('time', 'lat', 'lon')
+            self.logger.info('Computing values for {} lat/lon combinations'.format(lat_found.sum() * lon_found.sum()))
+            computed_values = dask.compute(*[selection[x].data for x in climate_variables], scheduler="threads")
+
+            for climate_variable, values in zip(climate_variables, computed_values):
+                data_block = np.full((combined_dataset.sizes['time'], len(lat_positions), len(lon_positions)), np.nan, dtype=np.result_type(values.dtype, np.float32))
+                data_block[np.ix_(np.arange(combined_dataset.sizes['time']), lat_found, lon_found)] = values
+                data_blocks[climate_variable] = data_block
+
+        # Position of the days of each year within the time axis
+        day_years = combined_dataset.time.dt.year.values
+        year_positions = {year: np.flatnonzero(day_years == year) for year in available_years}
+
+        combined_dataset.close()
+
+        # Dataframes for every lat/lon/year combination, concatenated once at the end
+        climate_dfs = []
+
+        # create a set to keep track of the lon coordinates where at least one latitude has values
+        lons_with_data = set()
+
+        for lat_index, lat in enumerate(tqdm(lat_range, file=sys.stdout, ascii=True, desc="Latitude")):
+
+            for lon_index, lon in enumerate(lon_range):
+
+                # The values computed for every lat/lon combination already show which cells are empty
+                cell = (lat_indices[lat_index], lon_indices[lon_index])
+                if not data_blocks:
+                    continue
+
+                for year in available_years:
+
+                    self.logger.debug('Processing Lat {} - Lon {} for Year {}'.format(lat, lon, year))
+
+                    # All the climate variables are extracted in a single pass into a wide (day x variable) record
                     try:
-                        self.remote_file_obj.close()
-                        self.logger.debug("Closed handle to cloud s3fs file {}".format(self.silo_file))
-                    except AttributeError:
-                        self.logger.debug("Closing handle to remote s3fs file not required. Using an API endpoint instead of a cloud NetCDF4 file")
+                        var_year_lat_lon_df = self.get_yearly_wide_data(
+                                                                    lat=lat, 
+                                                                    lon=lon, 
+                                                                    year=year,
+                                                                    climate_values={x: data_blocks[x][year_positions[year], lat_index, lon_index] for x in data_blocks},
+                                                                    climate_variables=climate_variables
+                                                                )
+
+                    except ValueError:
+                        self.logger.warning("Lat {} Lon {} will be skipped for the rest of the years".format(lat, lon))
+                        break
+
+                    lons_with_data.add(cell[1])
+
+                    climate_dfs.append(var_year_lat_lon_df)
+                    del var_year_lat_lon_df
+
+        total_climate_df = pd.concat(climate_dfs, ignore_index=True) if climate_dfs else pd.DataFrame()
+
+        # Remove any lon values without data for all latitudes from longitude array so as to avoid empty MET generation
+        final_lon_range = np.unique(np.asarray(lon_range)[np.isin(lon_indices, list(lons_with_data))])
+
+        # Return results
+        return (total_climate_df, final_lon_range)
+
+    def generate_climate_dataframe_from_store(self, store, year_range, climate_variables, lat_range, lon_range, data_source="silo"):
+        """This function generates a dataframe containing (a) climate values (b) for every variable requested (c) for every day of the year (d) for every year passed in as argument. The values will be sourced from a point-major store generated with the "rechunk-store" action.
+        Args:
+            store (RechunkedClimateStore): an instance of the store covering all the requested data
+            year_range (numpy.ndarray): a numpy array with all the years for which we are seeking data.
+            climate_variables (str): the climate variable short name as per SILO nomenclature. For SILO check https://www.longpaddock.qld.gov.au/silo/about/climate-variables/.
+            lat_range (numpy.ndarray): a numpy array of latitude values to extract data from
+            lon_range (numpy.ndarray): a numpy array of longitude values to extract data from
+            data_source (str, optional): the climate database the store was generated from. Defaults to "silo".
+        Returns:
+            tuple: a tuple consisting of (a) the final dataframe containing values for all years, latitudes and longitudes for a particular climate variable, (b) the curated list of longitude ranges (which excludes all those lon values where there were no actual data points). The tuple is ordered as follows: (final_dataframe, final_lon_range)
+        """
+
+        # Since the store is point-major, we iterate over lat/lon combinations first and
+        # obtain all the years for a climate variable with a single contiguous read
+
+        # Dataframes for every lat/lon/year combination, concatenated once at the end
+        climate_dfs = []
+
+        # create a set to keep track of the lon coordinates where at least one latitude has values
+        lons_with_data = set()
+
+        # Map all coordinates to integer grid indices once
+        grid = climate_grid.ClimateGrid(data_source)
+        lat_indices = np.atleast_1d(grid.to_index(lat_range)).tolist()
+        lon_indices = np.atleast_1d(grid.to_index(lon_range)).tolist()
+
+        for lat_index, lat in enumerate(tqdm(lat_range, file=sys.stdout, ascii=True, desc="Latitude")):
+
+            for lon_index, lon in enumerate(lon_range):
+
+                cell = (lat_indices[lat_index], lon_indices[lon_index])
+
+                # One contiguous read per climate variable for all the years, which also shows whether the cell is empty
+                point_series = {x: store.get_point_series(x, lat, lon) for x in climate_variables}
+
+                for year in year_range:
+
+                    self.logger.debug('Processing Lat {} - Lon {} for Year {}'.format(lat, lon, year))
+
+                    # All the climate variables are extracted in a single pass into a wide (day x variable) record
+                    try:
+                        var_year_lat_lon_df = self.get_yearly_wide_data(
+                                                                    lat=lat, 
+                                                                    lon=lon, 
+                                                                    year=year,
+                                                                    climate_values={x: point_series[x][store.get_year_slice(year)] for x in climate_variables},
+                                                                    climate_variables=climate_variables
+                                                                )
+
+                    except ValueError:
+                        self.logger.warning("Lat {} Lon {} will be skipped for the rest of the years".format(lat, lon))
+                        break
+
+                    lons_with_data.add(cell[1])
+
+                    climate_dfs.append(var_year_lat_lon_df)
+                    del var_year_lat_lon_df
+
+        total_climate_df = pd.concat(climate_dfs, ignore_index=True) if climate_dfs else pd.DataFrame()
 
-        # Remove any empty lon values from longitude array so as to avoid empty MET generation
-        empty_lon_array = np.array(empty_lon_coordinates)
-        final_lon_range = np.setdiff1d(lon_range, empty_lon_array)
+        # Remove any lon values without data for all latitudes from longitude array so as to avoid empty MET generation
+        final_lon_range = np.unique(np.asarray(lon_range)[np.isin(lon_indices, list(lons_with_data))])
 
         # Return results
         return (total_climate_df, final_lon_range)
@@ -399,5 +813,7 @@ class MyUtilityBeast():
         # This function will return a list of lists
         # where the first value represents latitude and the second value represents longitude
         coordinate_list_table = pd.read_csv(input_file, names=['lat', 'lon'])
+        # Rows that are not numeric (like a "lat,lon" header) are dropped
+        coordinate_list_table = coordinate_list_table.apply(pd.to_numeric, errors='coerce').dropna()
         coordinate_list_array = [[row.lat, row.lon] for i, row in coordinate_list_table.iterrows()]
         return coordinate_list_array
\ No newline at end of file
@@ -0,0 +1,353 @@
+
+import hashlib
+import io
+import logging
+import os
+import threading
+
+from collections import OrderedDict
+from pathlib import Path
+
+class BlockCache():
+    """This class will provide a read-through cache of fixed-size blocks of the NetCDF4 files read from S3
+
+        Every lat/lon combination extracted from a NetCDF4 file stored in S3 translates into range requests for the
+        chunks holding its values. Neighbouring points share chunks, points of a coordinates file are extracted one
+        after the other from the same files, and the metadata of a file is read again every time it is opened, so
+        the same bytes end up being requested over and over again. The cache splits every file into blocks of a
+        fixed size and keeps the blocks that were fetched: reads are served from memory first, then from an
+        optional folder on local disk (ideally an SSD), and only the missing blocks are requested from S3, with a
+        single request for every run of consecutive missing blocks.
+
+        Blocks are keyed by the path of the file and its version (its ETag), so a file that changes in S3 is never
+        read from stale blocks. When the blocks kept in memory or on disk grow above their size budget, the least
+        recently used blocks are removed first. A single cache is meant to be shared by all the reads of a run, see
+        MyUtilityBeast, and it counts its memory hits, disk hits and misses.
+
+        Args:
+            block_size (int, optional): the size of the blocks in bytes. Defaults to 4 MB.
+            max_memory_mb (float, optional): the maximum amount of memory used by the blocks, in megabytes. Use 0 to keep blocks on disk only. Defaults to 256.
+            disk_dir (str, optional): the folder where blocks are also kept on disk, so that they survive the run. Defaults to None (blocks are only kept in memory).
+            max_disk_mb (float, optional): the maximum amount of disk space used by the blocks, in megabytes. Defaults to 10240.
+
+    """
+
+    def __init__(self, block_size=4 * 1024 * 1024, max_memory_mb=256, disk_dir=None, max_disk_mb=10240):
+
+        # Setup logging
+        # We need to pass the "logger" to any Classes or Modules that may use it
+        # in our script
+        try:
+            import coloredlogs
+            logger = logging.getLogger('POPBEAST.BLOCK_CACHE')
+            if 'bestiapop' in __name__:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="WARNING", logger=logger)
+            else:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="DEBUG", logger=logger)
+
+        except ModuleNotFoundError:
+            logger = logging.getLogger('POPBEAST.BLOCK_CACHE')
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(message)s')
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(formatter)
+            console_handler.setLevel(logging.DEBUG)
+            logger.addHandler(console_handler)
+            if 'bestiapop' in __name__:
+                logger.setLevel(logging.WARNING)
+            else:
+                logger.setLevel(logging.INFO)
+
+        # Setting up class variables
+        self.logger = logger
+        self.block_size = max(1, int(block_size))
+        self.max_memory_bytes = int(max_memory_mb * 1024 * 1024)
+        self.disk_dir = Path(disk_dir) if disk_dir is not None else None
+        self.max_disk_bytes = int(max_disk_mb * 1024 * 1024)
+
+        # Blocks kept in memory, ordered from least to most recently used
+        self.memory_blocks = OrderedDict()
+        self.memory_size = 0
+
+        # The size of the blocks on disk is only measured once (when the first block is stored)
+        # and then kept up to date as blocks are added and evicted
+        self.disk_size = None
+
+        # Reads are served by several threads at the same time
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.fetched_bytes = 0
+        self._lock = threading.Lock()
+
+    def get_block_file(self, block_key):
+        """Obtain the path of the file a block is kept in on disk
+
+        Args:
+            block_key (tuple): the (path, version, block number) of the block
+
+        Returns:
+            pathlib.Path: the path to the block
+        """
+
+        file_hash = hashlib.sha256("{}|{}".format(block_key[0], block_key[1]).encode()).hexdigest()
+
+        return self.disk_dir/"{}.{}.blk".format(file_hash, block_key[2])
+
+    def get_block(self, block_key):
+        """Obtain a block from memory or, failing that, from disk
+
+        Args:
+            block_key (tuple): the (path, version, block number) of the block
+
+        Returns:
+            bytes: the block, or None if it is not cached
+        """
+
+        with self._lock:
+            block = self.memory_blocks.get(block_key)
+            if block is not None:
+                self.memory_blocks.move_to_end(block_key)
+                self.memory_hits += 1
+                return block
+
+        if self.disk_dir is not None:
+            block_file = self.get_block_file(block_key)
+            try:
+                with open(block_file, 'rb') as f:
+                    block = f.read()
+            except FileNotFoundError:
+                block = None
+            except Exception as e:
+                self.logger.warning('Could not read cached block {}, it will be ignored: {}'.format(block_file, e))
+                block = None
+
+            if block is not None:
+                # The modification time of a block records when it was last used, which drives the LRU eviction
+                try:
+                    os.utime(block_file)
+                except OSError:
+                    pass
+
+                self.put_memory_block(block_key, block)
+                with self._lock:
+                    self.disk_hits += 1
+                return block
+
+        with self._lock:
+            self.misses += 1
+
+        return None
+
+    def put_memory_block(self, block_key, block):
+        """Keep a block in memory, evicting the least recently used blocks if the memory budget is exceeded
+
+        Args:
+            block_key (tuple): the (path, version, block number) of the block
+            block (bytes): the block
+        """
+
+        if len(block) > self.max_memory_bytes:
+            return
+
+        with self._lock:
+            if block_key in self.memory_blocks:
+                return
+
+            self.memory_blocks[block_key] = block
+            self.memory_size += len(block)
+
+            while self.memory_size > self.max_memory_bytes:
+                evicted_key, evicted_block = self.memory_blocks.popitem(last=False)
+                self.memory_size -= len(evicted_block)
+
+    def put_disk_block(self, block_key, block):
+        """Keep a block on disk, evicting the least recently used blocks if the disk budget is exceeded
+
+        Args:
+            block_key (tuple): the (path, version, block number) of the block
+            block (bytes): the block
+        """
+
+        block_file = self.get_block_file(block_key)
+        self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary file first and then move it in place, so that
+        # several processes caching the same block at the same time do not corrupt it
+        temp_file = self.disk_dir/"{}.{}.{}.tmp".format(block_file.name, os.getpid(), threading.get_ident())
+        try:
+            with open(temp_file, 'wb') as f:
+                f.write(block)
+            os.replace(temp_file, block_file)
+        except Exception as e:
+            self.logger.warning('Could not cache block {}: {}'.format(block_file, e))
+            return
+
+        with self._lock:
+            if self.disk_size is None:
+                self.disk_size = sum(x.stat().st_size for x in self.disk_dir.glob("*.blk"))
+            else:
+                self.disk_size += len(block)
+
+            if self.disk_size > self.max_disk_bytes:
+                self.evict_disk_blocks()
+
+    def evict_disk_blocks(self):
+        """Remove the least recently used blocks from disk until they fit in their size budget
+        """
+
+        blocks = []
+        for block_file in self.disk_dir.glob("*.blk"):
+            try:
+                block_stat = block_file.stat()
+            except FileNotFoundError:
+                # Already removed by another process
+                continue
+            blocks.append((block_stat.st_mtime, block_stat.st_size, block_file))
+
+        self.disk_size = sum(x[1] for x in blocks)
+
+        for block_mtime, block_size, block_file in sorted(blocks):
+            if self.disk_size <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(block_file)
+            except FileNotFoundError:
+                pass
+            self.disk_size -= block_size
+
+        self.logger.debug('Evicted cached blocks, the disk cache now uses {} bytes'.format(self.disk_size))
+
+    def read(self, fs, path, version, first_byte, end_byte, file_size=None):
+        """Read a range of bytes of a file, fetching only the blocks that are not cached
+
+        Args:
+            fs (fsspec.AbstractFileSystem): the file system holding the file, e.g. an s3fs.S3FileSystem
+            path (str): the path to the file inside its file system
+            version (str): the version of the file (e.g. its ETag), so that blocks of an older version are not reused
+            first_byte (int): the first byte to read
+            end_byte (int): the byte after the last one to read
+            file_size (int, optional): the size of the file, so that the last block is not requested past the end of the file. Defaults to None.
+
+        Returns:
+            bytes: the requested bytes (fewer if the file ends before "end_byte")
+        """
+
+        if end_byte <= first_byte:
+            return b""
+
+        first_block = first_byte // self.block_size
+        last_block = (end_byte - 1) // self.block_size
+
+        blocks = {}
+        missing_blocks = []
+        for block_number in range(first_block, last_block + 1):
+            block = self.get_block((path, version, block_number))
+            if block is None:
+                missing_blocks.append(block_number)
+            else:
+                blocks[block_number] = block
+
+        # Fetch every run of consecutive missing blocks with a single request
+        block_runs = []
+        for block_number in missing_blocks:
+            if block_runs and block_runs[-1][-1] == block_number - 1:
+                block_runs[-1].append(block_number)
+            else:
+                block_runs.append([block_number])
+
+        for block_run in block_runs:
+            run_start = block_run[0] * self.block_size
+            run_end = (block_run[-1] + 1) * self.block_size
+            if file_size is not None:
+                run_end = min(run_end, file_size)
+
+            run_bytes = fs.cat_file(path, start=run_start, end=run_end)
+
+            with self._lock:
+                self.fetched_bytes += len(run_bytes)
+
+            for block_number in block_run:
+                block = run_bytes[(block_number - block_run[0]) * self.block_size:(block_number - block_run[0] + 1) * self.block_size]
+                blocks[block_number] = block
+                self.put_memory_block((path, version, block_number), block)
+                if self.disk_dir is not None:
+                    self.put_disk_block((path, version, block_number), block)
+
+        range_bytes = b"".join(blocks[x] for x in range(first_block, last_block + 1))
+
+        return range_bytes[first_byte - first_block * self.block_size:end_byte - first_block * self.block_size]
+
+    def open(self, fs, path, version=None, file_size=None):
+        """Open a file for reading through the cache
+
+        Args:
+            fs (fsspec.AbstractFileSystem): the file system holding the file, e.g. an s3fs.S3FileSystem
+            path (str): the path to the file inside its file system
+            version (str, optional): the version of the file (e.g. its ETag). Defaults to None (obtained from the file system).
+            file_size (int, optional): the size of the file. Defaults to None (obtained from the file system).
+
+        Returns:
+            BlockCacheFile: a read-only file-like object, which can be used in place of the file objects of s3fs (e.g. by h5py)
+        """
+
+        if version is None or file_size is None:
+            file_info = fs.info(path)
+            version = file_info.get("ETag", file_info.get("size")) if version is None else version
+            file_size = file_info["size"] if file_size is None else file_size
+
+        return BlockCacheFile(self, fs, path, version, file_size)
+
+class BlockCacheFile(io.RawIOBase):
+    """This class will provide a read-only file-like object whose reads are served by a BlockCache
+
+        Args:
+            cache (BlockCache): the cache serving the reads
+            fs (fsspec.AbstractFileSystem): the file system holding the file, e.g. an s3fs.S3FileSystem
+            path (str): the path to the file inside its file system
+            version (str): the version of the file (e.g. its ETag)
+            file_size (int): the size of the file
+
+    """
+
+    def __init__(self, cache, fs, path, version, file_size):
+
+        # Setting up class variables
+        super().__init__()
+        self.cache = cache
+        self.fs = fs
+        self.path = path
+        self.version = version
+        self.file_size = file_size
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        elif whence == io.SEEK_END:
+            self.position = self.file_size + offset
+        else:
+            raise ValueError('Invalid whence ({})'.format(whence))
+
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def readinto(self, buffer):
+        byte_count = max(0, min(len(buffer), self.file_size - self.position))
+        if byte_count == 0:
+            return 0
+
+        range_bytes = self.cache.read(self.fs, self.path, self.version, self.position, self.position + byte_count, self.file_size)
+        buffer[:len(range_bytes)] = range_bytes
+        self.position += len(range_bytes)
+
+        return len(range_bytes)
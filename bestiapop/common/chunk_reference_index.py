@@ -0,0 +1,476 @@
+
+import json
+import logging
+import numpy as np
+import os
+import sys
+import zlib
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Ugly but workable importing solution so that the package can be both
+# imported as a package, run from commandline with `python -m bestiapop`
+# or from the source directory as `python bestiapop.py`
+if "bestiapop" in sys.modules:
+    from bestiapop.common import (climate_grid, hyperslab_reader)
+else:
+    from common import (climate_grid, hyperslab_reader)
+
+class ChunkReferenceIndex():
+    """This class will provide methods to index the byte ranges of the HDF5 chunks of NetCDF4 files stored in the cloud
+
+        Reading a NetCDF4 file straight from S3 with h5py or xarray means HDF5 walks the metadata and the chunk B-tree
+        of the file through the file-like object, issuing many small sequential requests before reading a single
+        value, and does so every time the file is opened. The index records, once per file, everything needed to
+        read values without HDF5: the lat and lon axes, the year of the data, how the climate variable is stored
+        (data type, chunk shape and compression filters) and the byte offset and size of every one of its chunks.
+        It is stored locally as a small JSON file (similar to a kerchunk reference file), so that values can then
+        be read by fetching only the chunks covering the requested coordinates, see ChunkReferenceReader.
+
+        The index folder contains, for every "year.variable" combination:
+            * year.variable.refs.json: the references of the file, along with its size and ETag, used to detect when the index is out of date
+
+        Args:
+            index_dir (str, optional): the folder where the indexes are (or will be) stored. Defaults to a "bpop-chunk-index" folder inside the ".bestiapop" folder in the user's home directory.
+            data_source (str, optional): the climate database the NetCDF4 files belong to. Defaults to "silo".
+
+    """
+
+    # Name of the folder BestiaPop uses inside the ".bestiapop" folder
+    index_folder_name = "bpop-chunk-index"
+
+    # HDF5 filters that can be undone without HDF5: deflate (gzip), shuffle and fletcher32 (checksum)
+    filter_deflate = 1
+    filter_shuffle = 2
+    filter_fletcher32 = 3
+    supported_filters = (filter_deflate, filter_shuffle, filter_fletcher32)
+
+    def __init__(self, index_dir=None, data_source="silo"):
+
+        # Setup logging
+        # We need to pass the "logger" to any Classes or Modules that may use it
+        # in our script
+        try:
+            import coloredlogs
+            logger = logging.getLogger('POPBEAST.CHUNK_REFERENCE_INDEX')
+            if 'bestiapop' in __name__:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="WARNING", logger=logger)
+            else:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="DEBUG", logger=logger)
+
+        except ModuleNotFoundError:
+            logger = logging.getLogger('POPBEAST.CHUNK_REFERENCE_INDEX')
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(message)s')
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(formatter)
+            console_handler.setLevel(logging.DEBUG)
+            logger.addHandler(console_handler)
+            if 'bestiapop' in __name__:
+                logger.setLevel(logging.WARNING)
+            else:
+                logger.setLevel(logging.INFO)
+
+        # Setting up class variables
+        self.logger = logger
+        if index_dir is None:
+            index_dir = Path.home()/".bestiapop"/self.index_folder_name
+        self.index_dir = Path(index_dir)
+        self.data_source = data_source
+
+    def get_index_file(self, source_path):
+        """Obtain the path of the index of a NetCDF4 file
+
+        Args:
+            source_path (str): the path to the NetCDF4 file inside its file system, e.g. "silo-open-data/annual/daily_rain/2015.daily_rain.nc"
+
+        Returns:
+            pathlib.Path: the path to the index file
+        """
+
+        file_name = str(source_path).rstrip("/").split("/")[-1]
+        file_stem = file_name[:-len(".nc")] if file_name.endswith(".nc") else file_name
+
+        return self.index_dir/"{}.refs.json".format(file_stem)
+
+    def get_source_version(self, fs, source_path):
+        """Obtain the size and ETag of a NetCDF4 file, which identify the version of the file the index was built from
+
+        Args:
+            fs (fsspec.AbstractFileSystem): the file system holding the NetCDF4 file, e.g. an s3fs.S3FileSystem
+            source_path (str): the path to the NetCDF4 file inside its file system
+
+        Returns:
+            dict: a dictionary with the "size" and "etag" of the file (the ETag is None for file systems that do not provide one)
+        """
+
+        source_info = fs.info(source_path)
+
+        return {
+            "size": source_info.get("size"),
+            "etag": source_info.get("ETag")
+        }
+
+    def load(self, source_path, source_version):
+        """Load the index of a NetCDF4 file, as long as it was built from the current version of the file
+
+        Args:
+            source_path (str): the path to the NetCDF4 file inside its file system
+            source_version (dict): the current size and ETag of the file, see get_source_version
+
+        Returns:
+            dict: the references of the file, or None if the file was not indexed yet or the index is out of date
+        """
+
+        index_file = self.get_index_file(source_path)
+
+        if index_file.is_file() == False:
+            return None
+
+        try:
+            with open(index_file, 'r') as f:
+                references = json.load(f)
+        except Exception as e:
+            self.logger.warning('Could not load chunk index {}, it will be rebuilt: {}'.format(index_file, e))
+            return None
+
+        if references.get("source_version") != source_version:
+            self.logger.info('Chunk index {} is out of date, it will be rebuilt'.format(index_file))
+            return None
+
+        return references
+
+    def build(self, fs, source_path, climate_variable, source_version, block_cache=None):
+        """Index the chunks of a climate variable stored in a NetCDF4 file
+
+        Only the metadata of the file is read: its axes, the attributes of the climate variable and the chunk
+        B-tree, through the "get_chunk_info" method of h5py (which requires HDF5 1.10.5 or later).
+
+        Args:
+            fs (fsspec.AbstractFileSystem): the file system holding the NetCDF4 file, e.g. an s3fs.S3FileSystem
+            source_path (str): the path to the NetCDF4 file inside its file system
+            climate_variable (str): the climate variable contained in the file
+            source_version (dict): the current size and ETag of the file, see get_source_version
+            block_cache (BlockCache, optional): the cache the metadata of the file is read through. Defaults to None (the metadata is read straight from the file system).
+
+        Raises:
+            ValueError: if the climate variable is stored in a way that cannot be read without HDF5 (e.g. with compression filters other than deflate and shuffle)
+
+        Returns:
+            dict: the references of the file
+        """
+
+        self.logger.info('Indexing the chunks of {}'.format(source_path))
+
+        if block_cache is not None:
+            remote_file_obj = block_cache.open(fs, source_path, source_version["etag"] or source_version["size"], source_version["size"])
+        else:
+            remote_file_obj = fs.open(source_path, mode='rb')
+
+        with remote_file_obj:
+            reader = hyperslab_reader.HyperslabReader(remote_file_obj, data_source=self.data_source)
+
+            try:
+                dataset = reader.h5_file[climate_variable]
+                creation_properties = dataset.id.get_create_plist()
+                filters = [creation_properties.get_filter(x)[0] for x in range(creation_properties.get_nfilters())]
+
+                unsupported_filters = [x for x in filters if x not in self.supported_filters]
+                if unsupported_filters:
+                    raise ValueError('{} uses HDF5 filters {} which cannot be decoded without HDF5'.format(source_path, unsupported_filters))
+
+                if dataset.chunks is not None:
+                    chunk_shape = list(dataset.chunks)
+                    chunk_refs = []
+                    for chunk_position in range(dataset.id.get_num_chunks()):
+                        chunk_info = dataset.id.get_chunk_info(chunk_position)
+                        chunk_refs.append(list(chunk_info.chunk_offset) + [chunk_info.byte_offset, chunk_info.size, chunk_info.filter_mask])
+                else:
+                    # A contiguous variable behaves as a single uncompressed chunk covering the whole variable
+                    if dataset.id.get_offset() is None:
+                        raise ValueError('{} stores {} in a way that cannot be read without HDF5'.format(source_path, climate_variable))
+                    chunk_shape = list(dataset.shape)
+                    chunk_refs = [[0] * dataset.ndim + [dataset.id.get_offset(), dataset.id.get_storage_size(), 0]]
+
+                references = {
+                    "source_version": source_version,
+                    "lat": reader.lat.tolist(),
+                    "lon": reader.lon.tolist(),
+                    "data_year": int(reader.get_data_year()),
+                    "time_size": int(reader.time_size),
+                    "variables": {
+                        climate_variable: {
+                            "dtype": dataset.dtype.str,
+                            "shape": list(dataset.shape),
+                            "chunks": chunk_shape,
+                            "axis_order": reader.get_axis_order(climate_variable),
+                            "filters": filters,
+                            "fill_value": np.asarray(dataset.fillvalue).tolist(),
+                            "attributes": {x: np.atleast_1d(dataset.attrs[x]).tolist() for x in ['_FillValue', 'missing_value', 'scale_factor', 'add_offset'] if x in dataset.attrs},
+                            "chunk_refs": chunk_refs
+                        }
+                    }
+                }
+            finally:
+                reader.close()
+
+        return references
+
+    def save(self, source_path, references):
+        """Save the index of a NetCDF4 file
+
+        Args:
+            source_path (str): the path to the NetCDF4 file inside its file system
+            references (dict): the references of the file, see build
+        """
+
+        index_file = self.get_index_file(source_path)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary file first and then move it in place, so that several
+        # processes indexing the same file at the same time do not corrupt it
+        temp_file = self.index_dir/"{}.{}.tmp".format(index_file.name, os.getpid())
+        with open(temp_file, 'w') as f:
+            json.dump(references, f)
+        os.replace(temp_file, index_file)
+
+        self.logger.debug('Saved chunk index to {}'.format(index_file))
+
+    def open(self, fs, source_path, climate_variable, max_concurrency=8, block_cache=None):
+        """Open a NetCDF4 file for reading through its index, indexing the file first if it was not indexed yet or the index is out of date
+
+        Args:
+            fs (fsspec.AbstractFileSystem): the file system holding the NetCDF4 file, e.g. an s3fs.S3FileSystem
+            source_path (str): the path to the NetCDF4 file inside its file system
+            climate_variable (str): the climate variable contained in the file
+            max_concurrency (int, optional): the maximum number of range requests sent at the same time when reading values. Defaults to 8.
+            block_cache (BlockCache, optional): the cache the file is read through, shared by all the files of a run. Defaults to None (every read is sent to the file system).
+
+        Raises:
+            ValueError: if the climate variable is stored in a way that cannot be read without HDF5
+
+        Returns:
+            ChunkReferenceReader: an object that can be used in place of a HyperslabReader
+        """
+
+        source_version = self.get_source_version(fs, source_path)
+        references = self.load(source_path, source_version)
+
+        if references is None or climate_variable not in references["variables"]:
+            references = self.build(fs, source_path, climate_variable, source_version, block_cache=block_cache)
+            self.save(source_path, references)
+
+        return ChunkReferenceReader(fs, source_path, references, climate_variable, data_source=self.data_source, max_concurrency=max_concurrency, block_cache=block_cache)
+
+class ChunkReferenceReader(hyperslab_reader.HyperslabReader):
+    """This class will provide read access to a NetCDF4 file indexed by ChunkReferenceIndex, with the same methods as HyperslabReader
+
+        Values are read by working out which chunks intersect the requested hyperslab, fetching their byte ranges
+        with HTTP range requests and decompressing them with zlib. Chunks that are close to each other in the file
+        are fetched with a single request (coalescing small gaps between them), and the requests are sent in
+        parallel, so that reading a bounding box costs a handful of round trips instead of one per chunk.
+
+        Args:
+            fs (fsspec.AbstractFileSystem): the file system holding the NetCDF4 file, e.g. an s3fs.S3FileSystem
+            source_path (str): the path to the NetCDF4 file inside its file system
+            references (dict): the references of the file, see ChunkReferenceIndex.build
+            climate_variable (str): the climate variable contained in the file
+            data_source (str, optional): the climate database the file belongs to, used to map coordinates to grid indices. Defaults to "silo".
+            max_concurrency (int, optional): the maximum number of range requests sent at the same time. Defaults to 8.
+            block_cache (BlockCache, optional): the cache byte ranges are read through, so that chunks shared by several reads are only fetched once. Defaults to None.
+
+    """
+
+    # Chunks separated by less than this amount of bytes are fetched with a single request, since
+    # downloading the gap is cheaper than the latency of another request
+    max_gap_size = 1024 * 1024
+
+    # Upper bound of the size of a single request, so that large reads are still spread across connections
+    max_request_size = 16 * 1024 * 1024
+
+    def __init__(self, fs, source_path, references, climate_variable, data_source="silo", max_concurrency=8, block_cache=None):
+
+        # Setting up class variables
+        # NOTE: there is no HDF5 file behind an indexed file, so HyperslabReader.__init__ is not called
+        self.logger = logging.getLogger('POPBEAST.CHUNK_REFERENCE_INDEX')
+        self.grid = climate_grid.ClimateGrid(data_source)
+        self.fs = fs
+        self.source_path = source_path
+        self.climate_variable = climate_variable
+        self.variable = references["variables"][climate_variable]
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.block_cache = block_cache
+
+        # Blocks are cached per version of the file, identified by its ETag (or its size when there is none)
+        self.source_size = references["source_version"]["size"]
+        self.source_version_tag = references["source_version"]["etag"] or self.source_size
+
+        self.lat = np.array(references["lat"])
+        self.lon = np.array(references["lon"])
+        self.data_year = references["data_year"]
+        self.lat_lookup = self.grid.get_axis_lookup(self.lat)
+        self.lon_lookup = self.grid.get_axis_lookup(self.lon)
+        self.time_size = references["time_size"]
+
+        # Chunks are looked up by the position of their first element, as HDF5 identifies them
+        self.dtype = np.dtype(self.variable["dtype"])
+        self.chunk_shape = tuple(self.variable["chunks"])
+        self.chunk_refs = {tuple(x[:-3]): tuple(x[-3:]) for x in self.variable["chunk_refs"]}
+
+        # Requests per file are sent by a thread pool shared by all the reads
+        self.read_executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+
+    def get_data_year(self):
+        """Obtain the year the indexed file contains data for
+
+        Returns:
+            int: the year the file contains data for
+        """
+
+        return self.data_year
+
+    def get_axis_order(self, climate_variable):
+        """Find the position of the time, lat and lon dimensions within a climate variable
+
+        Args:
+            climate_variable (str): the climate variable short name
+
+        Returns:
+            list: the position of the time, lat and lon dimensions, in that order
+        """
+
+        if climate_variable != self.climate_variable:
+            raise KeyError(climate_variable)
+
+        return self.variable["axis_order"]
+
+    def get_read_ranges(self, chunk_offsets):
+        """Group the chunks to read into as few byte ranges as possible
+
+        Args:
+            chunk_offsets (list): the positions of the first element of every chunk to read
+
+        Returns:
+            list: a list of (first byte, last byte + 1, chunk offsets) tuples, one per request
+        """
+
+        stored_chunks = sorted([x for x in chunk_offsets if x in self.chunk_refs], key=lambda x: self.chunk_refs[x][0])
+
+        read_ranges = []
+        for chunk_offset in stored_chunks:
+            byte_offset, byte_size = self.chunk_refs[chunk_offset][:2]
+
+            # Extend the previous range if the gap is small and the range does not grow too large
+            if read_ranges and byte_offset - read_ranges[-1][1] <= self.max_gap_size and byte_offset + byte_size - read_ranges[-1][0] <= self.max_request_size:
+                read_ranges[-1][1] = max(read_ranges[-1][1], byte_offset + byte_size)
+                read_ranges[-1][2].append(chunk_offset)
+            else:
+                read_ranges.append([byte_offset, byte_offset + byte_size, [chunk_offset]])
+
+        return [tuple(x) for x in read_ranges]
+
+    def read_range(self, first_byte, end_byte):
+        """Fetch a range of bytes of the indexed file
+
+        Args:
+            first_byte (int): the first byte to fetch
+            end_byte (int): the byte after the last one to fetch
+
+        Returns:
+            bytes: the requested bytes
+        """
+
+        if self.block_cache is not None:
+            return self.block_cache.read(self.fs, self.source_path, self.source_version_tag, first_byte, end_byte, self.source_size)
+
+        return self.fs.cat_file(self.source_path, start=first_byte, end=end_byte)
+
+    def decode_chunk(self, chunk_bytes, filter_mask):
+        """Undo the HDF5 filters applied to a chunk and convert it to an array
+
+        Args:
+            chunk_bytes (bytes): the chunk as stored in the file
+            filter_mask (int): the HDF5 filter mask of the chunk, where bit "n" is set when filter "n" of the pipeline was not applied to it
+
+        Returns:
+            numpy.ndarray: the raw values of the chunk, with the shape of a full chunk
+        """
+
+        # Filters are applied in the order of the pipeline when writing, so they are undone in reverse
+        for filter_position in reversed(range(len(self.variable["filters"]))):
+            if filter_mask & (1 << filter_position):
+                continue
+
+            filter_id = self.variable["filters"][filter_position]
+
+            if filter_id == ChunkReferenceIndex.filter_deflate:
+                chunk_bytes = zlib.decompress(chunk_bytes)
+            elif filter_id == ChunkReferenceIndex.filter_fletcher32:
+                # The checksum is appended to the end of the chunk
+                chunk_bytes = chunk_bytes[:-4]
+            elif filter_id == ChunkReferenceIndex.filter_shuffle and self.dtype.itemsize > 1:
+                # The first byte of every value is stored first, then the second byte of every value and so on
+                value_count = len(chunk_bytes) // self.dtype.itemsize
+                shuffled_bytes = np.frombuffer(chunk_bytes, dtype=np.uint8, count=value_count * self.dtype.itemsize)
+                chunk_bytes = shuffled_bytes.reshape(self.dtype.itemsize, value_count).T.tobytes() + chunk_bytes[value_count * self.dtype.itemsize:]
+
+        return np.frombuffer(chunk_bytes, dtype=self.dtype, count=int(np.prod(self.chunk_shape))).reshape(self.chunk_shape)
+
+    def read_hyperslab(self, climate_variable, time_slice, lat_slice, lon_slice):
+        """Read a hyperslab of a climate variable by fetching the chunks that intersect with it and decode its values
+
+        Args:
+            climate_variable (str): the climate variable short name
+            time_slice (slice): the time positions to read
+            lat_slice (slice): the latitude positions to read
+            lon_slice (slice): the longitude positions to read
+
+        Returns:
+            numpy.ndarray: a 3D array ordered as (day, latitude, longitude)
+        """
+
+        axis_order = self.get_axis_order(climate_variable)
+        shape = self.variable["shape"]
+
+        # Build the selection in the order the dimensions are stored in the file
+        selection = [None] * len(shape)
+        for position, dimension_slice in zip(axis_order, [time_slice, lat_slice, lon_slice]):
+            selection[position] = range(*dimension_slice.indices(shape[position]))
+        selection_start = [x.start for x in selection]
+        selection_stop = [x.start + len(x) for x in selection]
+
+        # Chunks that were never written hold the fill value of the variable
+        raw_values = np.full([len(x) for x in selection], self.variable["fill_value"], dtype=self.dtype)
+
+        if raw_values.size > 0:
+            # Positions of the first element of every chunk intersecting with the selection
+            chunk_ranges = [range((start // chunk_size) * chunk_size, stop, chunk_size) for start, stop, chunk_size in zip(selection_start, selection_stop, self.chunk_shape)]
+            chunk_offsets = [tuple(x) for x in np.stack(np.meshgrid(*chunk_ranges, indexing='ij'), axis=-1).reshape(-1, len(shape)).tolist()]
+            read_ranges = self.get_read_ranges(chunk_offsets)
+
+            self.logger.debug('Reading {} chunks of {} with {} range requests'.format(sum(len(x[2]) for x in read_ranges), self.source_path, len(read_ranges)))
+
+            for (first_byte, end_byte, range_chunks), range_bytes in zip(read_ranges, self.read_executor.map(lambda x: self.read_range(x[0], x[1]), read_ranges)):
+                for chunk_offset in range_chunks:
+                    byte_offset, byte_size, filter_mask = self.chunk_refs[chunk_offset]
+                    chunk_values = self.decode_chunk(range_bytes[byte_offset - first_byte:byte_offset - first_byte + byte_size], filter_mask)
+
+                    # Copy the part of the chunk that falls within the selection
+                    target = []
+                    source = []
+                    for chunk_start, chunk_size, start, stop in zip(chunk_offset, self.chunk_shape, selection_start, selection_stop):
+                        overlap_start = max(chunk_start, start)
+                        overlap_stop = min(chunk_start + chunk_size, stop)
+                        target.append(slice(overlap_start - start, overlap_stop - start))
+                        source.append(slice(overlap_start - chunk_start, overlap_stop - chunk_start))
+                    raw_values[tuple(target)] = chunk_values[tuple(source)]
+
+        raw_values = np.transpose(raw_values, axis_order)
+
+        return self.decode_values(self.variable["attributes"], raw_values)
+
+    def close(self):
+        """Stop the threads sending range requests
+        """
+
+        self.read_executor.shutdown(wait=True)
@@ -0,0 +1,131 @@
+
+import numpy as np
+
+class ClimateGrid():
+    """This class will provide methods to translate latitude and longitude values into integer grid indices
+
+        Both SILO and NASAPOWER provide data on regular grids (0.05 and 0.5 degrees respectively). Instead of
+        matching coordinates with float equality, which is subject to float representation issues (for
+        example -41.15 vs -41.150000000000006), each coordinate is mapped to the integer index of the grid
+        cell it belongs to: index = round(coordinate / resolution). Two coordinates refer to the same cell
+        if, and only if, their indices are equal, and converting an index back to a coordinate always yields
+        the same float value.
+
+        Args:
+            data_source (str): The climate database whose grid will be used: SILO or NASAPOWER
+            resolution (float, optional): the resolution of the grid in degrees, when a grid finer than the one of the data source is needed. Defaults to None (the resolution of the data source).
+
+    """
+
+    # Resolution of the grid (in degrees) for each data source
+    grid_resolution = {
+        "silo":         0.05,
+        "nasapower":    0.5
+    }
+
+    def __init__(self, data_source="silo", resolution=None):
+
+        self.data_source = data_source
+        self.resolution = resolution if resolution is not None else self.grid_resolution[data_source]
+
+    def to_index(self, coordinates):
+        """Map latitude or longitude values to the integer index of the grid cell they belong to
+
+        Args:
+            coordinates (float or numpy.ndarray): a single coordinate or an array of coordinates
+
+        Returns:
+            int or numpy.ndarray: the grid index (or array of indices) for the coordinate(s)
+        """
+
+        indices = np.rint(np.asarray(coordinates, dtype=float) / self.resolution).astype(np.int64)
+
+        if indices.ndim == 0:
+            return int(indices)
+
+        return indices
+
+    def to_coordinate(self, indices):
+        """Map integer grid indices back to latitude or longitude values
+
+        Args:
+            indices (int or numpy.ndarray): a single grid index or an array of grid indices
+
+        Returns:
+            float or numpy.ndarray: the coordinate (or array of coordinates) of the grid cell(s)
+        """
+
+        coordinates = np.round(np.asarray(indices) * self.resolution, decimals=2)
+
+        if coordinates.ndim == 0:
+            return float(coordinates)
+
+        return coordinates
+
+    def get_index_range(self, first_coordinate, last_coordinate):
+        """Obtain the indices of all the grid cells between two coordinates (both ends included)
+
+        Args:
+            first_coordinate (float): one end of the range
+            last_coordinate (float): the other end of the range, the order of both ends does not matter
+
+        Returns:
+            numpy.ndarray: an array of grid indices in ascending order
+        """
+
+        first_index, last_index = sorted([self.to_index(first_coordinate), self.to_index(last_coordinate)])
+        return np.arange(first_index, last_index + 1)
+
+    def get_positions(self, indices, axis_coordinates):
+        """Find the position of grid indices within the latitude or longitude axis of a dataset
+
+        Args:
+            indices (numpy.ndarray): the grid indices to look for
+            axis_coordinates (numpy.ndarray): the latitude or longitude values of the dataset's axis
+
+        Returns:
+            numpy.ndarray: the position of each index within the axis, or -1 when the index is not part of it
+        """
+
+        axis_lookup = self.get_axis_lookup(axis_coordinates)
+        return np.array([axis_lookup.get(int(x), -1) for x in np.atleast_1d(indices)], dtype=np.int64)
+
+    def get_axis_lookup(self, axis_coordinates):
+        """Build a dictionary to find the position of a grid index within a latitude or longitude axis in O(1)
+
+        Args:
+            axis_coordinates (numpy.ndarray): the latitude or longitude values of the dataset's axis
+
+        Returns:
+            dict: a dictionary where keys are grid indices and values are positions within the axis
+        """
+
+        return {int(index): position for position, index in enumerate(np.atleast_1d(self.to_index(axis_coordinates)))}
+
+    def snap(self, coordinates):
+        """Snap arbitrary latitude or longitude values (e.g. weather station coordinates) to the centre of the grid cell they fall in
+
+        Args:
+            coordinates (float or numpy.ndarray): a single coordinate or an array of coordinates
+
+        Returns:
+            float or numpy.ndarray: the coordinate (or array of coordinates) of the nearest grid cell centre(s)
+        """
+
+        return self.to_coordinate(self.to_index(coordinates))
+
+    def get_unique_cells(self, lats, lons):
+        """Snap a list of lat/lon combinations to the grid in a single vectorized step and remove the duplicated grid cells
+
+        Args:
+            lats (numpy.ndarray): the latitude of each lat/lon combination
+            lons (numpy.ndarray): the longitude of each lat/lon combination
+
+        Returns:
+            tuple: a tuple consisting of (a) the latitude of each distinct grid cell, (b) the longitude of each distinct grid cell and (c) for each of the original lat/lon combinations, the position of its grid cell within the two previous arrays. The tuple is ordered as follows: (cell_lats, cell_lons, cell_positions)
+        """
+
+        cell_indices = np.column_stack((np.atleast_1d(self.to_index(lats)), np.atleast_1d(self.to_index(lons))))
+        unique_cells, cell_positions = np.unique(cell_indices, axis=0, return_inverse=True)
+
+        return (self.to_coordinate(unique_cells[:, 0]), self.to_coordinate(unique_cells[:, 1]), cell_positions.reshape(-1))
@@ -0,0 +1,68 @@
+
+import numpy as np
+
+class ClimateSeries():
+    """This class will hold the daily series returned by a climate API for a single lat/lon combination in columnar form
+
+        The APIs return one record per day (SILO) or one dictionary of days per climate variable (NASA POWER).
+        Filtering those records by year, once for every year and climate variable, means rescanning the whole
+        payload each time, which gets slow for multi-decade requests. The payload is instead converted once into
+        a 2D array with one row per day and one column per climate variable, together with the position of each
+        year within the rows, so that obtaining the values of a climate variable for a given year is a single slice.
+
+        Args:
+            years (numpy.ndarray): the year of every day in the series, in chronological order
+            values (numpy.ndarray): a 2D array of shape (day, climate variable) with the daily values
+            variable_codes (list): the climate variable codes, in the same order as the columns of "values"
+
+    """
+
+    def __init__(self, years, values, variable_codes):
+
+        # Setting up class variables
+        self.values = values
+        self.variable_positions = {x: i for i, x in enumerate(variable_codes)}
+
+        # Days are in chronological order, so each year is a contiguous run of rows
+        unique_years, first_rows, day_counts = np.unique(np.asarray(years, dtype=np.int64), return_index=True, return_counts=True)
+        self.year_slices = {int(x): slice(first_row, first_row + day_count) for x, first_row, day_count in zip(unique_years, first_rows, day_counts)}
+
+    def get_year_values(self, variable_code, year):
+        """Obtain the daily values of a climate variable for a given year
+
+        Args:
+            variable_code (str): the climate variable code, as used by the API
+            year (int): the year
+
+        Returns:
+            numpy.ndarray: the daily values, an empty array if the series does not contain the year
+        """
+
+        year_slice = self.year_slices.get(int(year), slice(0, 0))
+
+        return self.values[year_slice, self.variable_positions[variable_code]]
+
+    def drop_trailing_missing_days(self, missing_below=None):
+        """Remove the days at the end of the series for which at least one climate variable has no value yet
+
+        The most recent days are often published for some climate variables before others. When only the
+        latest days are being requested (see UpdateManifest), those days are dropped so they are requested
+        again on the next run instead of being stored with missing values.
+
+        Args:
+            missing_below (float, optional): values below this threshold are also considered missing, e.g. the -999 fill value used by NASA POWER. Defaults to None (only NaN values are missing).
+        """
+
+        complete_days = ~np.isnan(self.values).any(axis=1)
+        if missing_below is not None:
+            complete_days &= ~(self.values < missing_below).any(axis=1)
+
+        # Keep everything up to the last day with values for all the climate variables
+        complete_positions = np.flatnonzero(complete_days)
+        day_count = int(complete_positions[-1]) + 1 if len(complete_positions) > 0 else 0
+
+        if day_count == len(self.values):
+            return
+
+        self.values = self.values[:day_count]
+        self.year_slices = {x: slice(year_slice.start, min(year_slice.stop, day_count)) for x, year_slice in self.year_slices.items() if year_slice.start < day_count}
@@ -0,0 +1,243 @@
+
+import logging
+import numpy as np
+import os
+import sys
+
+from pathlib import Path
+
+# Ugly but workable importing solution so that the package can be both
+# imported as a package, run from commandline with `python -m bestiapop`
+# or from the source directory as `python bestiapop.py`
+if "bestiapop" in sys.modules:
+    from bestiapop.common import (climate_grid, hyperslab_reader)
+else:
+    from common import (climate_grid, hyperslab_reader)
+
+class DecodedGridCache():
+    """This class will provide methods to cache the decoded grids of NetCDF4 files as uncompressed memory-mapped files
+
+        Reading values out of a NetCDF4 file requires decompressing every chunk that is touched. When the same files
+        are read over and over again (by several worker processes, by every lat/lon combination of a coordinates file
+        or by consecutive runs) that decompression is repeated each time. The cache decodes each "year.variable.nc" file
+        once, into an uncompressed numpy array of shape (day, latitude, longitude), which is then mapped read-only by
+        every process that needs it. Since all processes map the same file, the operating system shares its pages
+        between them.
+
+        The cache folder contains, for every "year.variable" combination:
+            * year.variable.npy: the decoded values, with missing values set to NaN
+            * year.variable.axes.npz: the latitude and longitude axes, the year of the data and the size and modification time of the source NetCDF4 file, used to detect when the cached grid is out of date
+
+        Args:
+            cache_dir (str): the folder where the decoded grids are (or will be) stored
+            data_source (str, optional): the climate database the NetCDF4 files belong to. Defaults to "silo".
+
+    """
+
+    # Name of the folder BestiaPop uses inside an input directory
+    cache_folder_name = "bpop-grid-cache"
+
+    # Amount of days decoded at a time when building a cached grid, to limit memory usage
+    days_per_read = 31
+
+    def __init__(self, cache_dir, data_source="silo"):
+
+        # Setup logging
+        # We need to pass the "logger" to any Classes or Modules that may use it
+        # in our script
+        try:
+            import coloredlogs
+            logger = logging.getLogger('POPBEAST.DECODED_GRID_CACHE')
+            if 'bestiapop' in __name__:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="WARNING", logger=logger)
+            else:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="DEBUG", logger=logger)
+
+        except ModuleNotFoundError:
+            logger = logging.getLogger('POPBEAST.DECODED_GRID_CACHE')
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(message)s')
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(formatter)
+            console_handler.setLevel(logging.DEBUG)
+            logger.addHandler(console_handler)
+            if 'bestiapop' in __name__:
+                logger.setLevel(logging.WARNING)
+            else:
+                logger.setLevel(logging.INFO)
+
+        # Setting up class variables
+        self.logger = logger
+        self.cache_dir = Path(cache_dir)
+        self.data_source = data_source
+
+    def get_cache_files(self, sourcepath):
+        """Obtain the paths of the cached grid files for a NetCDF4 file
+
+        Args:
+            sourcepath (pathlib.Path): the path to the NetCDF4 file
+
+        Returns:
+            tuple: a tuple consisting of (a) the path to the decoded values and (b) the path to the axes file. The tuple is ordered as follows: (values_file, axes_file)
+        """
+
+        file_stem = Path(sourcepath).name[:-len(".nc")] if Path(sourcepath).name.endswith(".nc") else Path(sourcepath).name
+
+        return (self.cache_dir/"{}.npy".format(file_stem), self.cache_dir/"{}.axes.npz".format(file_stem))
+
+    def is_fresh(self, sourcepath):
+        """Check whether the cached grid of a NetCDF4 file exists and was built from the current version of the file
+
+        Args:
+            sourcepath (pathlib.Path): the path to the NetCDF4 file
+
+        Returns:
+            bool: True if the cached grid can be used
+        """
+
+        values_file, axes_file = self.get_cache_files(sourcepath)
+
+        if values_file.is_file() == False or axes_file.is_file() == False:
+            return False
+
+        source_stat = os.stat(sourcepath)
+
+        try:
+            with np.load(axes_file) as axes_data:
+                return int(axes_data['source_size']) == source_stat.st_size and int(axes_data['source_mtime_ns']) == source_stat.st_mtime_ns
+        except Exception:
+            return False
+
+    def build(self, sourcepath, climate_variable):
+        """Decode a NetCDF4 file into the cache
+
+        Args:
+            sourcepath (pathlib.Path): the path to the NetCDF4 file
+            climate_variable (str): the climate variable contained in the file
+        """
+
+        values_file, axes_file = self.get_cache_files(sourcepath)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.logger.info('Decoding {} into the grid cache {}'.format(sourcepath, self.cache_dir))
+
+        source_stat = os.stat(sourcepath)
+        reader = hyperslab_reader.HyperslabReader(sourcepath, data_source=self.data_source)
+
+        try:
+            # Write to temporary files first and then move them in place, so that several
+            # processes building the same grid at the same time do not corrupt it
+            temp_values_file = self.cache_dir/"{}.{}.tmp.npy".format(values_file.stem, os.getpid())
+            temp_axes_file = self.cache_dir/"{}.{}.tmp.npz".format(values_file.stem, os.getpid())
+
+            values = None
+            for first_day in range(0, reader.time_size, self.days_per_read):
+                last_day = min(first_day + self.days_per_read, reader.time_size)
+                decoded_values = reader.read_hyperslab(climate_variable, slice(first_day, last_day), slice(0, len(reader.lat)), slice(0, len(reader.lon)))
+
+                if values is None:
+                    values = np.lib.format.open_memmap(
+                        temp_values_file,
+                        mode='w+',
+                        dtype=decoded_values.dtype,
+                        shape=(reader.time_size, len(reader.lat), len(reader.lon))
+                    )
+
+                values[first_day:last_day] = decoded_values
+
+            values.flush()
+            del values
+
+            np.savez(
+                temp_axes_file,
+                lat=reader.lat,
+                lon=reader.lon,
+                data_year=reader.get_data_year(),
+                source_size=source_stat.st_size,
+                source_mtime_ns=source_stat.st_mtime_ns
+            )
+        finally:
+            reader.close()
+
+        # The axes file is moved last, so an interrupted build does not leave a usable grid behind
+        os.replace(temp_values_file, values_file)
+        os.replace(temp_axes_file, axes_file)
+
+    def open(self, sourcepath, climate_variable):
+        """Open the cached grid of a NetCDF4 file, decoding the file first if it was not cached yet or is out of date
+
+        Args:
+            sourcepath (pathlib.Path): the path to the NetCDF4 file
+            climate_variable (str): the climate variable contained in the file
+
+        Returns:
+            CachedGrid: an object that can be used in place of a HyperslabReader
+        """
+
+        if self.is_fresh(sourcepath) == False:
+            self.build(sourcepath, climate_variable)
+
+        values_file, axes_file = self.get_cache_files(sourcepath)
+        self.logger.debug('Mapping cached grid {}'.format(values_file))
+
+        return CachedGrid(values_file, axes_file, climate_variable, data_source=self.data_source)
+
+class CachedGrid(hyperslab_reader.HyperslabReader):
+    """This class will provide read-only access to a grid stored by DecodedGridCache, with the same methods as HyperslabReader
+
+        Args:
+            values_file (pathlib.Path): the path to the decoded values
+            axes_file (pathlib.Path): the path to the axes file
+            climate_variable (str): the climate variable contained in the grid
+            data_source (str, optional): the climate database the grid belongs to, used to map coordinates to grid indices. Defaults to "silo".
+
+    """
+
+    def __init__(self, values_file, axes_file, climate_variable, data_source="silo"):
+
+        # Setting up class variables
+        # NOTE: there is no HDF5 file behind a cached grid, so HyperslabReader.__init__ is not called
+        self.logger = logging.getLogger('POPBEAST.DECODED_GRID_CACHE')
+        self.grid = climate_grid.ClimateGrid(data_source)
+        self.climate_variable = climate_variable
+
+        with np.load(axes_file) as axes_data:
+            self.lat = axes_data['lat']
+            self.lon = axes_data['lon']
+            self.data_year = int(axes_data['data_year'])
+
+        self.values = np.load(values_file, mmap_mode='r')
+        self.lat_lookup = self.grid.get_axis_lookup(self.lat)
+        self.lon_lookup = self.grid.get_axis_lookup(self.lon)
+        self.time_size = self.values.shape[0]
+
+    def get_data_year(self):
+        """Obtain the year the cached grid contains data for
+
+        Returns:
+            int: the year the grid contains data for
+        """
+
+        return self.data_year
+
+    def read_hyperslab(self, climate_variable, time_slice, lat_slice, lon_slice):
+        """Read a hyperslab out of the memory-mapped grid
+
+        Args:
+            climate_variable (str): the climate variable short name
+            time_slice (slice): the time positions to read
+            lat_slice (slice): the latitude positions to read
+            lon_slice (slice): the longitude positions to read
+
+        Returns:
+            numpy.ndarray: a 3D array ordered as (day, latitude, longitude)
+        """
+
+        if climate_variable != self.climate_variable:
+            raise KeyError(climate_variable)
+
+        return np.array(self.values[time_slice, lat_slice, lon_slice])
+
+    def close(self):
+        """Release the memory map of the grid
+        """
+
+        del self.values
@@ -0,0 +1,825 @@
+
+import hashlib
+import json
+import logging
+import os
+import random
+import requests
+import sys
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+
+# Ugly but workable importing solution so that the package can be both
+# imported as a package, run from commandline with `python -m bestiapop`
+# or from the source directory as `python bestiapop.py`
+if "bestiapop" in sys.modules:
+    from bestiapop.common import download_manifest
+else:
+    from common import download_manifest
+
+class DownloadManager():
+    """This class will provide methods to download large files (like SILO's annual NetCDF4 files) concurrently and resume interrupted downloads
+
+        Each SILO annual file holds a full year of a single climate variable and weighs several hundred megabytes,
+        so pulling decades of data for several climate variables means downloading hundreds of gigabytes. The
+        manager downloads several files at the same time (each in its own thread, sharing a pool of keep-alive
+        connections) and streams every response to disk in large chunks.
+
+        Files are downloaded into a ".part" file next to their final location, which is only renamed once the
+        download is complete and its size matches the size announced by the server. If a download is interrupted,
+        either by a network error or because BestiaPop was stopped, the next attempt (or the next run) asks the
+        server only for the bytes that are missing from the ".part" file through an HTTP Range request.
+
+        Network errors, timeouts and HTTP 429 or 5xx answers are retried with an exponential backoff and random
+        jitter, resuming from the last byte written each time.
+
+        A single connection rarely saturates the link to a distant server, so large files are also split into
+        segments (byte ranges) downloaded over several connections in parallel, see download_file_segmented.
+
+        Files that are already present are only downloaded again if they changed in the server since they were
+        downloaded. The version of every downloaded file is recorded in a DownloadManifest kept in its folder, and
+        a conditional HEAD request tells whether the file in the server is still the same, see is_file_unchanged.
+
+        Args:
+            max_concurrency (int, optional): the maximum number of files downloaded at the same time. Defaults to 4.
+            segments (int, optional): the maximum number of connections used to download each file. Defaults to 4 (1 downloads every file over a single connection).
+            min_segment_size (int, optional): the minimum size (in bytes) of each segment, smaller files are split into fewer segments. Defaults to 16 MB.
+            chunk_size (int, optional): the size (in bytes) of the chunks the responses are streamed to disk in. Defaults to 1 MB.
+            timeout (int, optional): the number of seconds to wait for the server to answer or to send more data. Defaults to 120.
+            max_retries (int, optional): the number of times a failed download is retried (resuming from the last byte written) before giving up. Defaults to 5.
+            skip_certificate_checks (bool, optional): ask the requests library to skip certificate checks, useful when downloading files behind a proxy. Defaults to False.
+            check_freshness (bool, optional): whether files already present are checked against the server and downloaded again if they changed. When False, files already present are always skipped. Defaults to True.
+
+    """
+
+    # HTTP status codes signalling that the server is throttling us or is temporarily unavailable
+    retry_status_codes = (429, 500, 502, 503, 504)
+
+    # The wait before retry "n" is a random amount of seconds between 0 and min(backoff_max, backoff_base * 2^n)
+    backoff_base = 1
+    backoff_max = 60
+
+    # Suffix of the files holding incomplete downloads, and of the files recording the progress of their segments
+    partial_suffix = ".part"
+    segments_suffix = ".segments.json"
+
+    # The progress of the segments is saved to disk every time this amount of chunks has been written
+    segments_save_interval = 16
+
+    def __init__(self, max_concurrency=4, chunk_size=1024 * 1024, timeout=120, max_retries=5, skip_certificate_checks=False, segments=4, min_segment_size=16 * 1024 * 1024, check_freshness=True):
+
+        # Setup logging
+        # We need to pass the "logger" to any Classes or Modules that may use it
+        # in our script
+        try:
+            import coloredlogs
+            logger = logging.getLogger('POPBEAST.DOWNLOAD_MANAGER')
+            if 'bestiapop' in __name__:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="WARNING", logger=logger)
+            else:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="DEBUG", logger=logger)
+
+        except ModuleNotFoundError:
+            logger = logging.getLogger('POPBEAST.DOWNLOAD_MANAGER')
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(message)s')
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(formatter)
+            console_handler.setLevel(logging.DEBUG)
+            logger.addHandler(console_handler)
+            if 'bestiapop' in __name__:
+                logger.setLevel(logging.WARNING)
+            else:
+                logger.setLevel(logging.INFO)
+
+        # Setting up class variables
+        self.logger = logger
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.chunk_size = max(1, int(chunk_size))
+        self.timeout = timeout
+        self.max_retries = max(0, int(max_retries))
+        self.verify_certificates = not skip_certificate_checks
+        self.segments = max(1, int(segments))
+        self.min_segment_size = max(self.chunk_size, int(min_segment_size))
+        self.check_freshness = check_freshness
+
+        # One download manifest per output directory, loaded the first time a file is downloaded to it
+        self.manifests = {}
+        self._manifests_lock = threading.Lock()
+
+        # Keep-alive connections are pooled per host, one per segment being downloaded
+        self.session = requests.Session()
+        pooled_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_concurrency * self.segments)
+        self.session.mount("https://", pooled_adapter)
+        self.session.mount("http://", pooled_adapter)
+
+        # Amount of bytes downloaded, of files downloaded, resumed, updated (changed in the server)
+        # and skipped (already present and unchanged), for reporting
+        self.downloaded_bytes = 0
+        self.downloaded_files = 0
+        self.resumed_files = 0
+        self.updated_files = 0
+        self.skipped_files = 0
+        self._stats_lock = threading.Lock()
+
+    def get_partial_file(self, output_file):
+        """Obtain the path of the file holding the incomplete download of a file
+
+        Args:
+            output_file (pathlib.Path): the final location of the downloaded file
+
+        Returns:
+            pathlib.Path: the path of the ".part" file
+        """
+
+        return output_file.with_name(output_file.name + self.partial_suffix)
+
+    def get_segments_file(self, output_file):
+        """Obtain the path of the file recording the progress of the segments of an incomplete download
+
+        Args:
+            output_file (pathlib.Path): the final location of the downloaded file
+
+        Returns:
+            pathlib.Path: the path of the ".segments.json" file
+        """
+
+        return output_file.with_name(output_file.name + self.partial_suffix + self.segments_suffix)
+
+    def get_manifest(self, output_dir):
+        """Obtain the download manifest of an output directory, loading it the first time
+
+        Args:
+            output_dir (pathlib.Path): the folder files are downloaded to
+
+        Returns:
+            DownloadManifest: the download manifest of the folder
+        """
+
+        with self._manifests_lock:
+            manifest_key = str(Path(output_dir).resolve())
+            if manifest_key not in self.manifests:
+                manifest = download_manifest.DownloadManifest(output_dir)
+                manifest.load()
+                self.manifests[manifest_key] = manifest
+
+            return self.manifests[manifest_key]
+
+    def save_manifests(self):
+        """Save the download manifests that were modified
+        """
+
+        with self._manifests_lock:
+            manifests = list(self.manifests.values())
+
+        for manifest in manifests:
+            if manifest.modified == True:
+                try:
+                    manifest.save()
+                except Exception as e:
+                    self.logger.warning('Could not save download manifest {}: {}'.format(manifest.manifest_file, e))
+
+    def request(self, method, url, headers=None, stream=False):
+        """Send a request for a file, relaxing certificate checks if they fail (e.g. behind a proxy)
+
+        Args:
+            method (str): the HTTP method, "GET" or "HEAD"
+            url (str): the URL of the file
+            headers (dict, optional): the headers of the request. Defaults to None.
+            stream (bool, optional): whether the body of the response is streamed. Defaults to False.
+
+        Returns:
+            requests.Response: the response, which must be closed by the caller when streamed
+        """
+
+        try:
+            return self.session.request(method, url, headers=headers, stream=stream, timeout=self.timeout, verify=self.verify_certificates)
+        except requests.exceptions.SSLError:
+            if self.verify_certificates == False:
+                raise
+            self.logger.warning("Could not download file due to Certificate issues, potentially caused by your proxy. Relaxing Certificate Checking and attempting again...")
+            self.logger.warning('Skipping SSL certificate checks for {}'.format(url))
+            self.verify_certificates = False
+            return self.session.request(method, url, headers=headers, stream=stream, timeout=self.timeout, verify=self.verify_certificates)
+
+    def get(self, url, first_byte=0, etag=None):
+        """Send a streamed GET request for a file, asking only for the bytes from "first_byte" onwards
+
+        Args:
+            url (str): the URL of the file
+            first_byte (int, optional): the first byte requested, 0 requests the whole file. Defaults to 0.
+            etag (str, optional): the ETag of the version of the file the bytes before "first_byte" belong to. If the file changed since, the server sends it whole. Defaults to None.
+
+        Returns:
+            requests.Response: the streamed response, which must be closed by the caller
+        """
+
+        headers = {"Range": "bytes={}-".format(first_byte)} if first_byte > 0 else {}
+        if first_byte > 0 and etag is not None:
+            headers["If-Range"] = etag
+
+        return self.request("GET", url, headers=headers, stream=True)
+
+    def get_file_info(self, url, manifest_entry=None):
+        """Ask the server for the size and version of a file without downloading it
+
+        When the version of a previous download of the file is known, the request is made conditional on the
+        file having changed since (through "If-None-Match" and "If-Modified-Since" headers), which the server
+        answers with a "304 Not Modified" if it did not.
+
+        Args:
+            url (str): the URL of the file
+            manifest_entry (dict, optional): the version of a previous download of the file, see DownloadManifest.get_entry. Defaults to None.
+
+        Returns:
+            dict: a dictionary with the "size" of the file in bytes, its "etag", its "last_modified" date, whether the server "accepts_ranges" and whether the file was "not_modified" since the previous download. The size, the ETag and the date are None when the server does not announce them.
+        """
+
+        headers = {}
+        if manifest_entry is not None:
+            if manifest_entry.get("etag") is not None:
+                headers["If-None-Match"] = manifest_entry["etag"]
+            if manifest_entry.get("last_modified") is not None:
+                headers["If-Modified-Since"] = manifest_entry["last_modified"]
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.request("HEAD", url, headers=headers) as r:
+                    if r.status_code in self.retry_status_codes and attempt < self.max_retries:
+                        self.wait_before_retry(attempt, url, 'HTTP {}'.format(r.status_code))
+                        continue
+
+                    # The file did not change, the server does not send its headers again
+                    if r.status_code == 304:
+                        return {
+                            "size": manifest_entry.get("size"),
+                            "etag": r.headers.get("ETag", manifest_entry.get("etag")),
+                            "last_modified": manifest_entry.get("last_modified"),
+                            "accepts_ranges": False,
+                            "not_modified": True
+                        }
+
+                    r.raise_for_status()
+
+                    return {
+                        "size": int(r.headers["Content-Length"]) if r.headers.get("Content-Length", "").isdigit() else None,
+                        "etag": r.headers.get("ETag"),
+                        "last_modified": r.headers.get("Last-Modified"),
+                        "accepts_ranges": r.headers.get("Accept-Ranges", "").lower() == "bytes",
+                        "not_modified": False
+                    }
+
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                self.wait_before_retry(attempt, url, e)
+
+    def get_total_size(self, r, first_byte):
+        """Work out the size of the complete file from the headers of a response
+
+        Args:
+            r (requests.Response): the response returned by the server
+            first_byte (int): the first byte that was requested
+
+        Returns:
+            int: the size of the complete file in bytes, or None if the server did not announce it
+        """
+
+        # Partial responses announce the size of the whole file in the "Content-Range" header, as "bytes start-end/size"
+        content_range = r.headers.get("Content-Range", "")
+        if "/" in content_range and content_range.rsplit("/", 1)[1].strip().isdigit():
+            return int(content_range.rsplit("/", 1)[1])
+
+        if r.headers.get("Content-Length", "").isdigit():
+            return first_byte + int(r.headers["Content-Length"])
+
+        return None
+
+    def wait_before_retry(self, attempt, url, reason):
+        """Sleep before retrying a download, using an exponential backoff with full jitter
+
+        Args:
+            attempt (int): the number of the attempt that just failed, starting at 0
+            url (str): the URL of the file, for logging
+            reason (object): what made the attempt fail, for logging
+        """
+
+        # The random jitter keeps concurrent downloads from retrying all at the same time
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+        self.logger.warning('Download of {} interrupted ({}), retry {} of {} in {:.1f} seconds'.format(url, reason, attempt + 1, self.max_retries, delay))
+        time.sleep(delay)
+
+    def is_file_unchanged(self, output_file, manifest_entry, file_info):
+        """Work out whether a file already present is still the same as the file in the server
+
+        The ETag is compared first, then the Last-Modified date, and the size last since it is the weakest
+        of the three. Files downloaded before the manifest existed have no recorded version, so they are
+        only compared by size.
+
+        Args:
+            output_file (pathlib.Path): the file already present
+            manifest_entry (dict): the version of the file when it was downloaded, None if unknown, see DownloadManifest.get_entry
+            file_info (dict): the current version of the file in the server, see get_file_info
+
+        Returns:
+            bool: True if the file does not need to be downloaded again
+        """
+
+        local_size = output_file.stat().st_size
+
+        if manifest_entry is None:
+            return file_info["size"] is not None and file_info["size"] == local_size
+
+        # The local copy was modified (e.g. truncated) since it was downloaded
+        if manifest_entry.get("size") is not None and manifest_entry["size"] != local_size:
+            return False
+
+        if file_info["not_modified"] == True:
+            return True
+
+        if file_info["size"] is not None and file_info["size"] != local_size:
+            return False
+
+        if file_info["etag"] is not None and manifest_entry.get("etag") is not None:
+            return file_info["etag"] == manifest_entry["etag"]
+
+        if file_info["last_modified"] is not None and manifest_entry.get("last_modified") is not None:
+            return file_info["last_modified"] == manifest_entry["last_modified"]
+
+        return file_info["size"] is not None
+
+    def download_file(self, url, output_file, progress_bar=None):
+        """Download a single file, resuming a previous incomplete download of it if there is one
+
+        If the file is already present, it is only downloaded again if it changed in the server since it
+        was downloaded. The previous version is kept in place until the new one is complete.
+
+        Args:
+            url (str): the URL of the file
+            output_file (str): the final location of the downloaded file
+            progress_bar (tqdm, optional): a progress bar (in bytes) to update as data arrives. Defaults to None.
+
+        Raises:
+            requests.exceptions.RequestException: if the file could not be downloaded after all retries
+            IOError: if the downloaded file does not have the size announced by the server
+
+        Returns:
+            int: the size of the downloaded file in bytes
+        """
+
+        output_file = Path(output_file)
+        file_exists = output_file.is_file()
+
+        # Let's first check whether the file has already been downloaded
+        # if it has, let's return without downloading it again
+        if file_exists == True and self.check_freshness == False:
+            self.logger.info('File {} already exists. Skipping download...'.format(output_file))
+            with self._stats_lock:
+                self.skipped_files += 1
+            return output_file.stat().st_size
+
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        partial_file = self.get_partial_file(output_file)
+        segments_file = self.get_segments_file(output_file)
+        manifest = self.get_manifest(output_file.parent) if self.check_freshness == True else None
+        manifest_entry = manifest.get_entry(output_file.name) if manifest is not None else None
+
+        # The size and version of the file tell whether a file already present changed, and whether the file
+        # is large enough to be split into segments (when the server supports ranges)
+        file_info = None
+        if self.segments > 1 or manifest is not None:
+            try:
+                file_info = self.get_file_info(url, manifest_entry if file_exists == True else None)
+            except requests.exceptions.RequestException as e:
+                if file_exists == True:
+                    self.logger.warning('Could not check whether {} changed in the server, keeping the existing file: {}'.format(output_file, e))
+                    with self._stats_lock:
+                        self.skipped_files += 1
+                    return output_file.stat().st_size
+                self.logger.debug('Could not obtain the size of {}, it will be downloaded over a single connection: {}'.format(url, e))
+
+        if file_exists == True:
+            if self.is_file_unchanged(output_file, manifest_entry, file_info) == True:
+                self.logger.info('File {} already exists and did not change in the server. Skipping download...'.format(output_file))
+
+                # Files downloaded before the manifest existed are recorded, so that their version is known next time
+                if manifest_entry is None:
+                    manifest.set_entry(output_file.name, url, file_info["etag"], file_info["last_modified"], output_file.stat().st_size)
+
+                with self._stats_lock:
+                    self.skipped_files += 1
+                return output_file.stat().st_size
+
+            self.logger.info('File {} changed in the server. Downloading it again...'.format(output_file))
+
+        # An incomplete download started over a single connection (without a record of segments) is resumed the same way
+        segmented_download = None
+        if file_info is not None and file_info["accepts_ranges"] == True and file_info["size"] is not None and file_info["size"] >= 2 * self.min_segment_size and (partial_file.is_file() == False or segments_file.is_file() == True):
+            segmented_download = self.download_file_segmented(url, output_file, file_info, progress_bar)
+
+        if segmented_download is not None:
+            written_size, resumed = segmented_download
+        else:
+            written_size, resumed = self.download_file_sequential(url, output_file, progress_bar, file_info["etag"] if file_info is not None else None)
+
+        # The file is only moved to its final location once complete
+        os.replace(partial_file, output_file)
+
+        if manifest is not None and file_info is not None:
+            manifest.set_entry(output_file.name, url, file_info["etag"], file_info["last_modified"], written_size)
+
+        with self._stats_lock:
+            self.downloaded_files += 1
+            if resumed == True:
+                self.resumed_files += 1
+            if file_exists == True:
+                self.updated_files += 1
+
+        return written_size
+
+    def download_file_sequential(self, url, output_file, progress_bar=None, etag=None):
+        """Download a file over a single connection into its ".part" file, resuming from the bytes already written to it
+
+        Args:
+            url (str): the URL of the file
+            output_file (pathlib.Path): the final location of the downloaded file
+            progress_bar (tqdm, optional): a progress bar (in bytes) to update as data arrives. Defaults to None.
+            etag (str, optional): the ETag of the file, so that the bytes already written are only kept if the file did not change since. Defaults to None.
+
+        Raises:
+            requests.exceptions.RequestException: if the file could not be downloaded after all retries
+            IOError: if the downloaded file does not have the size announced by the server
+
+        Returns:
+            tuple: a tuple consisting of (a) the size of the downloaded file in bytes and (b) whether a previous incomplete download was resumed. The tuple is ordered as follows: (written_size, resumed)
+        """
+
+        partial_file = self.get_partial_file(output_file)
+        resumed = False
+        total_size = None
+        progress_started = False
+
+        for attempt in range(self.max_retries + 1):
+
+            # Resume from the bytes already written by a previous attempt or run
+            first_byte = partial_file.stat().st_size if partial_file.is_file() == True else 0
+            resumed = resumed or first_byte > 0
+
+            try:
+                with self.get(url, first_byte, etag) as r:
+
+                    # The range starts after the end of the file, which means the partial file is complete
+                    # (or belongs to a different version of the file, in which case it is downloaded again)
+                    if r.status_code == 416:
+                        total_size = self.get_total_size(r, 0)
+                        if total_size is not None and total_size == first_byte:
+                            break
+                        self.logger.warning('Discarding incomplete download {}, it does not match the file in the server'.format(partial_file))
+                        os.remove(partial_file)
+                        continue
+
+                    if r.status_code in self.retry_status_codes:
+                        raise requests.exceptions.HTTPError('HTTP {}'.format(r.status_code), response=r)
+
+                    r.raise_for_status()
+
+                    # Servers that do not support ranges (or whose file changed) send the whole file again
+                    if first_byte > 0 and r.status_code != 206:
+                        self.logger.debug('Server does not support resuming downloads, downloading {} from the start'.format(url))
+                        first_byte = 0
+
+                    total_size = self.get_total_size(r, first_byte)
+
+                    # The size of the file is added to the progress bar once, by the first attempt to get an answer
+                    if progress_bar is not None and progress_started == False and total_size is not None:
+                        progress_bar.total = (progress_bar.total or 0) + total_size
+                        progress_bar.update(first_byte)
+                        progress_started = True
+
+                    self.logger.info('Downloading file {}{}...'.format(output_file, ' (resuming at {} bytes)'.format(first_byte) if first_byte > 0 else ''))
+
+                    with open(partial_file, 'r+b' if first_byte > 0 else 'wb') as f:
+                        f.seek(first_byte)
+                        f.truncate()
+                        for chunk in r.iter_content(chunk_size=self.chunk_size):
+                            if chunk:
+                                f.write(chunk)
+                                with self._stats_lock:
+                                    self.downloaded_bytes += len(chunk)
+                                if progress_bar is not None:
+                                    progress_bar.update(len(chunk))
+
+                # The connection may be closed before the whole file was sent
+                written_size = partial_file.stat().st_size
+                if total_size is not None and written_size < total_size:
+                    raise requests.exceptions.ChunkedEncodingError('Received {} of {} bytes'.format(written_size, total_size))
+
+                break
+
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError, requests.exceptions.HTTPError) as e:
+                # Only network errors and temporary server errors are worth retrying
+                if isinstance(e, requests.exceptions.HTTPError) and (e.response is None or e.response.status_code not in self.retry_status_codes):
+                    raise
+                if attempt == self.max_retries:
+                    raise
+                self.wait_before_retry(attempt, url, e)
+
+        if partial_file.is_file() == False:
+            raise IOError('Could not download {}'.format(url))
+
+        written_size = partial_file.stat().st_size
+        if total_size is not None and written_size != total_size:
+            raise IOError('Downloaded {} bytes for {} but the server announced {} bytes'.format(written_size, url, total_size))
+
+        return (written_size, resumed)
+
+    def download_file_segmented(self, url, output_file, file_info, progress_bar=None):
+        """Download a file over several connections in parallel, each one fetching a different segment (byte range) of it
+
+        The ".part" file is preallocated to the full size of the file and every segment is written at its own
+        position, through its own file handle. The progress of every segment is recorded in a ".segments.json"
+        file next to it, so that an interrupted download only requests the bytes missing from each segment
+        the next time. Every request carries the ETag of the file in an "If-Range" header, so that the server
+        sends the whole file instead of a range if the file changed in the meantime. When that happens (or when
+        the server ignores ranges despite announcing support for them), the segments are discarded and the file is
+        downloaded again over a single connection.
+
+        Once all the segments are complete, the size of the file is checked against the size announced by the
+        server and, when the ETag is the MD5 digest of the file (as it is for files uploaded to S3 in a single
+        part), against its MD5 digest as well.
+
+        Args:
+            url (str): the URL of the file
+            output_file (pathlib.Path): the final location of the downloaded file
+            file_info (dict): the size and the ETag of the file, see get_file_info
+            progress_bar (tqdm, optional): a progress bar (in bytes) to update as data arrives. Defaults to None.
+
+        Raises:
+            requests.exceptions.RequestException: if a segment could not be downloaded after all retries
+            IOError: if the downloaded file does not match the size or the ETag announced by the server
+
+        Returns:
+            tuple: a tuple consisting of (a) the size of the downloaded file in bytes and (b) whether a previous incomplete download was resumed. The tuple is ordered as follows: (written_size, resumed). None if the server did not answer with the requested ranges.
+        """
+
+        partial_file = self.get_partial_file(output_file)
+        segments_file = self.get_segments_file(output_file)
+        file_size = file_info["size"]
+        etag = file_info["etag"]
+
+        # Resume the segments of a previous download, as long as it was downloading the same version of the file
+        download_state = None
+        if segments_file.is_file() == True and partial_file.is_file() == True:
+            try:
+                with open(segments_file, 'r') as f:
+                    download_state = json.load(f)
+            except Exception as e:
+                self.logger.debug('Could not read {}: {}'.format(segments_file, e))
+
+            if download_state is not None and (download_state.get("size") != file_size or download_state.get("etag") != etag):
+                self.logger.warning('Discarding incomplete download {}, it does not match the file in the server'.format(partial_file))
+                download_state = None
+
+        resumed = download_state is not None
+
+        if download_state is None:
+            # Each segment is a [first byte, last byte, bytes written] list
+            segment_count = min(self.segments, -(-file_size // self.min_segment_size))
+            segment_size = -(-file_size // segment_count)
+            download_state = {
+                "size": file_size,
+                "etag": etag,
+                "segments": [[x, min(x + segment_size, file_size) - 1, 0] for x in range(0, file_size, segment_size)]
+            }
+
+            # Preallocate the file, so that every segment can be written at its own position
+            with open(partial_file, 'wb') as f:
+                f.truncate(file_size)
+
+            self.save_segments(segments_file, download_state)
+
+        if progress_bar is not None:
+            progress_bar.total = (progress_bar.total or 0) + file_size
+            progress_bar.update(sum(x[2] for x in download_state["segments"]))
+
+        pending_segments = [x for x in download_state["segments"] if x[0] + x[2] <= x[1]]
+        self.logger.info('Downloading file {} over {} connections{}...'.format(output_file, len(pending_segments), ' (resuming)' if resumed == True else ''))
+
+        state_lock = threading.Lock()
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(pending_segments)) as segment_executor:
+                ranges_honoured = all([future.result() for future in [segment_executor.submit(self.download_segment, url, partial_file, segment, etag, segments_file, download_state, state_lock, progress_bar) for segment in pending_segments]])
+        finally:
+            # Record how far every segment got, whether the download completed or not
+            with state_lock:
+                self.save_segments(segments_file, download_state)
+
+        if ranges_honoured == False:
+            self.logger.warning('The server did not return the requested ranges of {}, the file may have changed. Downloading it again over a single connection...'.format(url))
+            if progress_bar is not None:
+                progress_bar.total -= file_size
+                progress_bar.update(-sum(x[2] for x in download_state["segments"]))
+            os.remove(partial_file)
+            os.remove(segments_file)
+            return None
+
+        written_size = partial_file.stat().st_size
+        if written_size != file_size or any(x[0] + x[2] <= x[1] for x in download_state["segments"]):
+            raise IOError('Downloaded {} bytes for {} but the server announced {} bytes'.format(written_size, url, file_size))
+
+        if self.verify_etag(partial_file, etag) == False:
+            # The file is corrupted, there is no point in resuming it
+            os.remove(partial_file)
+            os.remove(segments_file)
+            raise IOError('The MD5 digest of {} does not match the ETag announced by the server ({})'.format(url, etag))
+
+        os.remove(segments_file)
+
+        return (written_size, resumed)
+
+    def download_segment(self, url, partial_file, segment, etag, segments_file, download_state, state_lock, progress_bar=None):
+        """Download the bytes missing from a segment of a file and write them at their position in the ".part" file
+
+        Args:
+            url (str): the URL of the file
+            partial_file (pathlib.Path): the preallocated ".part" file
+            segment (list): the [first byte, last byte, bytes written] of the segment, updated as data arrives
+            etag (str): the ETag of the file, None if the server did not announce it
+            segments_file (pathlib.Path): the file recording the progress of the segments
+            download_state (dict): the progress of all the segments of the file, saved regularly to the segments file
+            state_lock (threading.Lock): the lock protecting the download state
+            progress_bar (tqdm, optional): a progress bar (in bytes) to update as data arrives. Defaults to None.
+
+        Raises:
+            requests.exceptions.RequestException: if the segment could not be downloaded after all retries
+
+        Returns:
+            bool: False if the server did not answer with the requested range, e.g. because the file changed, True otherwise
+        """
+
+        for attempt in range(self.max_retries + 1):
+
+            first_byte = segment[0] + segment[2]
+            last_byte = segment[1]
+            if first_byte > last_byte:
+                return True
+
+            headers = {"Range": "bytes={}-{}".format(first_byte, last_byte)}
+            if etag is not None:
+                headers["If-Range"] = etag
+
+            try:
+                with self.request("GET", url, headers=headers, stream=True) as r:
+
+                    if r.status_code in self.retry_status_codes:
+                        raise requests.exceptions.HTTPError('HTTP {}'.format(r.status_code), response=r)
+
+                    r.raise_for_status()
+
+                    # Anything but the requested range means the file changed since the download started
+                    if r.status_code != 206 or not r.headers.get("Content-Range", "").startswith("bytes {}-".format(first_byte)):
+                        return False
+
+                    written_chunks = 0
+                    with open(partial_file, 'r+b') as f:
+                        f.seek(first_byte)
+                        for chunk in r.iter_content(chunk_size=self.chunk_size):
+                            if not chunk:
+                                continue
+
+                            # Never write past the end of the segment
+                            chunk = chunk[:last_byte + 1 - (segment[0] + segment[2])]
+                            f.write(chunk)
+
+                            with state_lock:
+                                segment[2] += len(chunk)
+                                written_chunks += 1
+                                if written_chunks % self.segments_save_interval == 0:
+                                    # The data must reach the disk before the progress that refers to it
+                                    f.flush()
+                                    self.save_segments(segments_file, download_state)
+
+                            with self._stats_lock:
+                                self.downloaded_bytes += len(chunk)
+                            if progress_bar is not None:
+                                progress_bar.update(len(chunk))
+
+                            if segment[0] + segment[2] > last_byte:
+                                break
+
+                # The connection may be closed before the whole segment was sent
+                if segment[0] + segment[2] <= last_byte:
+                    raise requests.exceptions.ChunkedEncodingError('Received {} of {} bytes of the segment starting at {}'.format(segment[2], last_byte + 1 - segment[0], segment[0]))
+
+                return True
+
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError, requests.exceptions.HTTPError) as e:
+                # Only network errors and temporary server errors are worth retrying
+                if isinstance(e, requests.exceptions.HTTPError) and (e.response is None or e.response.status_code not in self.retry_status_codes):
+                    raise
+                if attempt == self.max_retries:
+                    raise
+                self.wait_before_retry(attempt, url, e)
+
+    def save_segments(self, segments_file, download_state):
+        """Save the progress of the segments of a download, so that it can be resumed
+
+        Args:
+            segments_file (pathlib.Path): the file recording the progress of the segments
+            download_state (dict): the size and ETag of the file and the [first byte, last byte, bytes written] of each segment
+        """
+
+        # Write to a temporary file first and then move it in place, so that
+        # an interrupted run does not leave a corrupted record behind
+        temp_file = segments_file.with_name("{}.{}.tmp".format(segments_file.name, os.getpid()))
+        with open(temp_file, 'w') as f:
+            json.dump(download_state, f)
+        os.replace(temp_file, segments_file)
+
+    def verify_etag(self, downloaded_file, etag):
+        """Check a downloaded file against its ETag, when the ETag is the MD5 digest of the file
+
+        Files uploaded to S3 in a single part have the MD5 digest of their content as ETag. Other ETags (e.g.
+        those of files uploaded in several parts, which end with "-" and the number of parts) are opaque and
+        cannot be checked.
+
+        Args:
+            downloaded_file (pathlib.Path): the downloaded file
+            etag (str): the ETag announced by the server, None if it did not announce one
+
+        Returns:
+            bool: False if the MD5 digest of the file does not match its ETag, True otherwise
+        """
+
+        if etag is None:
+            return True
+
+        etag_digest = etag.strip('"').lower()
+        if len(etag_digest) != 32 or any(x not in "0123456789abcdef" for x in etag_digest):
+            return True
+
+        file_digest = hashlib.md5()
+        with open(downloaded_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                file_digest.update(chunk)
+
+        return file_digest.hexdigest() == etag_digest
+
+    def download_files(self, download_list):
+        """Download many files concurrently
+
+        Args:
+            download_list (list): a list of (url, output_file) tuples
+
+        Returns:
+            dict: a dictionary where keys are the output files (as given in the download list) and values are either the size of the downloaded file in bytes or the Exception raised while downloading it
+        """
+
+        results = {}
+        download_start = time.perf_counter()
+
+        progress_bar = tqdm(total=0, unit='B', ascii=True, unit_scale=True, desc="Downloading {} files".format(len(download_list)))
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as download_executor:
+            futures = {download_executor.submit(self.download_file, url, output_file, progress_bar): output_file for url, output_file in download_list}
+
+            for future in as_completed(futures):
+                output_file = futures[future]
+                try:
+                    results[output_file] = future.result()
+                except Exception as e:
+                    self.logger.error('Could not download {}: {}'.format(output_file, e))
+                    results[output_file] = e
+
+        progress_bar.close()
+
+        # Record the version of the downloaded files, so that only the ones that change are downloaded next time
+        self.save_manifests()
+
+        self.log_download_stats(time.perf_counter() - download_start)
+
+        return results
+
+    def log_download_stats(self, elapsed_time):
+        """Log a summary of the downloads performed so far
+
+        Args:
+            elapsed_time (float): the amount of seconds taken by the downloads
+        """
+
+        with self._stats_lock:
+            downloaded_mb = self.downloaded_bytes / (1024 * 1024)
+            self.logger.info('Downloaded {} files ({} resumed, {} changed in the server, {} already present and unchanged): {:.1f} MB in {:.1f} seconds ({:.1f} MB/s)'.format(
+                self.downloaded_files, self.resumed_files, self.updated_files, self.skipped_files, downloaded_mb, elapsed_time, downloaded_mb / elapsed_time if elapsed_time > 0 else 0))
+
+    def close(self):
+        """Close all the pooled connections
+        """
+
+        self.session.close()
@@ -0,0 +1,130 @@
+
+import json
+import logging
+import os
+import threading
+
+from pathlib import Path
+
+class DownloadManifest():
+    """This class will provide methods to keep track of the version of each NetCDF4 file downloaded to a folder
+
+        Most SILO annual files never change once their year is over, while the file of the current year is
+        republished every day. Checking whether a file is present is not enough to keep a local mirror in sync,
+        and downloading every file again is a waste of hundreds of gigabytes. The manifest is a small JSON file
+        kept next to the downloaded files which records, for every file, the URL it was downloaded from and the
+        ETag, Last-Modified date and size announced by the server at the time. It allows DownloadManager to ask
+        the server whether a file changed (through a conditional HEAD request) and to download only the ones that did.
+
+        Args:
+            output_dir (str): the folder containing the downloaded files
+
+    """
+
+    def __init__(self, output_dir):
+
+        # Setup logging
+        # We need to pass the "logger" to any Classes or Modules that may use it
+        # in our script
+        try:
+            import coloredlogs
+            logger = logging.getLogger('POPBEAST.DOWNLOAD_MANIFEST')
+            if 'bestiapop' in __name__:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="WARNING", logger=logger)
+            else:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="DEBUG", logger=logger)
+
+        except ModuleNotFoundError:
+            logger = logging.getLogger('POPBEAST.DOWNLOAD_MANIFEST')
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(message)s')
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(formatter)
+            console_handler.setLevel(logging.DEBUG)
+            logger.addHandler(console_handler)
+            if 'bestiapop' in __name__:
+                logger.setLevel(logging.WARNING)
+            else:
+                logger.setLevel(logging.INFO)
+
+        # Setting up class variables
+        self.logger = logger
+        self.output_dir = Path(output_dir)
+        self.manifest_file = self.output_dir/"bpop-download-manifest.json"
+
+        # Entries are keyed by the name of the downloaded file. Files are downloaded
+        # by several threads at the same time, so entries are modified under a lock
+        self.entries = {}
+        self.modified = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load the manifest from the output directory
+
+        Returns:
+            bool: True if a manifest was found and loaded
+        """
+
+        if self.manifest_file.is_file() == False:
+            return False
+
+        try:
+            with open(self.manifest_file, 'r') as f:
+                self.entries = json.load(f)
+        except Exception as e:
+            self.logger.warning('Could not load download manifest {}, it will be rebuilt: {}'.format(self.manifest_file, e))
+            self.entries = {}
+            return False
+
+        self.logger.debug('Loaded download manifest from {}'.format(self.manifest_file))
+        return True
+
+    def save(self):
+        """Save the manifest to the output directory
+        """
+
+        with self._lock:
+            # Write to a temporary file first and then move it in place, so that
+            # an interrupted run does not leave a corrupted manifest behind
+            temp_file = self.output_dir/"bpop-download-manifest.{}.tmp".format(os.getpid())
+            with open(temp_file, 'w') as f:
+                json.dump(self.entries, f, indent=1, sort_keys=True)
+            os.replace(temp_file, self.manifest_file)
+
+            self.modified = False
+
+        self.logger.debug('Saved download manifest to {}'.format(self.manifest_file))
+
+    def get_entry(self, file_name):
+        """Obtain the manifest entry of a downloaded file
+
+        Args:
+            file_name (str): the name of the downloaded file inside the output directory
+
+        Returns:
+            dict: a dictionary with the "url" the file was downloaded from and the "etag", "last_modified" date and "size" announced by the server (the ETag and the date may be None), or None if the file is not in the manifest
+        """
+
+        with self._lock:
+            entry = self.entries.get(str(file_name))
+
+        return dict(entry) if entry is not None else None
+
+    def set_entry(self, file_name, url, etag, last_modified, size):
+        """Record the version of a downloaded file
+
+        Args:
+            file_name (str): the name of the downloaded file inside the output directory
+            url (str): the URL the file was downloaded from
+            etag (str): the ETag announced by the server, None if it did not announce one
+            last_modified (str): the Last-Modified date announced by the server (as sent by the server), None if it did not announce one
+            size (int): the size of the file in bytes
+        """
+
+        with self._lock:
+            self.entries[str(file_name)] = {
+                "url": url,
+                "etag": etag,
+                "last_modified": last_modified,
+                "size": size
+            }
+            self.modified = True
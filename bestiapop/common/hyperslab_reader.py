@@ -0,0 +1,228 @@
+
+import h5py
+import logging
+import numpy as np
+import pandas as pd
+import sys
+
+# Ugly but workable importing solution so that the package can be both
+# imported as a package, run from commandline with `python -m bestiapop`
+# or from the source directory as `python bestiapop.py`
+if "bestiapop" in sys.modules:
+    from bestiapop.common import climate_grid
+else:
+    from common import climate_grid
+
+class HyperslabReader():
+    """This class will provide methods to read bounding boxes out of NetCDF4 files using the HDF5 chunk layout directly
+
+        Opening a NetCDF4 file with xarray decodes all of its metadata and builds indexes for every coordinate of
+        the full continental grid, even when only a handful of lat/lon combinations are needed. This reader only
+        loads the lat, lon and time axes and, when values are requested, reads the hyperslab covering the bounding
+        box of the requested coordinates straight into a preallocated array. HDF5 will only read (and decompress)
+        the chunks that intersect with that bounding box.
+
+        Values are decoded the same way xarray does it: _FillValue and missing_value become NaN and scale_factor
+        and add_offset are applied when present.
+
+        Args:
+            source (str or file object): the path to the NetCDF4 file, or an open file-like object (e.g. an s3fs file)
+            data_source (str, optional): the climate database the file belongs to, used to map coordinates to grid indices. Defaults to "silo".
+
+    """
+
+    # Map CF time units to pandas timedelta units
+    time_units = {
+        "days": "D",
+        "hours": "h",
+        "minutes": "m",
+        "seconds": "s"
+    }
+
+    def __init__(self, source, data_source="silo"):
+
+        # Setup logging
+        # We need to pass the "logger" to any Classes or Modules that may use it
+        # in our script
+        try:
+            import coloredlogs
+            logger = logging.getLogger('POPBEAST.HYPERSLAB_READER')
+            if 'bestiapop' in __name__:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="WARNING", logger=logger)
+            else:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="DEBUG", logger=logger)
+
+        except ModuleNotFoundError:
+            logger = logging.getLogger('POPBEAST.HYPERSLAB_READER')
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(message)s')
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(formatter)
+            console_handler.setLevel(logging.DEBUG)
+            logger.addHandler(console_handler)
+            if 'bestiapop' in __name__:
+                logger.setLevel(logging.WARNING)
+            else:
+                logger.setLevel(logging.INFO)
+
+        # Setting up class variables
+        self.logger = logger
+        self.grid = climate_grid.ClimateGrid(data_source)
+        self.h5_file = h5py.File(source, mode='r')
+
+        # Only the (small) coordinate axes are loaded up front
+        self.lat = self.h5_file['lat'][:]
+        self.lon = self.h5_file['lon'][:]
+        self.lat_lookup = self.grid.get_axis_lookup(self.lat)
+        self.lon_lookup = self.grid.get_axis_lookup(self.lon)
+        self.time_size = self.h5_file['time'].shape[0]
+
+    def get_data_year(self):
+        """Obtain the year a NetCDF4 file contains data for, by decoding the second value of its time axis
+
+        Returns:
+            int: the year the file contains data for
+        """
+
+        time_variable = self.h5_file['time']
+        units = time_variable.attrs['units']
+        if isinstance(units, bytes):
+            units = units.decode()
+
+        # CF time units look like "days since 2015-01-01 00:00:00"
+        time_unit, reference_date = units.split(" since ")
+        sample_date = pd.Timestamp(reference_date) + pd.to_timedelta(int(time_variable[1]), unit=self.time_units[time_unit.strip()])
+
+        return sample_date.year
+
+    def get_axis_order(self, climate_variable):
+        """Find the position of the time, lat and lon dimensions within a climate variable
+
+        Args:
+            climate_variable (str): the climate variable short name
+
+        Returns:
+            list: the position of the time, lat and lon dimensions, in that order
+        """
+
+        dataset = self.h5_file[climate_variable]
+        dimension_names = [dataset.dims[x][0].name.strip("/") for x in range(dataset.ndim)]
+
+        return [dimension_names.index(x) for x in ["time", "lat", "lon"]]
+
+    def read_hyperslab(self, climate_variable, time_slice, lat_slice, lon_slice):
+        """Read a hyperslab of a climate variable into a preallocated array and decode its values
+
+        Args:
+            climate_variable (str): the climate variable short name
+            time_slice (slice): the time positions to read
+            lat_slice (slice): the latitude positions to read
+            lon_slice (slice): the longitude positions to read
+
+        Returns:
+            numpy.ndarray: a 3D array ordered as (day, latitude, longitude)
+        """
+
+        dataset = self.h5_file[climate_variable]
+        axis_order = self.get_axis_order(climate_variable)
+
+        # Build the selection and the output array in the order the dimensions are stored in the file
+        selection = [None] * dataset.ndim
+        for position, dimension_slice in zip(axis_order, [time_slice, lat_slice, lon_slice]):
+            selection[position] = dimension_slice
+        selection = tuple(selection)
+        shape = tuple(len(range(*x.indices(dataset.shape[i]))) for i, x in enumerate(selection))
+
+        raw_values = np.empty(shape, dtype=dataset.dtype)
+        dataset.read_direct(raw_values, source_sel=selection)
+        raw_values = np.transpose(raw_values, axis_order)
+
+        return self.decode_values(dataset.attrs, raw_values)
+
+    def decode_values(self, attributes, raw_values):
+        """Apply the CF decoding rules (fill values, scale factor and offset) to raw values
+
+        Args:
+            attributes (dict): the attributes of the HDF5 dataset the values were read from (e.g. h5py.Dataset.attrs)
+            raw_values (numpy.ndarray): the raw values
+
+        Returns:
+            numpy.ndarray: the decoded values, where missing values are NaN
+        """
+
+        scale_factor = attributes.get('scale_factor')
+        add_offset = attributes.get('add_offset')
+
+        # Use the same float precision xarray would use to decode the values:
+        # floats keep their precision, small integers become float32 and the rest float64
+        if np.issubdtype(raw_values.dtype, np.floating):
+            value_dtype = raw_values.dtype
+        elif raw_values.dtype.itemsize <= 2:
+            value_dtype = np.float32
+        else:
+            value_dtype = np.float64
+
+        values = raw_values.astype(value_dtype)
+
+        for fill_attribute in ['_FillValue', 'missing_value']:
+            fill_value = attributes.get(fill_attribute)
+            if fill_value is not None:
+                values[np.isin(raw_values, np.atleast_1d(fill_value))] = np.nan
+
+        if scale_factor is not None:
+            values *= np.asarray(scale_factor).item()
+        if add_offset is not None:
+            values += np.asarray(add_offset).item()
+
+        return values
+
+    def read_block(self, climate_variable, lat_range, lon_range):
+        """Extract all daily values of a climate variable for every lat/lon combination, reading only the bounding box of the requested coordinates
+
+        Args:
+            climate_variable (str): the climate variable short name
+            lat_range (numpy.ndarray): a numpy array of latitude values to extract data from
+            lon_range (numpy.ndarray): a numpy array of longitude values to extract data from
+
+        Returns:
+            numpy.ndarray: a 3D array ordered as (day, latitude, longitude) where the series of a single lat/lon combination can be obtained with data_block[:, lat_index, lon_index]. Coordinates that are not part of the file are filled with NaN.
+        """
+
+        lat_positions = np.array([self.lat_lookup.get(int(x), -1) for x in np.atleast_1d(self.grid.to_index(lat_range))], dtype=np.int64)
+        lon_positions = np.array([self.lon_lookup.get(int(x), -1) for x in np.atleast_1d(self.grid.to_index(lon_range))], dtype=np.int64)
+        lat_found = lat_positions >= 0
+        lon_found = lon_positions >= 0
+
+        if lat_found.any() == False or lon_found.any() == False:
+            return np.full((self.time_size, len(lat_positions), len(lon_positions)), np.nan, dtype=np.float32)
+
+        # Bounding box of the requested coordinates within the file
+        lat_start, lat_end = lat_positions[lat_found].min(), lat_positions[lat_found].max() + 1
+        lon_start, lon_end = lon_positions[lon_found].min(), lon_positions[lon_found].max() + 1
+
+        self.logger.debug('Reading hyperslab lat[{}:{}] lon[{}:{}] of {}'.format(lat_start, lat_end, lon_start, lon_end, climate_variable))
+        bbox_values = self.read_hyperslab(climate_variable, slice(0, self.time_size), slice(lat_start, lat_end), slice(lon_start, lon_end))
+
+        # Pick the requested coordinates out of the bounding box
+        data_block = np.full((self.time_size, len(lat_positions), len(lon_positions)), np.nan, dtype=bbox_values.dtype)
+        data_block[np.ix_(np.arange(self.time_size), lat_found, lon_found)] = bbox_values[np.ix_(np.arange(self.time_size), lat_positions[lat_found] - lat_start, lon_positions[lon_found] - lon_start)]
+
+        return data_block
+
+    def read_time_slice(self, climate_variable, time_index):
+        """Read the values of a climate variable for all lat/lon combinations on a single day
+
+        Args:
+            climate_variable (str): the climate variable short name
+            time_index (int): the position of the day within the time axis
+
+        Returns:
+            numpy.ndarray: a 2D array ordered as (latitude, longitude)
+        """
+
+        return self.read_hyperslab(climate_variable, slice(time_index, time_index + 1), slice(0, len(self.lat)), slice(0, len(self.lon)))[0]
+
+    def close(self):
+        """Close the underlying HDF5 file
+        """
+
+        self.h5_file.close()
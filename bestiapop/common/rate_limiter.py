@@ -0,0 +1,268 @@
+
+import ctypes
+import logging
+import multiprocessing
+import threading
+import time
+
+class AdaptiveRateLimiter():
+    """This class will provide methods to keep the requests sent to a climate API under the provider's limits
+
+        Two limits are enforced on every request before it is sent:
+            * a token bucket, which caps the average amount of requests per second while still allowing short bursts
+            * a concurrency limit, which caps the amount of requests in flight at the same time
+
+        The concurrency limit adapts to the way the API behaves. Every time the API answers with a throttling or
+        server error (HTTP 429 or 5xx) the limit is halved and, when the API says how long to wait (the "Retry-After"
+        header), no new request is sent by any thread until that time has passed. While requests are answered
+        normally the limit grows again by one request every time a full window of requests has completed, unless
+        the latency of the API is rising well above the best latency seen so far (a sign that requests are
+        queueing on the server), in which case the limit shrinks by one instead.
+
+        A limiter is meant to be shared by all the fetchers talking to the same API within a process,
+        see get_shared. When climate files are generated by a pool of worker processes, the token bucket and
+        the concurrency limit are kept in shared memory instead (see create_process_shared_state), so that the
+        rate and the amount of requests in flight are enforced for all the workers together rather than for
+        each one of them.
+
+        Args:
+            requests_per_second (float, optional): the average amount of requests per second. None or 0 means requests are not rate limited. Defaults to 10.
+            max_concurrency (int, optional): the maximum amount of requests in flight at the same time. Defaults to 8.
+            burst (int, optional): the amount of requests that can be sent at once after a quiet period. Defaults to the amount of requests per second (minimum 1).
+            latency_factor (float, optional): how many times slower than the best latency seen so far the API can become before the concurrency limit is reduced. Defaults to 3.
+            shared_state (dict, optional): the token bucket and concurrency state shared with other processes, see create_process_shared_state. When provided, its rate, burst and concurrency settings are used instead of the ones above. Defaults to None (the state is private to this limiter).
+
+    """
+
+    # Limiters shared by every fetcher of the process, per API
+    _shared_limiters = {}
+    _shared_lock = threading.Lock()
+
+    # States shared with the other worker processes of a pool, per API, see set_process_shared_states
+    _process_shared_states = {}
+
+    # Weight of the latest request in the moving average of the latency
+    latency_smoothing = 0.2
+
+    def __init__(self, requests_per_second=10, max_concurrency=8, burst=None, latency_factor=3, shared_state=None):
+
+        # Setup logging
+        # We need to pass the "logger" to any Classes or Modules that may use it
+        # in our script
+        try:
+            import coloredlogs
+            logger = logging.getLogger('POPBEAST.RATE_LIMITER')
+            if 'bestiapop' in __name__:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="WARNING", logger=logger)
+            else:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="DEBUG", logger=logger)
+
+        except ModuleNotFoundError:
+            logger = logging.getLogger('POPBEAST.RATE_LIMITER')
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(message)s')
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(formatter)
+            console_handler.setLevel(logging.DEBUG)
+            logger.addHandler(console_handler)
+            if 'bestiapop' in __name__:
+                logger.setLevel(logging.WARNING)
+            else:
+                logger.setLevel(logging.INFO)
+
+        if shared_state is None:
+            shared_state = self.create_state(requests_per_second, max_concurrency, burst, multiprocessing_context=None)
+
+        # Setting up class variables
+        self.logger = logger
+        self.requests_per_second = shared_state["requests_per_second"]
+        self.burst = shared_state["burst"]
+        self.max_concurrency = shared_state["max_concurrency"]
+        self.latency_factor = latency_factor
+
+        # Token bucket state, the time of the last refill, the requests in flight, the concurrency limit and
+        # the (monotonic) time before which no request is sent, set when the API asks us to back off. They are
+        # ctypes values, which live in shared memory when the state is shared with other processes
+        self._tokens = shared_state["tokens"]
+        self._last_refill = shared_state["last_refill"]
+        self._in_flight = shared_state["in_flight"]
+        self._concurrency_limit = shared_state["concurrency_limit"]
+        self._paused_until = shared_state["paused_until"]
+        self._condition = shared_state["condition"]
+
+        # Latency tracking is kept per process, only the decisions it leads to are shared
+        self.completed_in_window = 0
+        self.latency_average = None
+        self.best_latency = None
+
+        # Count of the responses that signalled throttling, for reporting
+        self.throttled_responses = 0
+
+    @property
+    def concurrency_limit(self):
+        """int: the current maximum amount of requests in flight at the same time"""
+        return self._concurrency_limit.value
+
+    @staticmethod
+    def create_state(requests_per_second=10, max_concurrency=8, burst=None, multiprocessing_context=None):
+        """Create the token bucket and concurrency state of a limiter
+
+        Args:
+            requests_per_second (float, optional): the average amount of requests per second. None or 0 means requests are not rate limited. Defaults to 10.
+            max_concurrency (int, optional): the maximum amount of requests in flight at the same time. Defaults to 8.
+            burst (int, optional): the amount of requests that can be sent at once after a quiet period. Defaults to the amount of requests per second (minimum 1).
+            multiprocessing_context (module, optional): the multiprocessing module (or context) used to allocate the state in shared memory. Defaults to None (the state is private to the process).
+
+        Returns:
+            dict: the settings and state of the limiter
+        """
+
+        burst = max(1, int(burst if burst is not None else (requests_per_second or 1)))
+        max_concurrency = max(1, int(max_concurrency))
+
+        if multiprocessing_context is None:
+            new_value = lambda type_code, value: (ctypes.c_double if type_code == 'd' else ctypes.c_int)(value)
+            condition = threading.Condition()
+        else:
+            new_value = multiprocessing_context.RawValue
+            condition = multiprocessing_context.Condition()
+
+        return {
+            "requests_per_second": requests_per_second if requests_per_second else None,
+            "burst": burst,
+            "max_concurrency": max_concurrency,
+            # The bucket starts full
+            "tokens": new_value('d', float(burst)),
+            "last_refill": new_value('d', time.monotonic()),
+            "in_flight": new_value('i', 0),
+            "concurrency_limit": new_value('i', max_concurrency),
+            "paused_until": new_value('d', 0.0),
+            "condition": condition
+        }
+
+    @classmethod
+    def create_process_shared_state(cls, requests_per_second=10, max_concurrency=8, burst=None):
+        """Create a limiter state in shared memory, so that several processes enforce a single rate and concurrency budget
+
+        The state must be created by the parent process before the worker processes are started, and handed to
+        them when they start (e.g. through the initializer of a multiprocessing pool, see set_process_shared_states).
+
+        Args:
+            requests_per_second (float, optional): the average amount of requests per second sent by all the processes together. None or 0 means requests are not rate limited. Defaults to 10.
+            max_concurrency (int, optional): the maximum amount of requests in flight at the same time in all the processes together. Defaults to 8.
+            burst (int, optional): the amount of requests that can be sent at once after a quiet period. Defaults to the amount of requests per second (minimum 1).
+
+        Returns:
+            dict: the settings and shared state of the limiter
+        """
+
+        return cls.create_state(requests_per_second, max_concurrency, burst, multiprocessing_context=multiprocessing)
+
+    @classmethod
+    def set_process_shared_states(cls, shared_states):
+        """Make get_shared return limiters backed by states shared with other processes. Meant to be used as the initializer of a multiprocessing pool
+
+        Args:
+            shared_states (dict): the states created by create_process_shared_state in the parent process, keyed by API name (e.g. "silo" or "nasapower")
+        """
+
+        with cls._shared_lock:
+            cls._process_shared_states = dict(shared_states)
+            cls._shared_limiters = {}
+
+    @classmethod
+    def get_shared(cls, api_name, requests_per_second=10, max_concurrency=8):
+        """Obtain the limiter shared by all the fetchers talking to an API, creating it the first time
+
+        If the process is a worker of a pool that was handed a shared state for the API (see set_process_shared_states),
+        the limiter uses that state, and so the limits of the parent process.
+
+        Args:
+            api_name (str): a name identifying the API, e.g. "silo" or "nasapower"
+            requests_per_second (float, optional): the average amount of requests per second, only used when the limiter is created without a shared state. Defaults to 10.
+            max_concurrency (int, optional): the maximum amount of requests in flight, only used when the limiter is created without a shared state. Defaults to 8.
+
+        Returns:
+            AdaptiveRateLimiter: the limiter for the API
+        """
+
+        with cls._shared_lock:
+            if api_name not in cls._shared_limiters:
+                cls._shared_limiters[api_name] = cls(requests_per_second=requests_per_second, max_concurrency=max_concurrency, shared_state=cls._process_shared_states.get(api_name))
+
+            return cls._shared_limiters[api_name]
+
+    def acquire(self):
+        """Block until a request can be sent without exceeding the rate or the concurrency limit
+
+        Every call must be followed by a call to release once the request has completed.
+        """
+
+        with self._condition:
+            while True:
+                now = time.monotonic()
+
+                # Wait for the back off period requested by the API to end
+                if now < self._paused_until.value:
+                    self._condition.wait(self._paused_until.value - now)
+                    continue
+
+                # Wait for one of the requests in flight to complete
+                if self._in_flight.value >= self._concurrency_limit.value:
+                    self._condition.wait()
+                    continue
+
+                if self.requests_per_second is None:
+                    break
+
+                # Refill the bucket with the tokens accumulated since the last request
+                self._tokens.value = min(float(self.burst), self._tokens.value + (now - self._last_refill.value) * self.requests_per_second)
+                self._last_refill.value = now
+
+                if self._tokens.value >= 1:
+                    self._tokens.value -= 1
+                    break
+
+                # Wait for the next token
+                self._condition.wait((1 - self._tokens.value) / self.requests_per_second)
+
+            self._in_flight.value += 1
+
+    def release(self, latency=None, throttled=False, retry_after=None):
+        """Signal that a request has completed, adapting the concurrency limit to the way the API answered it
+
+        Args:
+            latency (float, optional): the time taken by the API to answer, in seconds. None when the request failed before getting an answer. Defaults to None.
+            throttled (bool, optional): whether the API answered with a throttling or server error (HTTP 429 or 5xx). Defaults to False.
+            retry_after (float, optional): the amount of seconds the API asked us to wait before sending new requests. Defaults to None.
+        """
+
+        with self._condition:
+            self._in_flight.value -= 1
+
+            if throttled == True:
+                self.throttled_responses += 1
+                self.completed_in_window = 0
+                previous_limit = self._concurrency_limit.value
+                self._concurrency_limit.value = max(1, self._concurrency_limit.value // 2)
+                if self._concurrency_limit.value != previous_limit:
+                    self.logger.debug('API is throttling requests, concurrency limit reduced to {}'.format(self._concurrency_limit.value))
+
+                if retry_after is not None and retry_after > 0:
+                    self._paused_until.value = max(self._paused_until.value, time.monotonic() + retry_after)
+
+            elif latency is not None:
+                self.latency_average = latency if self.latency_average is None else (1 - self.latency_smoothing) * self.latency_average + self.latency_smoothing * latency
+                self.best_latency = latency if self.best_latency is None else min(self.best_latency, latency)
+
+                self.completed_in_window += 1
+
+                # Adjust the limit once per window, i.e. once every "concurrency_limit" completed requests
+                if self.completed_in_window >= self._concurrency_limit.value:
+                    self.completed_in_window = 0
+                    if self.latency_average > self.latency_factor * self.best_latency:
+                        self._concurrency_limit.value = max(1, self._concurrency_limit.value - 1)
+                        self.logger.debug('API latency is rising, concurrency limit reduced to {}'.format(self._concurrency_limit.value))
+                    elif self._concurrency_limit.value < self.max_concurrency:
+                        self._concurrency_limit.value += 1
+
+            self._condition.notify_all()
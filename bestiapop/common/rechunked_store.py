@@ -0,0 +1,327 @@
+
+import json
+import logging
+import numpy as np
+import os
+import sys
+import xarray as xr
+
+from pathlib import Path
+from tqdm import tqdm
+
+# Ugly but workable importing solution so that the package can be both 
+# imported as a package, run from commandline with `python -m bestiapop`
+# or from the source directory as `python bestiapop.py`
+if "bestiapop" in sys.modules:
+    from bestiapop.common import climate_grid
+else:
+    from common import climate_grid
+
+class RechunkedClimateStore():
+    """This class will provide methods to build and read a point-major store out of SILO annual NetCDF4 files
+
+        SILO stores its data as one NetCDF4 file per "year.variable", where each file is laid out time-major
+        (all lat/lon combinations for a single day are stored next to each other). BestiaPop, however, needs
+        one long time series per lat/lon combination. The store rearranges the data so that all the days,
+        for all the years, of a single lat/lon combination are contiguous on disk, which means a 30 year
+        extraction for a single point becomes a single contiguous read per climate variable.
+
+        The store is a folder containing:
+            * store.json: the metadata describing the store (years, climate variables, latitudes, longitudes, the position of each year inside the time axis, the amount of days stored for each year, which is less than a full year for the current year, and the size and modification time of the NetCDF4 files it was generated from)
+            * one "variable.npy" file per climate variable, an uncompressed numpy array of shape (latitude, longitude, day) that is read through a memory map
+
+        Args:
+            store_path (str): the folder where the store is (or will be) located
+            data_source (str, optional): the climate database the store was generated from. Defaults to "silo".
+
+    """
+
+    # Name of the folder BestiaPop looks for inside an input directory
+    store_folder_name = "bpop-store"
+
+    def __init__(self, store_path, data_source="silo"):
+
+        # Setup logging
+        # We need to pass the "logger" to any Classes or Modules that may use it
+        # in our script
+        try:
+            import coloredlogs
+            logger = logging.getLogger('POPBEAST.RECHUNKED_STORE')
+            if 'bestiapop' in __name__:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="WARNING", logger=logger)
+            else:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="DEBUG", logger=logger)
+
+        except ModuleNotFoundError:
+            logger = logging.getLogger('POPBEAST.RECHUNKED_STORE')
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(message)s')
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(formatter)
+            console_handler.setLevel(logging.DEBUG)
+            logger.addHandler(console_handler)
+            if 'bestiapop' in __name__:
+                logger.setLevel(logging.WARNING)
+            else:
+                logger.setLevel(logging.INFO)
+
+        # Setting up class variables
+        self.logger = logger
+        self.store_path = Path(store_path)
+        self.metadata_file = self.store_path/"store.json"
+        self.data_source = data_source
+        self.grid = climate_grid.ClimateGrid(data_source)
+        self.metadata = None
+        self.variable_arrays = {}
+
+    def exists(self):
+        """Check whether a store has already been generated in the store path
+
+        Returns:
+            bool: True if the store metadata file exists
+        """
+
+        return self.metadata_file.is_file()
+
+    def create_store(self, input_dir, year_range, climate_variables, lat_range, lon_range):
+        """Convert a folder of "year.variable.nc" SILO files into a point-major store covering the bounding box of the requested coordinates
+
+        Args:
+            input_dir (pathlib.Path): the folder where the NetCDF4 files are located
+            year_range (numpy.ndarray): a numpy array with all the years that should be included in the store
+            climate_variables (list): the climate variable short names as per SILO nomenclature, see https://www.longpaddock.qld.gov.au/silo/about/climate-variables/
+            lat_range (numpy.ndarray): a numpy array of latitude values, the store will cover the range between the minimum and maximum values
+            lon_range (numpy.ndarray): a numpy array of longitude values, the store will cover the range between the minimum and maximum values
+        """
+
+        input_dir = Path(input_dir)
+
+        # Only years for which all the climate variables are available can be stored
+        # since all variables share the same time axis inside the store
+        available_years = []
+        for year in year_range:
+            missing_files = [str(input_dir/"{}.{}.nc".format(year, x)) for x in climate_variables if (input_dir/"{}.{}.nc".format(year, x)).exists() == False]
+            if missing_files:
+                self.logger.error('Could not find file(s) {}. Year {} will not be included in the store. Skipping...'.format(", ".join(missing_files), year))
+                continue
+            available_years.append(int(year))
+
+        if not available_years:
+            self.logger.error('No NetCDF4 files were found in {} for the requested years and climate variables. Cannot generate the store.'.format(input_dir))
+            return
+
+        # Use the first available file to define the grid covered by the store.
+        # The bounding box is computed on integer grid indices so we are not affected by float representation issues
+        with xr.open_dataset(input_dir/"{}.{}.nc".format(available_years[0], climate_variables[0]), engine='h5netcdf') as sample_dataset:
+            file_lat = sample_dataset.lat.values
+            file_lon = sample_dataset.lon.values
+
+        file_lat_indices = self.grid.to_index(file_lat)
+        file_lon_indices = self.grid.to_index(file_lon)
+        lat_positions = np.where((file_lat_indices >= self.grid.to_index(np.min(lat_range))) & (file_lat_indices <= self.grid.to_index(np.max(lat_range))))[0]
+        lon_positions = np.where((file_lon_indices >= self.grid.to_index(np.min(lon_range))) & (file_lon_indices <= self.grid.to_index(np.max(lon_range))))[0]
+
+        if len(lat_positions) == 0 or len(lon_positions) == 0:
+            self.logger.error('The requested coordinates are outside of the grid contained in the NetCDF4 files. Cannot generate the store.')
+            return
+
+        lat_slice = slice(lat_positions[0], lat_positions[-1] + 1)
+        lon_slice = slice(lon_positions[0], lon_positions[-1] + 1)
+
+        # Work out where each year sits within the time axis of the store. The size of each year is taken from the
+        # time axis of its files, since the file of the current year only holds the days published so far. When the
+        # climate variables of a year hold a different amount of days, only the days available for all of them are stored
+        # The version of every file is recorded before reading it, so that the store can be detected as out of date
+        # when a file is replaced (e.g. by a newer file of the current year holding more days)
+        year_offsets = {}
+        year_days = {}
+        source_files = {}
+        total_days = 0
+        for year in available_years:
+            file_days = {}
+            for climate_variable in climate_variables:
+                sourcefile = "{}.{}.nc".format(year, climate_variable)
+                source_stat = os.stat(input_dir/sourcefile)
+                source_files[sourcefile] = {"size": source_stat.st_size, "mtime_ns": source_stat.st_mtime_ns}
+                with xr.open_dataset(input_dir/sourcefile, engine='h5netcdf') as value_array:
+                    file_days[climate_variable] = value_array.sizes['time']
+
+            days_in_year = min(file_days.values())
+            if len(set(file_days.values())) > 1:
+                self.logger.warning('The climate variables of year {} hold a different amount of days ({}), only the first {} days will be stored'.format(year, file_days, days_in_year))
+
+            year_offsets[str(year)] = [total_days, total_days + days_in_year]
+            year_days[str(year)] = days_in_year
+            total_days += days_in_year
+
+        self.store_path.mkdir(parents=True, exist_ok=True)
+        self.logger.info('Generating point-major store in {}'.format(self.store_path))
+
+        # Any previous store is no longer valid from this point on. Arrays are written to temporary
+        # files which are only moved in place once all of them are complete, followed by the metadata
+        if self.metadata_file.exists() == True:
+            self.metadata_file.unlink()
+
+        temp_files = {}
+        try:
+            for climate_variable in tqdm(climate_variables, file=sys.stdout, ascii=True, desc="Climate Variable"):
+
+                temp_files[climate_variable] = self.store_path/"{}.npy.{}.tmp".format(climate_variable, os.getpid())
+                store_array = np.lib.format.open_memmap(
+                    temp_files[climate_variable],
+                    mode='w+',
+                    dtype=np.float32,
+                    shape=(len(lat_positions), len(lon_positions), total_days)
+                )
+
+                for year in tqdm(available_years, ascii=True, desc="Year"):
+                    sourcepath = input_dir/"{}.{}.nc".format(year, climate_variable)
+                    self.logger.debug('Adding {} to the store'.format(sourcepath))
+
+                    with xr.open_dataset(sourcepath, engine='h5netcdf') as value_array:
+                        # One time-major read per file, which is then transposed to point-major
+                        data_block = value_array[climate_variable].isel(lat=lat_slice, lon=lon_slice).transpose('time', 'lat', 'lon').values
+
+                    first_day, last_day = year_offsets[str(year)]
+                    store_array[:, :, first_day:last_day] = np.moveaxis(data_block[:last_day - first_day], 0, -1)
+
+                store_array.flush()
+                del store_array
+
+        except BaseException:
+            # Do not leave incomplete arrays behind (e.g. when a file cannot be read or the conversion is interrupted)
+            for temp_file in temp_files.values():
+                if temp_file.exists() == True:
+                    temp_file.unlink()
+            raise
+
+        for climate_variable, temp_file in temp_files.items():
+            os.replace(temp_file, self.store_path/"{}.npy".format(climate_variable))
+
+        # The metadata file is written last, so an interrupted conversion does not leave a usable store behind
+        self.metadata = {
+            "data_source": self.data_source,
+            "years": available_years,
+            "climate_variables": list(climate_variables),
+            "lat": file_lat[lat_slice].tolist(),
+            "lon": file_lon[lon_slice].tolist(),
+            "year_offsets": year_offsets,
+            "year_days": year_days,
+            "source_files": source_files
+        }
+
+        temp_file = self.store_path/"store.json.{}.tmp".format(os.getpid())
+        with open(temp_file, 'w') as f:
+            json.dump(self.metadata, f)
+        os.replace(temp_file, self.metadata_file)
+
+        self.logger.info('Point-major store generated for years {} to {}'.format(available_years[0], available_years[-1]))
+
+    def load_store(self):
+        """Load the store metadata and map all the climate variable arrays into memory (read-only)
+        """
+
+        with open(self.metadata_file, 'r') as f:
+            self.metadata = json.load(f)
+
+        self.store_lat_lookup = self.grid.get_axis_lookup(np.array(self.metadata['lat']))
+        self.store_lon_lookup = self.grid.get_axis_lookup(np.array(self.metadata['lon']))
+
+        for climate_variable in self.metadata['climate_variables']:
+            self.variable_arrays[climate_variable] = np.load(self.store_path/"{}.npy".format(climate_variable), mmap_mode='r')
+
+        self.logger.debug('Loaded point-major store from {}'.format(self.store_path))
+
+    def covers(self, year_range, climate_variables, lat_range, lon_range):
+        """Check whether all the requested data is available in the store
+
+        Args:
+            year_range (numpy.ndarray): a numpy array with all the years for which we are seeking data
+            climate_variables (list): the climate variable short names
+            lat_range (numpy.ndarray): a numpy array of latitude values
+            lon_range (numpy.ndarray): a numpy array of longitude values
+
+        Returns:
+            bool: True if every year, climate variable and lat/lon combination can be served from the store
+        """
+
+        if self.metadata is None:
+            self.load_store()
+
+        if self.metadata['data_source'] != self.data_source:
+            return False
+        if any(int(x) not in self.metadata['years'] for x in year_range):
+            return False
+        if any(x not in self.metadata['climate_variables'] for x in climate_variables):
+            return False
+        if any(int(x) not in self.store_lat_lookup for x in np.atleast_1d(self.grid.to_index(lat_range))):
+            return False
+        if any(int(x) not in self.store_lon_lookup for x in np.atleast_1d(self.grid.to_index(lon_range))):
+            return False
+
+        return True
+
+    def is_fresh(self, input_dir, year_range, climate_variables):
+        """Check whether the NetCDF4 files holding the requested data are still the ones the store was generated from
+
+        Args:
+            input_dir (pathlib.Path): the folder where the NetCDF4 files are located
+            year_range (numpy.ndarray): a numpy array with all the years for which we are seeking data
+            climate_variables (list): the climate variable short names
+
+        Returns:
+            bool: False if any of the files changed (or was removed) since the store was generated, or if the store does not record the version of its files
+        """
+
+        if self.metadata is None:
+            self.load_store()
+
+        source_files = self.metadata.get('source_files')
+        if source_files is None:
+            return False
+
+        for year in year_range:
+            for climate_variable in climate_variables:
+                sourcefile = "{}.{}.nc".format(int(year), climate_variable)
+                source_version = source_files.get(sourcefile)
+
+                try:
+                    source_stat = os.stat(Path(input_dir)/sourcefile)
+                except FileNotFoundError:
+                    return False
+
+                if source_version is None or source_version['size'] != source_stat.st_size or source_version['mtime_ns'] != source_stat.st_mtime_ns:
+                    self.logger.debug('{} changed since the store was generated'.format(sourcefile))
+                    return False
+
+        return True
+
+    def get_point_series(self, climate_variable, lat, lon):
+        """Read all the days, for all the years in the store, for a single lat/lon combination
+
+        Args:
+            climate_variable (str): the climate variable short name
+            lat (float): the latitude that values should be returned for
+            lon (float): the longitude that values should be returned for
+
+        Returns:
+            numpy.ndarray: the daily series for all the years in the store. Use get_year_slice to obtain the values for a particular year.
+        """
+
+        lat_position = self.store_lat_lookup[self.grid.to_index(lat)]
+        lon_position = self.store_lon_lookup[self.grid.to_index(lon)]
+
+        # A single contiguous read from the memory mapped file
+        return np.array(self.variable_arrays[climate_variable][lat_position, lon_position, :])
+
+    def get_year_slice(self, year):
+        """Obtain the position of a year within the time axis of the store
+
+        Args:
+            year (int): the year
+
+        Returns:
+            slice: a slice that can be applied to a series returned by get_point_series
+        """
+
+        first_day, last_day = self.metadata['year_offsets'][str(int(year))]
+        return slice(first_day, last_day)
@@ -0,0 +1,229 @@
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from pathlib import Path
+
+class APIResponseCache():
+    """This class will provide methods to keep the JSON payloads returned by the climate APIs in a local disk cache
+
+        Each payload returned by SILO's or NASA POWER's API is stored, exactly as it was received, in a gzip
+        compressed file keyed by the data source, the lat/lon grid cell, the requested period and the set of
+        climate variables. The first line of the file is a small JSON header with the key of the entry and the
+        time it was stored. Running
+        the same job again (or restarting a job that crashed half way through) only hits the network for the
+        lat/lon combinations that are not in the cache yet.
+
+        Entries older than the configured time-to-live are ignored and removed, so that recent days (which the
+        climate databases keep revising) are eventually downloaded again. When the cache grows above its size
+        budget, the least recently used entries are removed first.
+
+        Args:
+            cache_dir (str, optional): the folder where the payloads are cached. Defaults to a "bpop-api-cache" folder inside the ".bestiapop" folder in the user's home directory.
+            ttl_hours (float, optional): the amount of hours a cached payload remains valid. None means payloads never expire. Defaults to 168 (one week).
+            max_size_mb (float, optional): the maximum amount of disk space used by the cache, in megabytes. Defaults to 1024.
+
+    """
+
+    # Name of the folder BestiaPop uses inside the ".bestiapop" folder
+    cache_folder_name = "bpop-api-cache"
+
+    def __init__(self, cache_dir=None, ttl_hours=168, max_size_mb=1024):
+
+        # Setup logging
+        # We need to pass the "logger" to any Classes or Modules that may use it
+        # in our script
+        try:
+            import coloredlogs
+            logger = logging.getLogger('POPBEAST.RESPONSE_CACHE')
+            if 'bestiapop' in __name__:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="WARNING", logger=logger)
+            else:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="DEBUG", logger=logger)
+
+        except ModuleNotFoundError:
+            logger = logging.getLogger('POPBEAST.RESPONSE_CACHE')
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(message)s')
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(formatter)
+            console_handler.setLevel(logging.DEBUG)
+            logger.addHandler(console_handler)
+            if 'bestiapop' in __name__:
+                logger.setLevel(logging.WARNING)
+            else:
+                logger.setLevel(logging.INFO)
+
+        # Setting up class variables
+        self.logger = logger
+
+        if cache_dir is None:
+            cache_dir = Path.home()/".bestiapop"/self.cache_folder_name
+        self.cache_dir = Path(cache_dir)
+        self.ttl_seconds = None if ttl_hours is None else ttl_hours * 3600
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+
+        # The size of the cache is only measured once (when the first entry is stored)
+        # and then kept up to date as entries are added and evicted
+        self.current_size = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_entry_key(self, data_source, lat_index, lon_index, start, finish, climate_variables, region=None):
+        """Build the key identifying a payload in the cache
+
+        Args:
+            data_source (str): the climate database the payload was returned by
+            lat_index (int): the latitude grid index of the requested cell (the south-west corner for regional requests), see ClimateGrid.to_index
+            lon_index (int): the longitude grid index of the requested cell (the south-west corner for regional requests), see ClimateGrid.to_index
+            start (str): the first day of the requested period, as YYYYMMDD
+            finish (str): the last day of the requested period, as YYYYMMDD
+            climate_variables (list): the climate variables included in the payload
+            region (tuple, optional): the (latitude index, longitude index) of the north-east corner of a regional request. Defaults to None (single cell request).
+
+        Returns:
+            tuple: the key of the payload
+        """
+
+        entry_key = (data_source, int(lat_index), int(lon_index), str(start), str(finish), ",".join(sorted(climate_variables)))
+
+        if region is not None:
+            entry_key += (int(region[0]), int(region[1]))
+
+        return entry_key
+
+    def get_entry_file(self, entry_key):
+        """Obtain the path of the file a payload is cached in
+
+        Args:
+            entry_key (tuple): the key of the payload, see get_entry_key
+
+        Returns:
+            pathlib.Path: the path to the compressed payload
+        """
+
+        entry_hash = hashlib.sha256(json.dumps(list(entry_key)).encode()).hexdigest()
+
+        return self.cache_dir/"{}.gz".format(entry_hash)
+
+    def get(self, entry_key):
+        """Obtain a payload from the cache
+
+        Args:
+            entry_key (tuple): the key of the payload, see get_entry_key
+
+        Returns:
+            bytes: the cached payload, or None if the payload is not cached or has expired
+        """
+
+        entry_file = self.get_entry_file(entry_key)
+
+        try:
+            with gzip.open(entry_file, 'rb') as f:
+                entry = json.loads(f.readline())
+                payload = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except Exception as e:
+            self.logger.warning('Could not read cached payload {}, it will be ignored: {}'.format(entry_file, e))
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Discard expired entries (and, in the unlikely case of a hash collision, entries for a different key)
+        if entry['key'] != list(entry_key) or (self.ttl_seconds is not None and time.time() - entry['stored_at'] > self.ttl_seconds):
+            self.logger.debug('Cached payload {} has expired'.format(entry_file))
+            self.remove(entry_file)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # The modification time of an entry records when it was last used, which drives the LRU eviction
+        try:
+            os.utime(entry_file)
+        except OSError:
+            pass
+
+        with self._lock:
+            self.hits += 1
+
+        return payload
+
+    def put(self, entry_key, payload):
+        """Store a payload in the cache, evicting the least recently used entries if the cache grows above its size budget
+
+        Args:
+            entry_key (tuple): the key of the payload, see get_entry_key
+            payload (bytes): the payload returned by the API
+        """
+
+        entry_file = self.get_entry_file(entry_key)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary file first and then move it in place, so that
+        # several processes caching the same payload at the same time do not corrupt it
+        temp_file = self.cache_dir/"{}.{}.{}.tmp".format(entry_file.name, os.getpid(), threading.get_ident())
+        with gzip.open(temp_file, 'wb') as f:
+            f.write(json.dumps({"key": list(entry_key), "stored_at": time.time()}).encode() + b"\n")
+            f.write(payload)
+        os.replace(temp_file, entry_file)
+
+        with self._lock:
+            if self.current_size is None:
+                self.current_size = self.get_cache_size()
+            else:
+                self.current_size += entry_file.stat().st_size
+
+            if self.current_size > self.max_size_bytes:
+                self.evict()
+
+    def get_cache_size(self):
+        """Measure the disk space used by all the cached payloads
+
+        Returns:
+            int: the size of the cache in bytes
+        """
+
+        return sum(x.stat().st_size for x in self.cache_dir.glob("*.gz"))
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in its size budget
+        """
+
+        entries = []
+        for entry_file in self.cache_dir.glob("*.gz"):
+            try:
+                entry_stat = entry_file.stat()
+            except FileNotFoundError:
+                # Already removed by another process
+                continue
+            entries.append((entry_stat.st_mtime, entry_stat.st_size, entry_file))
+
+        self.current_size = sum(x[1] for x in entries)
+
+        for entry_mtime, entry_size, entry_file in sorted(entries):
+            if self.current_size <= self.max_size_bytes:
+                break
+            self.remove(entry_file)
+            self.current_size -= entry_size
+
+        self.logger.debug('Evicted cached payloads, the cache now uses {} bytes'.format(self.current_size))
+
+    def remove(self, entry_file):
+        """Remove a cached payload, ignoring the error if it was already removed by another process
+
+        Args:
+            entry_file (pathlib.Path): the path to the compressed payload
+        """
+
+        try:
+            os.remove(entry_file)
+        except FileNotFoundError:
+            pass
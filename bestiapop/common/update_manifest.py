@@ -0,0 +1,150 @@
+
+import json
+import logging
+import os
+
+from datetime import datetime
+from pathlib import Path
+
+class UpdateManifest():
+    """This class will provide methods to keep track of the last day contained in each climate file of an output directory
+
+        Operational runs regenerate the same climate files every day, even though only a few new days have been
+        published since the previous run. The manifest is a small JSON file kept next to the climate files which
+        records, for every output type and lat/lon combination, the name of the file and the first and last day it
+        contains. It allows BestiaPop to work out the window of days missing from all the files of a run without
+        having to open them, and to find WTH files again (their name depends on the years they contain).
+
+        The climate files themselves remain the source of truth: new days are always appended after the last day
+        actually found in a file, so an out of date manifest can only cause a few extra days to be requested.
+
+        Args:
+            output_dir (str): the folder containing the climate files
+            data_source (str): the climate database the files were generated from: SILO or NASAPOWER
+
+    """
+
+    def __init__(self, output_dir, data_source):
+
+        # Setup logging
+        # We need to pass the "logger" to any Classes or Modules that may use it
+        # in our script
+        try:
+            import coloredlogs
+            logger = logging.getLogger('POPBEAST.UPDATE_MANIFEST')
+            if 'bestiapop' in __name__:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="WARNING", logger=logger)
+            else:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="DEBUG", logger=logger)
+
+        except ModuleNotFoundError:
+            logger = logging.getLogger('POPBEAST.UPDATE_MANIFEST')
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(message)s')
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(formatter)
+            console_handler.setLevel(logging.DEBUG)
+            logger.addHandler(console_handler)
+            if 'bestiapop' in __name__:
+                logger.setLevel(logging.WARNING)
+            else:
+                logger.setLevel(logging.INFO)
+
+        # Setting up class variables
+        self.logger = logger
+        self.output_dir = Path(output_dir)
+        self.data_source = data_source
+        self.manifest_file = self.output_dir/"bpop-update-manifest.{}.json".format(data_source)
+
+        # Entries are stored per output type, keyed by the "lat-lon" label used in the file names
+        self.entries = {}
+        self.modified = False
+
+    def load(self):
+        """Load the manifest from the output directory
+
+        Returns:
+            bool: True if a manifest was found and loaded
+        """
+
+        if self.manifest_file.is_file() == False:
+            return False
+
+        try:
+            with open(self.manifest_file, 'r') as f:
+                self.entries = json.load(f)
+        except Exception as e:
+            self.logger.warning('Could not load update manifest {}, it will be rebuilt: {}'.format(self.manifest_file, e))
+            self.entries = {}
+            return False
+
+        self.logger.debug('Loaded update manifest from {}'.format(self.manifest_file))
+        return True
+
+    def save(self):
+        """Save the manifest to the output directory
+        """
+
+        # Write to a temporary file first and then move it in place, so that
+        # an interrupted run does not leave a corrupted manifest behind
+        temp_file = self.output_dir/"bpop-update-manifest.{}.{}.tmp".format(self.data_source, os.getpid())
+        with open(temp_file, 'w') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(temp_file, self.manifest_file)
+
+        self.modified = False
+        self.logger.debug('Saved update manifest to {}'.format(self.manifest_file))
+
+    def get_entry_key(self, lat, lon):
+        """Build the key identifying a lat/lon combination in the manifest
+
+        Args:
+            lat (float): the latitude of the climate file
+            lon (float): the longitude of the climate file
+
+        Returns:
+            str: the key, in the same "lat-lon" form used in the names of the climate files
+        """
+
+        return '{}-{}'.format(lat, lon)
+
+    def get_entry(self, output_type, lat, lon):
+        """Obtain the manifest entry of a climate file
+
+        Args:
+            output_type (str): the output type of the climate file: met, wth or csv
+            lat (float): the latitude of the climate file
+            lon (float): the longitude of the climate file
+
+        Returns:
+            dict: a dictionary with the "file" name and the "first_date" and "last_date" (as datetime.date, the first day may be None when unknown) of the climate file, or None if the file is not in the manifest
+        """
+
+        entry = self.entries.get(output_type, {}).get(self.get_entry_key(lat, lon))
+
+        if entry is None:
+            return None
+
+        return {
+            "file": entry["file"],
+            "first_date": datetime.strptime(entry["first_date"], "%Y-%m-%d").date() if entry["first_date"] is not None else None,
+            "last_date": datetime.strptime(entry["last_date"], "%Y-%m-%d").date()
+        }
+
+    def set_entry(self, output_type, lat, lon, file_name, first_date, last_date):
+        """Record the name and the first and last day of a climate file
+
+        Args:
+            output_type (str): the output type of the climate file: met, wth or csv
+            lat (float): the latitude of the climate file
+            lon (float): the longitude of the climate file
+            file_name (str): the name of the climate file inside the output directory
+            first_date (datetime.date): the first day contained in the climate file, None if unknown
+            last_date (datetime.date): the last day contained in the climate file
+        """
+
+        self.entries.setdefault(output_type, {})[self.get_entry_key(lat, lon)] = {
+            "file": str(file_name),
+            "first_date": first_date.isoformat() if first_date is not None else None,
+            "last_date": last_date.isoformat()
+        }
+        self.modified = True
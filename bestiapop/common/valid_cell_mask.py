@@ -0,0 +1,272 @@
+
+import logging
+import numpy as np
+import os
+import sys
+
+from pathlib import Path
+
+# Ugly but workable importing solution so that the package can be both 
+# imported as a package, run from commandline with `python -m bestiapop`
+# or from the source directory as `python bestiapop.py`
+if "bestiapop" in sys.modules:
+    from bestiapop.common import (climate_grid, hyperslab_reader)
+else:
+    from common import (climate_grid, hyperslab_reader)
+
+class ValidCellMask():
+    """This class will provide methods to build, cache and query a mask of the grid cells that contain climate data
+
+        Ocean and no-data cells used to be detected only after all daily values for a lat/lon combination had
+        been read (or downloaded). The mask allows BestiaPop to skip those cells up front. Its grid is built from
+        a single day (time slice) of a NetCDF4 file, where all cells without data are NaN, and cached on disk
+        along with the version of that file (see MyUtilityBeast.get_cdf_file_version), so that it is rebuilt
+        whenever it does not match the files being read. The cloud APIs only rely on a grid built from the
+        NetCDF4 files published in S3, which hold the same data. Cells that a cloud API explicitly reports as
+        having no data are also recorded, which is how a mask is learned for data sources that do not provide
+        NetCDF4 files (like NASAPOWER).
+
+        Args:
+            data_source (str): The climate database the mask belongs to: SILO or NASAPOWER
+            cache_dir (str, optional): the folder where the mask is cached. Defaults to a ".bestiapop" folder in the user's home directory.
+
+    """
+
+    def __init__(self, data_source, cache_dir=None):
+
+        # Setup logging
+        # We need to pass the "logger" to any Classes or Modules that may use it
+        # in our script
+        try:
+            import coloredlogs
+            logger = logging.getLogger('POPBEAST.VALID_CELL_MASK')
+            if 'bestiapop' in __name__:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="WARNING", logger=logger)
+            else:
+                coloredlogs.install(fmt='%(asctime)s - %(name)s - %(message)s', level="DEBUG", logger=logger)
+
+        except ModuleNotFoundError:
+            logger = logging.getLogger('POPBEAST.VALID_CELL_MASK')
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(message)s')
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(formatter)
+            console_handler.setLevel(logging.DEBUG)
+            logger.addHandler(console_handler)
+            if 'bestiapop' in __name__:
+                logger.setLevel(logging.WARNING)
+            else:
+                logger.setLevel(logging.INFO)
+
+        # Setting up class variables
+        self.logger = logger
+        self.data_source = data_source
+        self.grid = climate_grid.ClimateGrid(data_source)
+
+        if cache_dir is None:
+            cache_dir = Path.home()/".bestiapop"
+        self.cache_dir = Path(cache_dir)
+        self.mask_file = self.cache_dir/"bpop-mask.{}.npz".format(data_source)
+
+        # Grid derived from a NetCDF4 file (if any) and individual cells learned from API calls.
+        # All cells are identified by their integer (lat, lon) grid indices
+        self.mask_lat = None
+        self.mask_lon = None
+        self.mask = None
+        self.source_version = None
+        self.invalid_cells = set()
+        self.modified = False
+
+    def has_grid(self):
+        """Check whether the mask contains a grid built from a NetCDF4 file
+
+        Returns:
+            bool: True if the mask was built from a NetCDF4 file
+        """
+
+        return self.mask is not None
+
+    def has_cloud_grid(self):
+        """Check whether the mask contains a grid built from a NetCDF4 file published in S3
+
+        Returns:
+            bool: True if the grid was built from a NetCDF4 file read from S3
+        """
+
+        return self.mask is not None and self.source_version.startswith("s3://")
+
+    def matches_dataset(self, value_array, source_version):
+        """Check whether the grid of the mask was built from the version of a NetCDF4 file that is being read
+
+        Args:
+            value_array (xarray.Dataset or HyperslabReader): the xarray Dataset or HyperslabReader object being read
+            source_version (str): the version of the file, see MyUtilityBeast.get_cdf_file_version
+
+        Returns:
+            bool: True if the grid was built from this version of the file and covers the same latitudes and longitudes
+        """
+
+        if self.mask is None or self.source_version != source_version:
+            return False
+
+        dataset_lat, dataset_lon = self.get_dataset_axes(value_array)
+
+        return np.array_equal(self.grid.to_index(dataset_lat), self.grid.to_index(self.mask_lat)) and np.array_equal(self.grid.to_index(dataset_lon), self.grid.to_index(self.mask_lon))
+
+    def get_dataset_axes(self, value_array):
+        """Obtain the latitude and longitude axes of a NetCDF4 file
+
+        Args:
+            value_array (xarray.Dataset or HyperslabReader): the xarray Dataset or HyperslabReader object
+
+        Returns:
+            tuple: a tuple consisting of (a) the latitude values and (b) the longitude values of the file. The tuple is ordered as follows: (lat, lon)
+        """
+
+        if isinstance(value_array, hyperslab_reader.HyperslabReader):
+            return (value_array.lat, value_array.lon)
+
+        return (value_array.lat.values, value_array.lon.values)
+
+    def load(self):
+        """Load the mask from the cache folder
+
+        Returns:
+            bool: True if a cached mask was found and loaded
+        """
+
+        if self.mask_file.is_file() == False:
+            return False
+
+        try:
+            with np.load(self.mask_file) as mask_data:
+                # Masks cached before the version of their grid was recorded cannot be checked against the files
+                # being read, and their cells were also learned from any empty series, so they are ignored
+                if 'source_version' not in mask_data.files:
+                    self.logger.debug('Ignoring valid cell mask {} cached by an older version of BestiaPop'.format(self.mask_file))
+                    return False
+                if mask_data['mask'].size > 0:
+                    self.set_grid(mask_data['lat'], mask_data['lon'], mask_data['mask'], str(mask_data['source_version']))
+                self.invalid_cells = set((int(x[0]), int(x[1])) for x in mask_data['invalid_cells'])
+        except Exception as e:
+            self.logger.warning('Could not load cached mask {}, it will be ignored: {}'.format(self.mask_file, e))
+            return False
+
+        self.logger.debug('Loaded valid cell mask from {}'.format(self.mask_file))
+        return True
+
+    def save(self):
+        """Save the mask to the cache folder
+        """
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        if self.mask is None:
+            mask_lat, mask_lon, mask, source_version = np.empty(0), np.empty(0), np.empty((0, 0), dtype=bool), ""
+        else:
+            mask_lat, mask_lon, mask, source_version = self.mask_lat, self.mask_lon, self.mask, self.source_version
+
+        invalid_cells = np.array(sorted(self.invalid_cells), dtype=np.int64).reshape(-1, 2)
+
+        # Write to a temporary file first and then move it in place, so that
+        # several processes saving the mask at the same time do not corrupt it
+        temp_file = self.cache_dir/"bpop-mask.{}.{}.tmp.npz".format(self.data_source, os.getpid())
+        np.savez_compressed(temp_file, lat=mask_lat, lon=mask_lon, mask=mask, source_version=np.array(source_version), invalid_cells=invalid_cells)
+        os.replace(temp_file, self.mask_file)
+
+        self.modified = False
+        self.logger.debug('Saved valid cell mask to {}'.format(self.mask_file))
+
+    def build_from_dataset(self, value_array, climate_variable, source_version):
+        """Build the grid of the mask from the first day contained in a NetCDF4 file
+
+        Args:
+            value_array (xarray.Dataset or HyperslabReader): the xarray Dataset or HyperslabReader object to build the mask from
+            climate_variable (str): the climate variable contained in the dataset
+            source_version (str): the version of the file, see MyUtilityBeast.get_cdf_file_version
+        """
+
+        self.logger.info('Building valid cell mask from variable {}'.format(climate_variable))
+
+        if isinstance(value_array, hyperslab_reader.HyperslabReader):
+            sample_slice = value_array.read_time_slice(climate_variable, 0)
+        else:
+            sample_slice = value_array[climate_variable].isel(time=0).transpose('lat', 'lon').values
+
+        dataset_lat, dataset_lon = self.get_dataset_axes(value_array)
+        self.set_grid(dataset_lat, dataset_lon, ~np.isnan(sample_slice), source_version)
+        self.modified = True
+
+    def set_grid(self, mask_lat, mask_lon, mask, source_version):
+        """Set the grid of the mask and build the lookups used to find a cell in O(1)
+
+        Args:
+            mask_lat (numpy.ndarray): the latitude values of the grid
+            mask_lon (numpy.ndarray): the longitude values of the grid
+            mask (numpy.ndarray): a boolean array of shape (latitude, longitude) which is True for cells containing data
+            source_version (str): the version of the NetCDF4 file the grid was built from, see MyUtilityBeast.get_cdf_file_version
+        """
+
+        self.mask_lat = mask_lat
+        self.mask_lon = mask_lon
+        self.mask = mask
+        self.source_version = source_version
+        self.mask_lat_lookup = self.grid.get_axis_lookup(mask_lat)
+        self.mask_lon_lookup = self.grid.get_axis_lookup(mask_lon)
+
+    def is_valid(self, lat, lon):
+        """Check whether a lat/lon combination is known to contain climate data
+
+        Args:
+            lat (float): the latitude of the cell
+            lon (float): the longitude of the cell
+
+        Returns:
+            bool: False if the cell is known to be empty, True otherwise (including cells that are not covered by the mask)
+        """
+
+        return self.is_valid_index(self.grid.to_index(lat), self.grid.to_index(lon))
+
+    def is_valid_index(self, lat_index, lon_index, use_grid=True):
+        """Check whether a cell, identified by its integer grid indices, is known to contain climate data
+
+        Args:
+            lat_index (int): the latitude grid index of the cell, see ClimateGrid.to_index
+            lon_index (int): the longitude grid index of the cell, see ClimateGrid.to_index
+            use_grid (bool, optional): whether the grid built from a NetCDF4 file is consulted, on top of the cells reported as empty by a cloud API. Defaults to True.
+
+        Returns:
+            bool: False if the cell is known to be empty, True otherwise (including cells that are not covered by the mask)
+        """
+
+        if (lat_index, lon_index) in self.invalid_cells:
+            return False
+
+        if use_grid == True and self.mask is not None:
+            lat_position = self.mask_lat_lookup.get(lat_index)
+            lon_position = self.mask_lon_lookup.get(lon_index)
+            if lat_position is not None and lon_position is not None:
+                return bool(self.mask[lat_position, lon_position])
+
+        return True
+
+    def mark_invalid(self, lat, lon):
+        """Record a lat/lon combination that a cloud API reported as not containing any climate data
+
+        Args:
+            lat (float): the latitude of the cell
+            lon (float): the longitude of the cell
+        """
+
+        self.mark_invalid_index(self.grid.to_index(lat), self.grid.to_index(lon))
+
+    def mark_invalid_index(self, lat_index, lon_index):
+        """Record a cell, identified by its integer grid indices, that a cloud API reported as not containing any climate data
+
+        Args:
+            lat_index (int): the latitude grid index of the cell, see ClimateGrid.to_index
+            lon_index (int): the longitude grid index of the cell, see ClimateGrid.to_index
+        """
+
+        if (lat_index, lon_index) not in self.invalid_cells:
+            self.invalid_cells.add((lat_index, lon_index))
+            self.modified = True
@@ -1,6 +1,7 @@
 
 import h5netcdf
 import io
+import json
 import logging
 import numpy as np
 import multiprocessing as mp
@@ -12,19 +13,50 @@ import s3fs
 import sys
 import xarray as xr
 
+from datetime import date
 from tqdm import tqdm
 
+# orjson is an optional dependency, when available API payloads are parsed with it instead of the json module
+try:
+    import orjson
+except ModuleNotFoundError:
+    orjson = None
+
+# Ugly but workable importing solution so that the package can be both 
+# imported as a package, run from commandline with `python -m bestiapop`
+# or from the source directory as `python bestiapop.py`
+if "bestiapop" in sys.modules:
+    from bestiapop.common import (api_fetcher, climate_grid, climate_series, rate_limiter)
+else:
+    from common import (api_fetcher, climate_grid, climate_series, rate_limiter)
+
 class NASAPowerClimateDataConnector():
     """This class will provide methods that query and parse data from NASA POWER climate database
 
         Args:
             logger (str): A pointer to an initialized Argparse logger
             data_source (str): The climate database where the values are being extracted from: SILO or NASAPOWER
+            api_concurrency (int, optional): the maximum number of requests sent to NASA POWER's API at the same time. Defaults to 8.
+            response_cache (APIResponseCache, optional): the cache used to store the payloads returned by the API. Defaults to None (no caching).
+            api_rate_limit (float, optional): the average amount of requests per second sent to NASA POWER's API by all the connectors of the process (or of all the worker processes of a pool, see AdaptiveRateLimiter.create_process_shared_state). None or 0 disables rate limiting. Defaults to 10.
+            api_mode (str, optional): how grid cells are requested from NASA POWER's API: "point" requests each grid cell on its own, "regional" requests whole bounding boxes of grid cells at once, see get_regional_tiles. Defaults to "point".
 
     """
 
+    # NASA POWER's daily point API endpoint
+    nasapower_api_url = "https://power.larc.nasa.gov/api/temporal/daily/point"
+
+    # NASA POWER's daily regional API endpoint, which returns every grid cell inside a bounding box
+    nasapower_regional_api_url = "https://power.larc.nasa.gov/api/temporal/daily/regional"
 
-    def __init__(self, climate_variables, data_source="silo", input_path=None):
+    # Limits of the bounding boxes accepted by the regional API (in degrees, for both latitude and longitude)
+    regional_max_extent = 10
+    regional_min_extent = 2
+
+    # The regional API only accepts a single climate variable per request
+    regional_variables_per_request = 1
+
+    def __init__(self, climate_variables, data_source="silo", input_path=None, api_concurrency=8, response_cache=None, api_rate_limit=10, api_mode="point"):
 
         # Setup logging
         # We need to pass the "logger" to any Classes or Modules that may use it 
@@ -53,8 +85,22 @@ class NASAPowerClimateDataConnector():
         self.logger = logger
         self.data_source = data_source
         self.input_path = input_path
-        self.climate_data = {}
+        self.climate_series = None
         self.climate_variables = climate_variables
+        self.grid = climate_grid.ClimateGrid("nasapower")
+        self.api_concurrency = api_concurrency
+        self.api_mode = api_mode
+
+        # First day requested from the API when only the days missing from existing climate files are needed
+        self.start_date = None
+
+        # All API requests share the fetcher's pool of keep-alive connections, and all the
+        # connectors of the process share the same rate limiter for NASA POWER's API
+        self.fetcher = api_fetcher.ConcurrentAPIFetcher(
+            max_concurrency=api_concurrency,
+            response_cache=response_cache,
+            rate_limiter=rate_limiter.AdaptiveRateLimiter.get_shared("nasapower", requests_per_second=api_rate_limit, max_concurrency=api_concurrency)
+        )
 
         # Variable names in NASAPOWER DB
         # nasapower_variables = ["ALLSKY_TOA_SW_DWN", "ALLSKY_SFC_SW_DWN", "T2M", "T2M_MIN", "T2M_MAX", "T2MDEW", "WS2M", "PRECTOT"]
@@ -76,13 +122,406 @@ class NASAPowerClimateDataConnector():
         # Define a lambda for quick translations
         self._Translate_Climate_Var = lambda x: self.nasapower_climate_variable_code[x]
 
-    def get_yearly_data(self, lat, lon, value_array, year, year_range, climate_variable):
-        """Extract values from an API endpoint in the cloud or a xarray.Dataset object
+    def get_request_window(self, year_range):
+        """Obtain the first and last day requested from NASA POWER's daily point API
+
+        Args:
+            year_range (numpy.ndarray): a numpy array with all the years for which we are seeking data
+
+        Returns:
+            tuple: a tuple consisting of (a) the first day and (b) the last day, both as YYYYMMDD. The tuple is ordered as follows: (start, finish)
+        """
+
+        start = "{}0101".format(year_range[0])
+        finish = "{}1231".format(year_range[len(year_range)-1])
+
+        # Incremental updates only request the days after the last one already
+        # present in the climate files, and never request days in the future
+        if self.start_date is not None:
+            start = self.start_date.strftime("%Y%m%d")
+            finish = min(finish, date.today().strftime("%Y%m%d"))
+
+        return (start, finish)
+
+    def get_api_payload(self, lat, lon, year_range):
+        """Build the query string parameters for a request to NASA POWER's daily point API
+
+        Args:
+            lat (float): the latitude that values should be returned for
+            lon (float): the longitude that values should be returned for
+            year_range (numpy.ndarray): a numpy array with all the years for which we are seeking data
+
+        Returns:
+            dict: the query string parameters
+        """
+
+        # Obtaining start and end days for API call
+        start, finish = self.get_request_window(year_range)
+
+        payload = {
+            "request": "execute",
+            "tempAverage": "DAILY",
+            "identifier": "SinglePoint",
+            "parameters": self.nasapower_climate_variables_string,
+            "latitude": lat,
+            "longitude": lon,
+            "start": start,
+            "end": finish,
+            "community": "ag",
+            "format": "json",
+            "user": "anonymous",
+            "header":"true",
+            "time-standard":"lst"
+        }
+
+        return payload
+
+    def get_cache_key(self, lat, lon, year_range):
+        """Build the key identifying the payload for a lat/lon combination in the response cache
+
+        Args:
+            lat (float): the latitude that values should be returned for
+            lon (float): the longitude that values should be returned for
+            year_range (numpy.ndarray): a numpy array with all the years for which we are seeking data
+
+        Returns:
+            tuple: the key of the payload, see APIResponseCache.get_entry_key, or None when there is no response cache
+        """
+
+        # Incremental updates are after the days that were just published, which a cached payload would not contain
+        if self.fetcher.response_cache is None or self.start_date is not None:
+            return None
+
+        start, finish = self.get_request_window(year_range)
+
+        return self.fetcher.response_cache.get_entry_key(
+            "nasapower",
+            self.grid.to_index(lat),
+            self.grid.to_index(lon),
+            start,
+            finish,
+            self.nasapower_climate_variables_string.split(",")
+        )
+
+    def decode_api_payload(self, payload):
+        """Decode a payload returned by NASA POWER's API straight into a ClimateSeries
+
+        The payload is parsed with the "orjson" package when it is available, which takes around half the time of
+        the standard json module, and the values of every climate variable are then converted to a typed array.
+
+        Args:
+            payload (bytes): the raw payload returned by NASA POWER's API
+
+        Raises:
+            ValueError: if the payload does not contain valid climate data
+
+        Returns:
+            tuple: a tuple consisting of (a) the coordinates of the payload (longitude, latitude, elevation) and (b) the ClimateSeries with all the daily values. The tuple is ordered as follows: (coordinates, climate_series)
+        """
+
+        try:
+            json_data = orjson.loads(payload) if orjson is not None else json.loads(payload)
+            coordinates = json_data['geometry']['coordinates']
+            parameters = json_data['properties']['parameter']
+
+            # All climate variables share the same days, which are keyed as YYYYMMDD
+            variable_codes = list(parameters.keys())
+            dates = list(parameters[variable_codes[0]].keys())
+            years = np.fromiter((int(x[:4:]) for x in dates), dtype=np.int64, count=len(dates))
+            values = np.column_stack([np.fromiter((parameters[x][y] for y in dates), dtype=np.float64, count=len(dates)) for x in variable_codes])
+
+        except Exception as e:
+            raise ValueError('Invalid payload ({}): {}'.format(e, payload[:500].decode('utf-8', errors='replace')))
+
+        return (coordinates, climate_series.ClimateSeries(years, values, variable_codes))
+
+    def get_regional_variable_groups(self):
+        """Split the requested climate variables into the groups sent in each regional request
+
+        Returns:
+            list: a list of lists of NASA POWER climate variable codes
+        """
+
+        variable_codes = self.nasapower_climate_variables_string.split(",")
+
+        return [variable_codes[x:x + self.regional_variables_per_request] for x in range(0, len(variable_codes), self.regional_variables_per_request)]
+
+    def get_regional_extent(self, indices, lower_limit, upper_limit):
+        """Obtain the bounds of a regional request along the latitude or longitude axis
+
+        Args:
+            indices (list): the latitude or longitude grid indices of the grid cells that must be included
+            lower_limit (float): the lowest valid coordinate along the axis, e.g. -90 for latitudes
+            upper_limit (float): the highest valid coordinate along the axis, e.g. 90 for latitudes
+
+        Returns:
+            tuple: a tuple consisting of (a) the lowest and (b) the highest coordinate of the bounding box along the axis. The tuple is ordered as follows: (first_coordinate, last_coordinate)
+        """
+
+        first_coordinate = self.grid.to_coordinate(min(indices))
+        last_coordinate = self.grid.to_coordinate(max(indices))
+
+        # The regional API rejects bounding boxes smaller than its minimum extent, those are enlarged
+        # by whole grid cells on both sides (and moved back inside the valid range if needed), so that
+        # the bounds remain on the centre of a grid cell
+        missing_extent = self.regional_min_extent - (last_coordinate - first_coordinate)
+        if missing_extent > 0:
+            padding = np.ceil(missing_extent / 2 / self.grid.resolution) * self.grid.resolution
+            first_coordinate -= padding
+            last_coordinate += padding
+            if first_coordinate < lower_limit:
+                last_coordinate += lower_limit - first_coordinate
+                first_coordinate = lower_limit
+            if last_coordinate > upper_limit:
+                first_coordinate -= last_coordinate - upper_limit
+                last_coordinate = upper_limit
+
+        return (round(first_coordinate, 2), round(last_coordinate, 2))
+
+    def get_regional_tiles(self, cells):
+        """Split the grid cells to be requested into the largest bounding boxes accepted by NASA POWER's regional API
+
+        The grid cells are tiled into squares of up to "regional_max_extent" degrees, starting from the
+        south-west corner of the requested area, and each tile is shrunk to the cells it actually contains.
+        Since the regional API only returns one climate variable per request, tiles holding fewer grid cells
+        than the amount of regional requests they would need are cheaper to request point by point.
+
+        Args:
+            cells (list): the (latitude index, longitude index) tuples of the grid cells, see ClimateGrid.to_index
+
+        Returns:
+            tuple: a tuple consisting of (a) a list of tiles, each one a tuple with its bounding box (lat_min, lat_max, lon_min, lon_max) and the list of grid cells inside it, and (b) the list of grid cells that should be requested point by point. The tuple is ordered as follows: (regional_tiles, point_cells)
+        """
+
+        if not cells:
+            return ([], [])
+
+        tile_size = int(round(self.regional_max_extent / self.grid.resolution))
+        first_lat_index = min(x[0] for x in cells)
+        first_lon_index = min(x[1] for x in cells)
+
+        tile_cells = {}
+        for cell in cells:
+            tile_cells.setdefault(((cell[0] - first_lat_index) // tile_size, (cell[1] - first_lon_index) // tile_size), []).append(cell)
+
+        requests_per_tile = len(self.get_regional_variable_groups())
+
+        regional_tiles = []
+        point_cells = []
+        for cells_in_tile in tile_cells.values():
+            if len(cells_in_tile) <= requests_per_tile:
+                point_cells.extend(cells_in_tile)
+                continue
+
+            lat_min, lat_max = self.get_regional_extent([x[0] for x in cells_in_tile], -90, 90)
+            lon_min, lon_max = self.get_regional_extent([x[1] for x in cells_in_tile], -180, 180)
+            regional_tiles.append(((lat_min, lat_max, lon_min, lon_max), cells_in_tile))
+
+        return (regional_tiles, point_cells)
+
+    def get_regional_api_payload(self, bounds, variable_codes, year_range):
+        """Build the query string parameters for a request to NASA POWER's daily regional API
+
+        Args:
+            bounds (tuple): the bounding box of the request (lat_min, lat_max, lon_min, lon_max), see get_regional_tiles
+            variable_codes (list): the NASA POWER codes of the climate variables to request
+            year_range (numpy.ndarray): a numpy array with all the years for which we are seeking data
+
+        Returns:
+            dict: the query string parameters
+        """
+
+        start, finish = self.get_request_window(year_range)
+        lat_min, lat_max, lon_min, lon_max = bounds
+
+        payload = {
+            "parameters": ",".join(variable_codes),
+            "latitude-min": lat_min,
+            "latitude-max": lat_max,
+            "longitude-min": lon_min,
+            "longitude-max": lon_max,
+            "start": start,
+            "end": finish,
+            "community": "ag",
+            "format": "json",
+            "user": "anonymous",
+            "header":"true",
+            "time-standard":"lst"
+        }
+
+        return payload
+
+    def get_regional_cache_key(self, bounds, variable_codes, year_range):
+        """Build the key identifying the payload for a bounding box in the response cache
+
+        Args:
+            bounds (tuple): the bounding box of the request (lat_min, lat_max, lon_min, lon_max), see get_regional_tiles
+            variable_codes (list): the NASA POWER codes of the requested climate variables
+            year_range (numpy.ndarray): a numpy array with all the years for which we are seeking data
+
+        Returns:
+            tuple: the key of the payload, see APIResponseCache.get_entry_key, or None when there is no response cache
+        """
+
+        if self.fetcher.response_cache is None or self.start_date is not None:
+            return None
+
+        start, finish = self.get_request_window(year_range)
+        lat_min, lat_max, lon_min, lon_max = bounds
+
+        return self.fetcher.response_cache.get_entry_key(
+            "nasapower-regional",
+            self.grid.to_index(lat_min),
+            self.grid.to_index(lon_min),
+            start,
+            finish,
+            variable_codes,
+            region=(self.grid.to_index(lat_max), self.grid.to_index(lon_max))
+        )
+
+    def decode_regional_payload(self, payload):
+        """Decode a payload returned by NASA POWER's regional API into typed arrays
+
+        The regional API returns a GeoJSON collection with one feature per grid cell of the bounding box, each
+        one holding the same days as a point payload. The payload is parsed with the "orjson" package when it is
+        available, see decode_api_payload.
+
+        Args:
+            payload (bytes): the raw payload returned by NASA POWER's regional API
+
+        Raises:
+            ValueError: if the payload does not contain valid climate data
+
+        Returns:
+            tuple: a tuple consisting of (a) an array of shape (grid cell, 3) with the longitude, latitude and elevation of every grid cell, (b) the year of every day, (c) an array of shape (grid cell, day, climate variable) with the daily values and (d) the climate variable codes. The tuple is ordered as follows: (coordinates, years, values, variable_codes)
+        """
+
+        try:
+            features = (orjson.loads(payload) if orjson is not None else json.loads(payload))['features']
+
+            coordinates = []
+            values = []
+            variable_codes = None
+            dates = None
+
+            for feature in features:
+                parameters = feature['properties']['parameter']
+                if variable_codes is None:
+                    # All grid cells share the same climate variables and days (keyed as YYYYMMDD)
+                    variable_codes = list(parameters.keys())
+                    dates = list(parameters[variable_codes[0]].keys())
+
+                # The elevation may be missing from the coordinates of a grid cell
+                coordinates.append((list(feature['geometry']['coordinates']) + [np.nan] * 3)[:3])
+                values.append(np.column_stack([np.fromiter((parameters[x][y] for y in dates), dtype=np.float64, count=len(dates)) for x in variable_codes]))
+
+            if variable_codes is None:
+                raise ValueError("IncompletePayload")
+
+            years = np.fromiter((int(x[:4:]) for x in dates), dtype=np.int64, count=len(dates))
+
+        except Exception as e:
+            raise ValueError('Invalid payload ({}): {}'.format(e, payload[:500].decode('utf-8', errors='replace')))
+
+        return (np.array(coordinates, dtype=np.float64), years, np.stack(values), variable_codes)
+
+    def get_regional_array(self, decoded_payloads):
+        """Combine the regional payloads of a bounding box (one per group of climate variables) into a single array
+
+        Args:
+            decoded_payloads (list): the payloads returned by decode_regional_payload for the same bounding box and days
+
+        Raises:
+            ValueError: if the payloads do not cover the same days
+
+        Returns:
+            tuple: a tuple consisting of (a) the year of every day, (b) the latitude axis, (c) the longitude axis, (d) an array of shape (lat, lon) with the elevation of every grid cell, (e) an array of shape (time, lat, lon, climate variable) with the daily values and (f) the climate variable codes. The tuple is ordered as follows: (years, lat_axis, lon_axis, elevations, values, variable_codes)
+        """
+
+        years = decoded_payloads[0][1]
+        lat_axis = np.unique(np.concatenate([x[0][:, 1] for x in decoded_payloads]))
+        lon_axis = np.unique(np.concatenate([x[0][:, 0] for x in decoded_payloads]))
+        variable_count = sum(len(x[3]) for x in decoded_payloads)
+
+        # Grid cells missing from a payload are left as NaN, and requested point by point later on
+        values = np.full((len(years), len(lat_axis), len(lon_axis), variable_count), np.nan)
+        elevations = np.full((len(lat_axis), len(lon_axis)), np.nan)
+        variable_codes = []
+
+        for coordinates, payload_years, payload_values, payload_codes in decoded_payloads:
+            if len(payload_years) != len(years):
+                raise ValueError('Regional payloads do not cover the same days')
+
+            lat_positions = np.searchsorted(lat_axis, coordinates[:, 1])
+            lon_positions = np.searchsorted(lon_axis, coordinates[:, 0])
+
+            values[:, lat_positions, lon_positions, len(variable_codes):len(variable_codes) + len(payload_codes)] = payload_values.transpose(1, 0, 2)
+            elevations[lat_positions, lon_positions] = np.where(np.isnan(coordinates[:, 2]), elevations[lat_positions, lon_positions], coordinates[:, 2])
+            variable_codes.extend(payload_codes)
+
+        return (years, lat_axis, lon_axis, elevations, values, variable_codes)
+
+    def fetch_regional_series(self, regional_tiles, year_range):
+        """Request a group of bounding boxes from NASA POWER's regional API concurrently and split them into the series of each grid cell
+
+        Args:
+            regional_tiles (list): the tiles to request, see get_regional_tiles
+            year_range (numpy.ndarray): a numpy array with all the years for which we are seeking data
+
+        Returns:
+            dict: a dictionary where keys are the (latitude index, longitude index) tuples of the grid cells and values are (coordinates, ClimateSeries) tuples, the same as returned by decode_api_payload. Grid cells whose tile could not be obtained are left out, so that they are requested point by point.
+        """
+
+        variable_groups = self.get_regional_variable_groups()
+
+        api_responses = self.fetcher.fetch_payloads(
+            [((tile_position, group_position), self.nasapower_regional_api_url, self.get_regional_api_payload(bounds, variable_group, year_range), self.get_regional_cache_key(bounds, variable_group, year_range))
+                for tile_position, (bounds, cells_in_tile) in enumerate(regional_tiles) for group_position, variable_group in enumerate(variable_groups)],
+            payload_decoder=self.decode_regional_payload
+        )
+
+        regional_series = {}
+
+        for tile_position, (bounds, cells_in_tile) in enumerate(regional_tiles):
+            tile_responses = [api_responses.get((tile_position, x)) for x in range(len(variable_groups))]
+
+            try:
+                failed_responses = [x for x in tile_responses if not isinstance(x, tuple)]
+                if failed_responses:
+                    raise failed_responses[0]
+                years, lat_axis, lon_axis, elevations, values, tile_variable_codes = self.get_regional_array(tile_responses)
+            except Exception as e:
+                self.logger.warning('Could not obtain the region Lat {} to {} - Lon {} to {}, its grid cells will be requested one at a time: {}'.format(*bounds, e))
+                continue
+
+            for cell in cells_in_tile:
+                cell_lat = self.grid.to_coordinate(cell[0])
+                cell_lon = self.grid.to_coordinate(cell[1])
+
+                # The grid cell is matched with the nearest grid cell returned by the regional API
+                lat_position = int(np.argmin(np.abs(lat_axis - cell_lat)))
+                lon_position = int(np.argmin(np.abs(lon_axis - cell_lon)))
+                if abs(lat_axis[lat_position] - cell_lat) > self.grid.resolution or abs(lon_axis[lon_position] - cell_lon) > self.grid.resolution:
+                    continue
+
+                cell_values = values[:, lat_position, lon_position, :]
+                if np.isnan(cell_values).all():
+                    continue
+
+                # Coordinates are those of the requested grid cell, so that get_yearly_data recognises the series
+                regional_series[cell] = (
+                    [cell_lon, cell_lat, elevations[lat_position, lon_position]],
+                    climate_series.ClimateSeries(years, cell_values, tile_variable_codes)
+                )
+
+        return regional_series
+
+    def get_yearly_data(self, lat, lon, year, year_range, climate_variable):
+        """Extract values from NASA POWER's API
 
         Args:
             lat (float): the latitude that values should be returned for
             lon (float): the longitude that values should be returned for
-            value_array (xarray.Dataset): the xarray Dataset object to extract values from
             year (string): the year of the file
             variable_short_name (string): the climate variable name
 
@@ -116,128 +555,109 @@ class NASAPowerClimateDataConnector():
         else: 
             days = np.arange(0,365,1)
 
-        # If we are attempting to read from NasaPower, use it's API instead of Xarray
-        if self.input_path is None:
-            
-            self.logger.info("Extracting data from NASA POWER Climate DataBase")
+        self.logger.info("Extracting data from NASA POWER Climate DataBase")
+
+        try:
+            # Attempt to fetch the information from currently available data from a previous API call
+            # Check if the coordinates in the available data are different than those being requested
+            current_lon, current_lat, current_elev = self.climate_metadata_coordinates
+            current_lat = np.round(current_lat, decimals=2) # Need to round values since NASA POWER API returns approximative numbers with 5 decimals
+            current_lon = np.round(current_lon, decimals=2) # Need to round values since NASA POWER API returns approximative numbers with 5 decimals
+            current_elev = np.round(current_elev, decimals=2)
+
+            # Coordinates are compared on their integer grid indices rather than as floats
+            if (self.grid.to_index(current_lat) != self.grid.to_index(lat)) or (self.grid.to_index(current_lon) != self.grid.to_index(lon)):
+                raise ValueError("InvalidCoordinatesInData")
+
+        # If no current_data available, then proceed to call NasaPower API
+        except:
+            self.logger.debug("Need to get data from the NASA Power Cloud")
+
+            # Every point inside a grid cell returns the same data, so the centre of the cell is requested
+            cell_lat = self.grid.to_coordinate(self.grid.to_index(lat))
+            cell_lon = self.grid.to_coordinate(self.grid.to_index(lon))
+            payload = self.get_api_payload(cell_lat, cell_lon, year_range)
 
             try:
-                # Attempt to fetch the information from currently available data from a previous API call
-                # Check if the coordinates in the available data are different than those being requested
-                current_lon, current_lat, current_elev = self.climate_metadata_coordinates
-                current_lat = np.round(current_lat, decimals=2) # Need to round values since NASA POWER API returns approximative numbers with 5 decimals
-                current_lon = np.round(current_lon, decimals=2) # Need to round values since NASA POWER API returns approximative numbers with 5 decimals
-                current_elev = np.round(current_elev, decimals=2)
-
-                if (current_lat != lat) or (current_lon != lon):
-                    raise ValueError("InvalidCoordinatesInData")
-
-            # If no current_data available, then proceed to call NasaPower API
-            except:
-                self.logger.debug("Need to get data from the NASA Power Cloud")
-
-                # Obtaining start and end years for API call
-                year_start = year_range[0]
-                year_end = year_range[len(year_range)-1]
-
-                nasapower_api_url = "https://power.larc.nasa.gov/api/temporal/daily/point"
-                
-                payload = {
-                    "request": "execute",
-                    "tempAverage": "DAILY",
-                    "identifier": "SinglePoint",
-                    "parameters": self.nasapower_climate_variables_string,
-                    "latitude": lat,
-                    "longitude": lon,
-                    "start": "{}0101".format(year_start),
-                    "end": "{}1231".format(year_end),
-                    "community": "ag",
-                    "format": "json",
-                    "user": "anonymous",
-                    "header":"true",
-                    "time-standard":"lst"
+                coordinates, decoded_series = self.fetcher.fetch_payload(self.nasapower_api_url, payload, cache_key=self.get_cache_key(cell_lat, cell_lon, year_range), payload_decoder=self.decode_api_payload)
+            except Exception as e:
+                # The request was already retried by the fetcher, the point is skipped for this run only
+                raise ConnectionError('Could not obtain data for Lat {} Lon {} from NASA POWER: {}'.format(lat, lon, e))
+
+            # Shape of data returned by NasaPower V2 (Original Bestiapop was written based on NASAPOWER API V1).
+            # NASAPOWER API V2 has changed a little bit the JSON structure and name of PRECTOT by PRECTOTCORR.
+            '''
+                {
+                'type': 'Feature', 
+                'geometry': {
+                'type': 'Point', 
+                'coordinates': [
+                145.5, 
+                -41.15, 
+                173.75
+                ]
+                }, 
+                'properties': {
+                'parameter': {
+                'ALLSKY_SFC_SW_DWN': {
+                '20160101': 28.56, 
+                '20160102': 26.17
+                ...
+                }, 
+                'T2M_MAX': {
+                '20160101': 26.89, 
+                '20160102': 20.3
+                ...}, 
+                'T2M_MIN': {
+                '20160101': 16.97, 
+                '20160102': 15.45
+                ...}, 
+                'PRECTOTCORR': {
+                '20160101': 0.01, 
+                '20160102': 0.13
+                ...}
+                }
+                }, 
+                'header': {
+                'title': 'NASA/POWER CERES/MERRA2 Native Resolution Daily Data', 
+                'api': {
+                'version': 'v2.2.15', 
+                'name': 'POWER Daily API'
+                }, 
+                'fill_value': -999.0, 
+                'start': '20160101', 
+                'end': '20171231'
+                }, 
+                'messages': [], 
+                'parameters': {
+                'ALLSKY_SFC_SW_DWN': {'units': 'MJ/m^2/day','longname': 'All Sky Surface Shortwave Downward Irradiance'}, 
+                'T2M_MAX': {'units': 'C', 'longname': 'Temperature at 2 Meters Maximum'}, 
+                'T2M_MIN': {'units': 'C', 'longname': 'Temperature at 2 Meters Minimum'}, 
+                'PRECTOTCORR': {'units': 'mm/day', 'longname': 'Precipitation Corrected'}}, 
+                'times': {
+                'data': 2.03, 
+                'process': 0.02
                 }
+                }
+            '''
+
+            # Capture all the climate variables inside this class object to not have to repeat calls to the cloud API
+            self.climate_series = decoded_series
+            self.climate_metadata_coordinates = coordinates
+            if self.start_date is not None:
+                self.climate_series.drop_trailing_missing_days(missing_below=-98)
+
+        # Proceed to extract the values for each day in the year, the payload was already converted to columnar form
+        translated_climate_variable = self._Translate_Climate_Var(climate_variable)
+        data_values = np.array(self.climate_series.get_year_values(translated_climate_variable, year))
 
-                r = requests.get(nasapower_api_url, params=payload)
-                json_data = r.json()
-
-                # Shape of data returned by NasaPower V2 (Original Bestiapop was written based on NASAPOWER API V1).
-                # NASAPOWER API V2 has changed a little bit the JSON structure and name of PRECTOT by PRECTOTCORR.
-                '''
-                    {
-                    'type': 'Feature', 
-                    'geometry': {
-                    'type': 'Point', 
-                    'coordinates': [
-                    145.5, 
-                    -41.15, 
-                    173.75
-                    ]
-                    }, 
-                    'properties': {
-                    'parameter': {
-                    'ALLSKY_SFC_SW_DWN': {
-                    '20160101': 28.56, 
-                    '20160102': 26.17
-                    ...
-                    }, 
-                    'T2M_MAX': {
-                    '20160101': 26.89, 
-                    '20160102': 20.3
-                    ...}, 
-                    'T2M_MIN': {
-                    '20160101': 16.97, 
-                    '20160102': 15.45
-                    ...}, 
-                    'PRECTOTCORR': {
-                    '20160101': 0.01, 
-                    '20160102': 0.13
-                    ...}
-                    }
-                    }, 
-                    'header': {
-                    'title': 'NASA/POWER CERES/MERRA2 Native Resolution Daily Data', 
-                    'api': {
-                    'version': 'v2.2.15', 
-                    'name': 'POWER Daily API'
-                    }, 
-                    'fill_value': -999.0, 
-                    'start': '20160101', 
-                    'end': '20171231'
-                    }, 
-                    'messages': [], 
-                    'parameters': {
-                    'ALLSKY_SFC_SW_DWN': {'units': 'MJ/m^2/day','longname': 'All Sky Surface Shortwave Downward Irradiance'}, 
-                    'T2M_MAX': {'units': 'C', 'longname': 'Temperature at 2 Meters Maximum'}, 
-                    'T2M_MIN': {'units': 'C', 'longname': 'Temperature at 2 Meters Minimum'}, 
-                    'PRECTOTCORR': {'units': 'mm/day', 'longname': 'Precipitation Corrected'}}, 
-                    'times': {
-                    'data': 2.03, 
-                    'process': 0.02
-                    }
-                    }
-                '''
-
-                # Capture all the climate variables inside this class object to not have to repeat calls to the cloud API
-                self.climate_metadata_coordinates = json_data['geometry']['coordinates']
-                self.climate_data = json_data['properties']['parameter']
-
-            # Proceed to extract the values into a list for each day in the year
-            translated_climate_variable = self._Translate_Climate_Var(climate_variable)
-            data_values = [self.climate_data[translated_climate_variable][x] for x in self.climate_data[translated_climate_variable] if int(x[:4:]) == year]
-
-            #data_values = [np.round(current_data[x], decimals=1) for x in current_data if x[:4:] == year]
-
-        # If we are not extracting data directly from the cloud, then proceed to extract locally from NetCDF4 files
-        elif self.input_path is not None:
-            # Using a list comprehension to capture all daily values for the given year and lat/lon combinations
-            # We round values to a single decimal
-            self.logger.debug("Reading array data from NetCDF with xarray")
-
-            data_values = [np.round(x, decimals=1) for x in value_array[climate_variable].sel(lat=lat, lon=lon).values]
-
-            # closing handle to xarray DataSet
-            value_array.close()
+        # The first and last years of the series may be incomplete (incremental updates start after the
+        # last day already present in the climate files, and the current year is still ongoing), so the
+        # values are lined up with the days of the year they belong to
+        first_day = self.start_date.timetuple().tm_yday - 1 if (self.start_date is not None and year == self.start_date.year) else 0
+        days = days[first_day:first_day + len(data_values)]
+
+        #data_values = [np.round(current_data[x], decimals=1) for x in current_data if x[:4:] == year]
 
         # We have captured all 365 or 366 values, however, they could all be NaN (non existent)
         # If this is the case, skip it
@@ -246,7 +666,7 @@ class NASAPowerClimateDataConnector():
         # We assume that, if the first value is "NaN" then the rest of the 364 values will also be null
         # data_values = [x for x in data_values if np.isnan(x) != True]
 
-        if np.isnan(data_values[1]) == True:
+        if len(data_values) > 0 and np.isnan(data_values[min(1, len(data_values) - 1)]) == True:
             data_values = []
 
         # We need to get the total amount of values collected
@@ -281,7 +701,7 @@ class NASAPowerClimateDataConnector():
 
         return df
 
-    def generate_climate_dataframe_from_nasapower_cloud_api(self, year_range, climate_variables, lat_range, lon_range, input_dir):
+    def generate_climate_dataframe_from_nasapower_cloud_api(self, year_range, climate_variables, lat_range, lon_range, input_dir, start_date=None):
         """This function generates a dataframe containing (a) climate values (b) for every variable requested (c) for every day of the year (d) for every year passed in as argument. It will leverage NASAPOWER API to do it.
 
         Args:
@@ -290,6 +710,7 @@ class NASAPowerClimateDataConnector():
             lat_range (numpy.ndarray): a numpy array of latitude values to extract data from
             lon_range (numpy.ndarray): a numpy array of longitude values to extract data from
             input_dir (str): when selecting the option to generate Climate Data Files from local directories, this parameter must be specified, otherwise data will be fetched directly from the cloud either via an available API or S3 bucket.
+            start_date (datetime.date, optional): when provided, only the days from this date onwards are requested from the API, which is how existing climate files are updated (see UpdateManifest). Defaults to None (whole years are requested).
 
         Returns:
             tuple: a tuple consisting of (a) the final dataframe containing values for all years, latitudes and longitudes for a particular climate variable, (b) the curated list of longitude ranges (which excludes all those lon values where there were no actual data points). The tuple is ordered as follows: (final_dataframe, final_lon_range)
@@ -307,21 +728,112 @@ class NASAPowerClimateDataConnector():
         # empty df to append all the climate_df to
         total_climate_df = pd.DataFrame()
 
-        # create an empty list to keep track of lon coordinates
-        # where there are no values
-        empty_lon_coordinates = []
-
-        # Now iterating over lat and lon combinations
-        # Each year-lat-lon matrix generates a different file
-        for lat in tqdm(lat_range, file=sys.stdout, ascii=True, desc="Total Progress"):
-
-            for lon in lon_range:
-
-                if lon in empty_lon_coordinates:
+        # When only the days missing from existing climate files are needed, the years before
+        # the first missing day (and the years that have not started yet) are not requested at all
+        self.start_date = start_date
+        if start_date is not None:
+            year_range = np.array([x for x in year_range if start_date.year <= x <= date.today().year])
+            if len(year_range) == 0:
+                self.logger.info('There are no days to request after {}'.format(start_date))
+                return (total_climate_df, np.empty(0))
+
+        # create an empty set to keep track of lat/lon combinations
+        # where there are no values, and another one for the lon
+        # coordinates where at least one latitude has values
+        empty_cells = set()
+        lons_with_data = set()
+
+        # lat/lon combinations whose data could not be obtained from the API, even after retrying
+        unreachable_cells = set()
+
+        # Map all coordinates to integer grid indices once, so that
+        # the loops below never need to compare floats
+        lat_indices = np.atleast_1d(self.grid.to_index(lat_range)).tolist()
+        lon_indices = np.atleast_1d(self.grid.to_index(lon_range)).tolist()
+
+        # Build the list of lat/lon combinations that need to be queried. NASA POWER covers the whole globe and
+        # never reports a location as having no data, so there are no known empty cells to skip (see ValidCellMask)
+        cells_to_fetch = []
+        for lat_index, lat in enumerate(lat_range):
+            for lon_index, lon in enumerate(lon_range):
+                cell = (lat_indices[lat_index], lon_indices[lon_index])
+                cells_to_fetch.append((cell, lat, lon))
+
+        # NASA POWER returns the exact same data for every point inside one of its 0.5 x 0.5 degree grid
+        # cells, so the lat/lon combinations are grouped by cell and each cell is requested only once,
+        # at its centre, with the parsed series shared among all the points falling inside it.
+        # This also makes the response cache key identical for every point of a cell.
+        cell_points = {}
+        for cell, lat, lon in cells_to_fetch:
+            cell_points.setdefault(cell, []).append((lat, lon))
+        unique_cells = list(cell_points.keys())
+
+        if len(unique_cells) < len(cells_to_fetch):
+            self.logger.info('{} lat/lon combinations fall within {} distinct grid cells, each cell will be requested once'.format(len(cells_to_fetch), len(unique_cells)))
+
+        # The API requests are issued concurrently, one batch of cells at a time so that
+        # only a batch worth of responses is kept in memory before being parsed
+        batch_size = self.fetcher.max_concurrency * 4
+
+        # In regional mode most grid cells are obtained through bounding box requests, a few tiles at a time
+        # (each tile needs one request per group of climate variables), and the rest are requested point by point
+        if self.api_mode == "regional":
+            regional_tiles, point_cells = self.get_regional_tiles(unique_cells)
+            self.logger.info('{} grid cells will be requested within {} regions, {} grid cells point by point'.format(len(unique_cells) - len(point_cells), len(regional_tiles), len(point_cells)))
+        else:
+            regional_tiles, point_cells = ([], unique_cells)
+
+        tiles_per_batch = max(1, self.fetcher.max_concurrency // len(self.get_regional_variable_groups()))
+        request_batches = [("regional", regional_tiles[x:x + tiles_per_batch]) for x in range(0, len(regional_tiles), tiles_per_batch)]
+        request_batches += [("point", point_cells[x:x + batch_size]) for x in range(0, len(point_cells), batch_size)]
+
+        # Dataframes for every lat/lon/variable/year combination, concatenated once at the end
+        climate_dfs = []
+
+        progress_bar = tqdm(total=len(cells_to_fetch), file=sys.stdout, ascii=True, desc="Total Progress")
+
+        for batch_mode, batch_items in request_batches:
+
+            if batch_mode == "regional":
+                batch = [cell for bounds, cells_in_tile in batch_items for cell in cells_in_tile]
+                api_responses = self.fetch_regional_series(batch_items, year_range)
+            else:
+                batch = batch_items
+                api_responses = self.fetcher.fetch_payloads(
+                    [(cell, self.nasapower_api_url, self.get_api_payload(cell_lat, cell_lon, year_range), self.get_cache_key(cell_lat, cell_lon, year_range))
+                        for cell, cell_lat, cell_lon in [(x, self.grid.to_coordinate(x[0]), self.grid.to_coordinate(x[1])) for x in batch]],
+                    payload_decoder=self.decode_api_payload
+                )
+
+            # Now iterating over lat and lon combinations
+            # Each year-lat-lon matrix generates a different file
+            for cell, lat, lon in [(x, lat, lon) for x in batch for lat, lon in cell_points[x]]:
+
+                progress_bar.update(1)
+
+                # Seed the data used by get_yearly_data with the response fetched for the grid cell of this
+                # lat/lon combination. If the concurrent request failed, get_yearly_data will query the API
+                # again on its own (and re-use that response for the other points of the same cell).
+                api_response = api_responses.get(cell)
+                if isinstance(api_response, tuple):
+                    self.climate_metadata_coordinates, self.climate_series = api_response
+                    if self.start_date is not None:
+                        self.climate_series.drop_trailing_missing_days(missing_below=-98)
+                elif isinstance(api_response, requests.exceptions.RequestException):
+                    # The request was already retried by the fetcher, there is no point in trying again
+                    self.logger.warning("Lat {} Lon {} will be skipped, its data could not be obtained: {}".format(lat, lon, api_response))
                     continue
+                else:
+                    self.logger.debug('Concurrent request for Lat {} - Lon {} failed: {}'.format(lat, lon, api_response))
+
+                # Dataframes for this lat/lon combination, only kept if its data could be obtained
+                point_dfs = []
 
                 for climate_variable in climate_variables:
 
+                    if cell in empty_cells or cell in unreachable_cells:
+                        break
+
                     self.logger.debug('Processing data for climate variable {}'.format(climate_variable))
 
                     # Loading and/or Downloading the files
@@ -337,22 +849,36 @@ class NASAPowerClimateDataConnector():
                         # with an error, we skip this loop and don't produce any output files
 
                         try:
-                            var_year_lat_lon_df = self.get_yearly_data(lat, lon, None, year, year_range, climate_variable)                          
+                            var_year_lat_lon_df = self.get_yearly_data(lat, lon, year, year_range, climate_variable)
+
+                        except ConnectionError as e:
+                            self.logger.warning("Lat {} Lon {} will be skipped, its data could not be obtained: {}".format(lat, lon, e))
+                            # The cell is not marked as empty, its data may well be available next time
+                            unreachable_cells.add(cell)
+                            break
 
                         except ValueError:
-                            self.logger.warning("This longitude value will be skipped for the rest of the climate variables and years")
-                            self.logger.warning("Deleting lon {} in array position {}".format(lon, np.where(lon_range == lon)[0][0]))
-                            # Append empty lon value to list
-                            empty_lon_coordinates.append(lon)
-                            continue
-                        
-                        # delete the var_year_lat_lon_df back to zero.
-                        total_climate_df = total_climate_df.append(var_year_lat_lon_df)
+                            self.logger.warning("Lat {} Lon {} will be skipped for the rest of the climate variables and years".format(lat, lon))
+                            # Append empty lat/lon combination to list
+                            empty_cells.add(cell)
+                            break
+
+                        point_dfs.append(var_year_lat_lon_df)
                         del var_year_lat_lon_df
 
-        # Remove any empty lon values from longitude array so as to avoid empty MET generation
-        empty_lon_array = np.array(empty_lon_coordinates)
-        final_lon_range = np.setdiff1d(lon_range, empty_lon_array)
+                # Partial data for a lat/lon combination that could not be obtained in full is discarded
+                if point_dfs and cell not in unreachable_cells:
+                    lons_with_data.add(cell[1])
+                    climate_dfs.extend(point_dfs)
+
+        progress_bar.close()
+        self.fetcher.log_latency_stats()
+
+        if climate_dfs:
+            total_climate_df = pd.concat(climate_dfs, ignore_index=True)
+
+        # Remove any lon values without data for all latitudes from longitude array so as to avoid empty MET generation
+        final_lon_range = np.unique(np.asarray(lon_range)[np.isin(lon_indices, list(lons_with_data))])
 
         # Return results in a touple
         return (total_climate_df, final_lon_range)
\ No newline at end of file
@@ -1,5 +1,6 @@
 import h5netcdf
 import io
+import json
 import logging
 import numpy as np
 import multiprocessing as mp
@@ -11,19 +12,40 @@ import s3fs
 import sys
 import xarray as xr
 
+from datetime import date
 from tqdm import tqdm
 
+# orjson is an optional dependency, when available API payloads are parsed with it instead of the json module
+try:
+    import orjson
+except ModuleNotFoundError:
+    orjson = None
+
+# Ugly but workable importing solution so that the package can be both 
+# imported as a package, run from commandline with `python -m bestiapop`
+# or from the source directory as `python bestiapop.py`
+if "bestiapop" in sys.modules:
+    from bestiapop.common import (api_fetcher, climate_grid, climate_series, rate_limiter, valid_cell_mask)
+else:
+    from common import (api_fetcher, climate_grid, climate_series, rate_limiter, valid_cell_mask)
+
 class SILOClimateDataConnector():
     """This class will provide methods that query and parse data from SILO climate database
 
         Args:
             logger (str): A pointer to an initialized Argparse logger
             data_source (str): The climate database where the values are being extracted from: SILO or NASAPOWER
+            api_concurrency (int, optional): the maximum number of requests sent to SILO's API at the same time. Defaults to 8.
+            response_cache (APIResponseCache, optional): the cache used to store the payloads returned by the API. Defaults to None (no caching).
+            api_rate_limit (float, optional): the average amount of requests per second sent to SILO's API by all the connectors of the process (or of all the worker processes of a pool, see AdaptiveRateLimiter.create_process_shared_state). None or 0 disables rate limiting. Defaults to 10.
+            api_format (str, optional): the format SILO's API is asked to return the data in: "json" or "csv". CSV payloads are several times smaller and are parsed with pandas.read_csv. Defaults to "json".
 
     """
 
+    # SILO's DataDrill API endpoint
+    silo_api_url = "https://www.longpaddock.qld.gov.au/cgi-bin/silo/DataDrillDataset.php"
 
-    def __init__(self, climate_variables, data_source="silo", input_path=None):
+    def __init__(self, climate_variables, data_source="silo", input_path=None, api_concurrency=8, response_cache=None, api_format="json", api_rate_limit=10):
 
         # Setup logging
         # We need to pass the "logger" to any Classes or Modules that may use it 
@@ -53,6 +75,20 @@ class SILOClimateDataConnector():
         self.data_source = data_source
         self.input_path = input_path
         self.climate_variables = climate_variables
+        self.grid = climate_grid.ClimateGrid("silo")
+        self.api_concurrency = api_concurrency
+        self.api_format = api_format
+
+        # First day requested from the API when only the days missing from existing climate files are needed
+        self.start_date = None
+
+        # All API requests share the fetcher's pool of keep-alive connections, and all the
+        # connectors of the process share the same rate limiter for SILO's API
+        self.fetcher = api_fetcher.ConcurrentAPIFetcher(
+            max_concurrency=api_concurrency,
+            response_cache=response_cache,
+            rate_limiter=rate_limiter.AdaptiveRateLimiter.get_shared("silo", requests_per_second=api_rate_limit, max_concurrency=api_concurrency)
+        )
 
         # Setup Climate Variable Code Translations
         # SILO Climate variable dict
@@ -85,13 +121,189 @@ class SILOClimateDataConnector():
         # Define a lambda for quick identification of the right index for a particular dict in a list
         self._Obtain_Index_Of_Dict_In_List = lambda dict_list, climate_var: [i for i, dict_data in enumerate(dict_list) if dict_data['variable_code'] == climate_var][0]
 
-    def get_yearly_data(self, lat, lon, value_array, year, year_range, climate_variable):
-        """Extract values from an API endpoint in the cloud or a xarray.Dataset object
+    def get_request_window(self, year_range):
+        """Obtain the first and last day requested from SILO's DataDrill API
+
+        Args:
+            year_range (numpy.ndarray): a numpy array with all the years for which we are seeking data
+
+        Returns:
+            tuple: a tuple consisting of (a) the first day and (b) the last day, both as YYYYMMDD. The tuple is ordered as follows: (start, finish)
+        """
+
+        start = "{}0101".format(year_range[0])
+        finish = "{}1231".format(year_range[len(year_range)-1])
+
+        # Incremental updates only request the days after the last one already
+        # present in the climate files, and never request days in the future
+        if self.start_date is not None:
+            start = self.start_date.strftime("%Y%m%d")
+            finish = min(finish, date.today().strftime("%Y%m%d"))
+
+        return (start, finish)
+
+    def get_api_payload(self, lat, lon, year_range):
+        """Build the query string parameters for a request to SILO's DataDrill API
+
+        Args:
+            lat (float): the latitude that values should be returned for
+            lon (float): the longitude that values should be returned for
+            year_range (numpy.ndarray): a numpy array with all the years for which we are seeking data
+
+        Returns:
+            dict: the query string parameters
+        """
+
+        # Obtaining start and end days for API call
+        start, finish = self.get_request_window(year_range)
+
+        payload = {
+            "lat": lat,
+            "lon": lon,
+            "start": start,
+            "finish": finish,
+            "format": self.api_format,
+            "username": "bestiapop",
+            "password": "gui",
+            "comment": self.silo_climate_variables_string
+        }
+
+        return payload
+
+    def get_cache_key(self, lat, lon, year_range):
+        """Build the key identifying the payload for a lat/lon combination in the response cache
+
+        Args:
+            lat (float): the latitude that values should be returned for
+            lon (float): the longitude that values should be returned for
+            year_range (numpy.ndarray): a numpy array with all the years for which we are seeking data
+
+        Returns:
+            tuple: the key of the payload, see APIResponseCache.get_entry_key, or None when there is no response cache
+        """
+
+        # Incremental updates are after the days that were just published, which a cached payload would not contain
+        if self.fetcher.response_cache is None or self.start_date is not None:
+            return None
+
+        start, finish = self.get_request_window(year_range)
+
+        # Payloads in different formats are cached separately
+        return self.fetcher.response_cache.get_entry_key(
+            "silo" if self.api_format == "json" else "silo-{}".format(self.api_format),
+            self.grid.to_index(lat),
+            self.grid.to_index(lon),
+            start,
+            finish,
+            # SILO identifies every climate variable with a single letter
+            list(self.silo_climate_variables_string)
+        )
+
+    def decode_api_payload(self, payload):
+        """Decode a payload returned by SILO's API straight into a ClimateSeries, according to the format the data was requested in
+
+        Args:
+            payload (bytes): the raw payload returned by SILO's API
+
+        Raises:
+            ValueError: if the payload does not contain valid climate data, for example when SILO returns an error message as plain text
+
+        Returns:
+            tuple: a tuple consisting of (a) the location metadata (latitude, longitude, etc.) and (b) the ClimateSeries with all the daily values. The tuple is ordered as follows: (location_metadata, climate_series)
+        """
+
+        if self.api_format == "csv":
+            return self.decode_csv_payload(payload)
+
+        return self.decode_json_payload(payload)
+
+    def decode_csv_payload(self, payload):
+        """Decode a CSV payload returned by SILO's API into a ClimateSeries
+
+        The CSV format contains one row per day, with the latitude and longitude, the date (in a "YYYY-MM-DD"
+        column) and, for every climate variable, a column with its value and another one with its source.
+        Only the columns that are needed are parsed, using pandas.read_csv.
+
+        Args:
+            payload (bytes): the raw payload returned by SILO's API
+
+        Raises:
+            ValueError: if the payload does not contain valid climate data, for example when SILO returns an error message as plain text
+
+        Returns:
+            tuple: a tuple consisting of (a) the location metadata (latitude and longitude) and (b) the ClimateSeries with all the daily values. The tuple is ordered as follows: (location_metadata, climate_series)
+        """
+
+        try:
+            header = payload.split(b"\n", 1)[0].decode('utf-8').strip().split(",")
+            date_column = [x for x in header if x.upper() in ("YYYY-MM-DD", "DATE")][0]
+            variable_codes = [x for x in dict.fromkeys(self.climate_variables) if x in header]
+
+            if not variable_codes:
+                raise ValueError("NoClimateVariablesInPayload")
+
+            climate_df = pd.read_csv(
+                io.BytesIO(payload),
+                usecols=["latitude", "longitude", date_column] + variable_codes,
+                dtype={date_column: str},
+                na_values=["", "NaN", "nan"]
+            )
+
+            if climate_df.empty:
+                raise ValueError("NoDataInPayload")
+
+            location_metadata = {"latitude": float(climate_df["latitude"].iloc[0]), "longitude": float(climate_df["longitude"].iloc[0])}
+            years = climate_df[date_column].str.slice(0, 4).astype(np.int64).values
+            values = climate_df[variable_codes].to_numpy(dtype=np.float64)
+
+        except Exception as e:
+            # Errors like "Silo is unable to supply data for Latitude..." are returned as plain text
+            raise ValueError('Invalid payload ({}): {}'.format(e, payload[:500].decode('utf-8', errors='replace')))
+
+        return (location_metadata, climate_series.ClimateSeries(years, values, variable_codes))
+
+    def decode_json_payload(self, payload):
+        """Decode a JSON payload returned by SILO's API straight into a ClimateSeries
+
+        The payload is parsed with the "orjson" package when it is available, which takes around half the time of
+        the standard json module, and the values of all the daily records are then collected in a single pass.
+
+        Args:
+            payload (bytes): the raw payload returned by SILO's API
+
+        Raises:
+            ValueError: if the payload does not contain valid climate data, for example when SILO returns an error message as plain text
+
+        Returns:
+            tuple: a tuple consisting of (a) the location metadata (latitude, longitude, elevation, etc.) and (b) the ClimateSeries with all the daily values. The tuple is ordered as follows: (location_metadata, climate_series)
+        """
+
+        try:
+            json_data = orjson.loads(payload) if orjson is not None else json.loads(payload)
+            location_metadata = json_data['location']
+            daily_records = json_data['data']
+
+            # The index of the variable data inside the 'variables' element of the returned json is always
+            # the same for the same variable across all dates. Obtain once from first element and re-use.
+            variable_codes = [x['variable_code'] for x in daily_records[0]['variables']]
+            years = np.fromiter((int(x['date'][:4:]) for x in daily_records), dtype=np.int64, count=len(daily_records))
+
+            # All the values are collected in a flat list (missing values, sent as null, become NaN) and then reshaped,
+            # which fails if any daily record does not hold the same amount of variables
+            values = np.array([y['value'] for x in daily_records for y in x['variables']], dtype=np.float64).reshape(len(daily_records), len(variable_codes))
+
+        except Exception as e:
+            # Errors like "Silo is unable to supply data for Latitude..." are returned as plain text
+            raise ValueError('Invalid payload ({}): {}'.format(e, payload[:500].decode('utf-8', errors='replace')))
+
+        return (location_metadata, climate_series.ClimateSeries(years, values, variable_codes))
+
+    def get_yearly_data(self, lat, lon, year, year_range, climate_variable):
+        """Extract values from SILO's API
 
         Args:
             lat (float): the latitude that values should be returned for
             lon (float): the longitude that values should be returned for
-            value_array (xarray.Dataset): the xarray Dataset object to extract values from
             year (string): the year of the file
             variable_short_name (string): the climate variable short name as per SILO nomenclature, see https://www.longpaddock.qld.gov.au/silo/about/climate-variables/
 
@@ -102,7 +314,7 @@ class SILOClimateDataConnector():
             pandas.core.frame.DataFrame: a dataframe containing 5 columns: the Julian day, the grid data value for that day, the year, the latitude, the longitude.
         """
 
-        # This function will use xarray to extract a slice of time data for a combination of lat and lon values
+        # This function will use SILO's API to extract a slice of time data for a combination of lat and lon values
 
         # Checking if this is a leap-year  
         if (( year%400 == 0) or (( year%4 == 0 ) and ( year%100 != 0))):
@@ -110,107 +322,92 @@ class SILOClimateDataConnector():
         else: 
             days = np.arange(0,365,1)
 
-        # If we are attempting to read from the cloud, use SILO's API instead of Xarray
-        if self.input_path is None:
+        self.logger.debug("Extracting data from SILO API")
 
-            self.logger.debug("Extracting data from SILO API")
+        try:
+            # Attempt to fetch the information from currently available data from a previous API call
+            # Check if the coordinates in the available data are different than those being requested
+            # Coordinates are compared on their integer grid indices rather than as floats
+            current_lat = self.grid.to_index(float(self.climate_metadata['latitude']))
+            current_lon = self.grid.to_index(float(self.climate_metadata['longitude']))
 
-            try:
-                # Attempt to fetch the information from currently available data from a previous API call
-                # Check if the coordinates in the available data are different than those being requested
-                current_lat = float(self.climate_metadata['latitude'])
-                current_lon = float(self.climate_metadata['longitude'])
-
-                if (current_lat != float(lat)) or (current_lon != float(lon)):
-                    raise ValueError("InvalidCoordinatesInData")
-
-            except:
-
-                # If we get here, then either the self.climate_data variable does not exist
-                # or the data stored in the object is not relevant for the year being queried right now. 
-                # We need to fetch data from the cloud using SILO's API again.
-
-                try:
-                    self.logger.debug("Need to get data from SILO Cloud")
-
-                    # Obtaining start and end years for API call
-                    year_start = year_range[0]
-                    year_end = year_range[len(year_range)-1]
-
-                    payload = {
-                        "lat": lat,
-                        "lon": lon,
-                        "start": "{}0101".format(year_start),
-                        "finish": "{}1231".format(year_end),
-                        "format": "json",
-                        "username": "bestiapop",
-                        "password": "gui",
-                        "comment": self.silo_climate_variables_string
-                    }
-                    
-                    silo_api_url = "https://www.longpaddock.qld.gov.au/cgi-bin/silo/DataDrillDataset.php"
-                    r = requests.get(silo_api_url, params=payload)
-                    json_data = r.json()
-                    
-                    # The shape of returned data from SILO is: 
-                    '''
-                        {
-                        'location': {
-                            'latitude': -41.1,
-                            'longitude': 145.1,
-                            'elevation': 153.9,
-                            'reference': 'XNR'
-                        },
-                        'extracted': 20200821,
-                        'data': [
-                            {   'date': '2011-01-01',
-                                'variables': [
-                                    {'source': 25, 'value': 0.0, 'variable_code': 'daily_rain'},
-                                    {'source': 25, 'value': 19.7, 'variable_code': 'max_temp'},
-                                    {'source': 25, 'value': 11.0, 'variable_code': 'min_temp'}
-                                ]
-                            },
-                            {   'date': '2011-01-02',
-                                'variables': [
-                                    {'source': 25, 'value': 0.0, 'variable_code': 'daily_rain'},
-                                    {'source': 25, 'value': 17.8, 'variable_code': 'max_temp'},
-                                    {'source': 25, 'value': 8.8, 'variable_code': 'min_temp'}
-                                ]
-                            },
-                            {   'date': '2011-01-03',
-                                'variables': [
-                                    {'source': 25, 'value': 0.0, 'variable_code': 'daily_rain'},
-                                    {'source': 25, 'value': 19.8, 'variable_code': 'max_temp'},
-                                    {'source': 25, 'value': 5.7, 'variable_code': 'min_temp'}
-                                ]
-                            }...
-                    '''
-
-                    self.climate_metadata = json_data['location']
-                    self.climate_data = json_data['data']
-                
-                except Exception as e:
-                    self.logger.error(r.text)
-                    if re.match("Silo is unable to supply data for Latitude", r.text):
-                        self.logger.error(r.text)
-                        self.logger.error(e)
+            if (current_lat != self.grid.to_index(lat)) or (current_lon != self.grid.to_index(lon)):
+                raise ValueError("InvalidCoordinatesInData")
 
-            # The index of the variable data inside the 'variables' element of the returned json is always
-            # the same for the same variable across all dates. Obtain once from first element and re-use.
-            i = self._Obtain_Index_Of_Dict_In_List(self.climate_data[0]['variables'], climate_variable)
-            data_values = [np.round(x['variables'][i]['value'], decimals=1) for x in self.climate_data if int(x['date'][:4:]) == year]
+        except:
+
+            # If we get here, then either the self.climate_data variable does not exist
+            # or the data stored in the object is not relevant for the year being queried right now. 
+            # We need to fetch data from the cloud using SILO's API again.
 
-        # If we are not extracting data directly from the cloud, then proceed to extract locally from NetCDF4 files
-        elif self.input_path is not None:
-            # Using a list comprehension to capture all daily values for the given year and lat/lon combinations
-            # We round values to a single decimal
-            self.logger.debug("Reading array data from NetCDF with xarray")
+            try:
+                self.logger.debug("Need to get data from SILO Cloud")
 
-            # Alternatively: data_values = [np.round(x, decimals=1) for x in (value_array[variable_short_name].loc[dict(lat=lat, lon=lon)]).values]
-            data_values = [np.round(x, decimals=1) for x in value_array[climate_variable].sel(lat=lat, lon=lon).values]
+                payload = self.get_api_payload(lat, lon, year_range)
 
-            # closing handle to xarray DataSet
-            value_array.close()
+                location_metadata, decoded_series = self.fetcher.fetch_payload(self.silo_api_url, payload, cache_key=self.get_cache_key(lat, lon, year_range), payload_decoder=self.decode_api_payload)
+                
+                # The shape of returned data from SILO is: 
+                '''
+                    {
+                    'location': {
+                        'latitude': -41.1,
+                        'longitude': 145.1,
+                        'elevation': 153.9,
+                        'reference': 'XNR'
+                    },
+                    'extracted': 20200821,
+                    'data': [
+                        {   'date': '2011-01-01',
+                            'variables': [
+                                {'source': 25, 'value': 0.0, 'variable_code': 'daily_rain'},
+                                {'source': 25, 'value': 19.7, 'variable_code': 'max_temp'},
+                                {'source': 25, 'value': 11.0, 'variable_code': 'min_temp'}
+                            ]
+                        },
+                        {   'date': '2011-01-02',
+                            'variables': [
+                                {'source': 25, 'value': 0.0, 'variable_code': 'daily_rain'},
+                                {'source': 25, 'value': 17.8, 'variable_code': 'max_temp'},
+                                {'source': 25, 'value': 8.8, 'variable_code': 'min_temp'}
+                            ]
+                        },
+                        {   'date': '2011-01-03',
+                            'variables': [
+                                {'source': 25, 'value': 0.0, 'variable_code': 'daily_rain'},
+                                {'source': 25, 'value': 19.8, 'variable_code': 'max_temp'},
+                                {'source': 25, 'value': 5.7, 'variable_code': 'min_temp'}
+                            ]
+                        }...
+                '''
+
+                self.climate_series = decoded_series
+                self.climate_metadata = location_metadata
+                if self.start_date is not None:
+                    self.climate_series.drop_trailing_missing_days()
+            
+            except requests.exceptions.RequestException as e:
+                # The request was already retried by the fetcher, the point is skipped for this run only
+                raise ConnectionError('Could not obtain data for Lat {} Lon {} from SILO: {}'.format(lat, lon, e))
+
+            except Exception as e:
+                # Errors like "Silo is unable to supply data for Latitude..." are returned as plain text
+                # and are included in the exception raised when decoding the payload
+                self.logger.error(e)
+                if re.search("Silo is unable to supply data for Latitude", str(e)):
+                    raise ValueError('no_data_for_location')
+
+                # Never fall back to the data of a previously requested lat/lon combination
+                raise ConnectionError('Could not decode the data for Lat {} Lon {} returned by SILO: {}'.format(lat, lon, e))
+
+        # The payload was already converted to columnar form, the year is a single slice
+        data_values = np.round(self.climate_series.get_year_values(climate_variable, year), decimals=1)
+
+        # The first and last years of the series may be incomplete (incremental updates start after the
+        # last day already present in the climate files, and the current year is still ongoing), so the
+        # values are lined up with the days of the year they belong to
+        first_day = self.start_date.timetuple().tm_yday - 1 if (self.start_date is not None and year == self.start_date.year) else 0
+        days = days[first_day:first_day + len(data_values)]
 
         # We have captured all 365 or 366 values, however, they could all be NaN (non existent)
         # If this is the case, skip it
@@ -219,7 +416,7 @@ class SILOClimateDataConnector():
         # We assume that, if the first value is "NaN" then the rest of the 364 values will also be null
         # data_values = [x for x in data_values if np.isnan(x) != True]
 
-        if np.isnan(data_values[1]) == True:
+        if len(data_values) > 0 and np.isnan(data_values[min(1, len(data_values) - 1)]) == True:
             data_values = []
 
         # we need to get the total amount of values collected
@@ -250,7 +447,7 @@ class SILOClimateDataConnector():
 
         return df
 
-    def generate_climate_dataframe_from_silo_cloud_api(self, year_range, climate_variables, lat_range, lon_range, input_dir):
+    def generate_climate_dataframe_from_silo_cloud_api(self, year_range, climate_variables, lat_range, lon_range, input_dir, start_date=None):
         """This function generates a dataframe containing (a) climate values (b) for every variable requested (c) for every day of the year (d) for every year passed in as argument. It will leverage SILO API to do it.
 
         Args:
@@ -259,6 +456,7 @@ class SILOClimateDataConnector():
             lat_range (numpy.ndarray): a numpy array of latitude values to extract data from
             lon_range (numpy.ndarray): a numpy array of longitude values to extract data from
             input_dir (str): when selecting the option to generate Climate Data Files from local directories, this parameter must be specified, otherwise data will be fetched directly from the cloud either via an available API or S3 bucket.
+            start_date (datetime.date, optional): when provided, only the days from this date onwards are requested from the API, which is how existing climate files are updated (see UpdateManifest). Defaults to None (whole years are requested).
 
         Returns:
             tuple: a tuple consisting of (a) the final dataframe containing values for all years, latitudes and longitudes for a particular climate variable, (b) the curated list of longitude ranges (which excludes all those lon values where there were no actual data points). The tuple is ordered as follows: (final_dataframe, final_lon_range)
@@ -276,22 +474,93 @@ class SILOClimateDataConnector():
         # empty df to append all the climate_df to
         total_climate_df = pd.DataFrame()
 
-        # create an empty list to keep track of lon coordinates
-        # where there are no values
-        empty_lon_coordinates = []
+        # When only the days missing from existing climate files are needed, the years before
+        # the first missing day (and the years that have not started yet) are not requested at all
+        self.start_date = start_date
+        if start_date is not None:
+            year_range = np.array([x for x in year_range if start_date.year <= x <= date.today().year])
+            if len(year_range) == 0:
+                self.logger.info('There are no days to request after {}'.format(start_date))
+                return (total_climate_df, np.empty(0))
+
+        # create an empty set to keep track of lat/lon combinations
+        # where there are no values, and another one for the lon
+        # coordinates where at least one latitude has values
+        empty_cells = set()
+        lons_with_data = set()
+
+        # lat/lon combinations whose data could not be obtained from the API, even after retrying
+        unreachable_cells = set()
+
+        # Map all coordinates to integer grid indices once, so that
+        # the loops below never need to compare floats
+        lat_indices = np.atleast_1d(self.grid.to_index(lat_range)).tolist()
+        lon_indices = np.atleast_1d(self.grid.to_index(lon_range)).tolist()
+
+        # Load the cached mask of grid cells that contain data so that known empty cells are skipped without
+        # querying the API. Its grid is only used when it was built from a NetCDF4 file published in S3,
+        # which holds the same data as the API (see ValidCellMask)
+        cell_mask = valid_cell_mask.ValidCellMask("silo")
+        cell_mask.load()
+        use_mask_grid = cell_mask.has_cloud_grid()
+
+        # Build the list of lat/lon combinations that need to be queried, skipping the ones known to be empty
+        cells_to_fetch = []
+        for lat_index, lat in enumerate(lat_range):
+            for lon_index, lon in enumerate(lon_range):
+                cell = (lat_indices[lat_index], lon_indices[lon_index])
+                if cell_mask.is_valid_index(*cell, use_grid=use_mask_grid) == False:
+                    self.logger.debug('Skipping Lat {} - Lon {} since it is known to not contain any data'.format(lat, lon))
+                    continue
+                cells_to_fetch.append((cell, lat, lon))
+
+        # The API requests are issued concurrently, one batch at a time so that
+        # only a batch worth of responses is kept in memory before being parsed
+        batch_size = self.fetcher.max_concurrency * 4
+
+        # Dataframes for every lat/lon/year/variable combination, concatenated once at the end
+        climate_dfs = []
+
+        progress_bar = tqdm(total=len(cells_to_fetch), file=sys.stdout, ascii=True, desc="Fetching and Parsing Data")
+
+        for batch_start in range(0, len(cells_to_fetch), batch_size):
+            batch = cells_to_fetch[batch_start:batch_start + batch_size]
+
+            api_responses = self.fetcher.fetch_payloads(
+                [(cell, self.silo_api_url, self.get_api_payload(lat, lon, year_range), self.get_cache_key(lat, lon, year_range)) for cell, lat, lon in batch],
+                payload_decoder=self.decode_api_payload
+            )
 
-        # Now iterating over lat and lon combinations
-        # Each year-lat-lon matrix generates a different file
-        for lat in tqdm(lat_range, file=sys.stdout, ascii=True, desc="Fetching and Parsing Data"):
+            # Now iterating over lat and lon combinations
+            # Each year-lat-lon matrix generates a different file
+            for cell, lat, lon in batch:
 
-            for lon in lon_range:
+                progress_bar.update(1)
 
-                if lon in empty_lon_coordinates:
+                # Seed the data used by get_yearly_data with the response fetched for this lat/lon combination.
+                # If the concurrent request failed, get_yearly_data will query the API again on its own.
+                api_response = api_responses.get(cell)
+                if isinstance(api_response, tuple):
+                    self.climate_metadata, self.climate_series = api_response
+                    if self.start_date is not None:
+                        self.climate_series.drop_trailing_missing_days()
+                elif isinstance(api_response, requests.exceptions.RequestException):
+                    # The request was already retried by the fetcher, there is no point in trying again
+                    self.logger.warning("Lat {} Lon {} will be skipped, its data could not be obtained: {}".format(lat, lon, api_response))
                     continue
+                else:
+                    self.logger.debug('Concurrent request for Lat {} - Lon {} failed: {}'.format(lat, lon, api_response))
+                    self.climate_metadata = None
+
+                # Dataframes for this lat/lon combination, only kept if its data could be obtained
+                point_dfs = []
 
                 # Loading and/or Downloading the files
                 for year in year_range:
 
+                    if cell in empty_cells or cell in unreachable_cells:
+                        break
+
                     self.logger.debug('Processing data for year {}'.format(year))
 
                     for climate_variable in climate_variables:
@@ -304,31 +573,43 @@ class SILOClimateDataConnector():
                         # with an error, we skip this loop and don't produce any output files
 
                         try:
-                            var_year_lat_lon_df = self.get_yearly_data(lat, lon, None, year, year_range, climate_variable)
-
-                        except ValueError:
-                            self.logger.warning("This longitude value will be skipped for the rest of the climate variables and years")
-                            self.logger.warning("Deleting lon {} in array position {}".format(lon, np.where(lon_range == lon)[0][0]))
-                            # Append empty lon value to list
-                            empty_lon_coordinates.append(lon)
-                            continue
-                        
-                        # delete the var_year_lat_lon_df back to zero.
-                        total_climate_df = total_climate_df.append(var_year_lat_lon_df)
+                            var_year_lat_lon_df = self.get_yearly_data(lat, lon, year, year_range, climate_variable)
+
+                        except ConnectionError as e:
+                            self.logger.warning("Lat {} Lon {} will be skipped, its data could not be obtained: {}".format(lat, lon, e))
+                            # The cell is not marked as empty, its data may well be available next time
+                            unreachable_cells.add(cell)
+                            break
+
+                        except ValueError as e:
+                            self.logger.warning("Lat {} Lon {} will be skipped for the rest of the climate variables and years".format(lat, lon))
+                            # Append empty lat/lon combination to list. It is only remembered for future runs when SILO
+                            # reported that it has no data for the location, rather than e.g. a year without values yet
+                            empty_cells.add(cell)
+                            if str(e) == 'no_data_for_location':
+                                cell_mask.mark_invalid_index(*cell)
+                            break
+
+                        point_dfs.append(var_year_lat_lon_df)
                         del var_year_lat_lon_df
 
-            # We reached the end of the year loop
-            # We must close the open handle to the s3fs file to free up resources
-            if self.input_path is None:
-                try:
-                    self.remote_file_obj.close()
-                    self.logger.debug("Closed handle to cloud s3fs file {}".format(self.silo_file))
-                except AttributeError:
-                    self.logger.debug("Closing handle to remote s3fs file not required. Using an API endpoint instead of a cloud NetCDF4 file")
-
-        # Remove any empty lon values from longitude array so as to avoid empty MET generation
-        empty_lon_array = np.array(empty_lon_coordinates)
-        final_lon_range = np.setdiff1d(lon_range, empty_lon_array)
+                # Partial data for a lat/lon combination that could not be obtained in full is discarded
+                if point_dfs and cell not in unreachable_cells:
+                    lons_with_data.add(cell[1])
+                    climate_dfs.extend(point_dfs)
+
+        progress_bar.close()
+        self.fetcher.log_latency_stats()
+
+        if climate_dfs:
+            total_climate_df = pd.concat(climate_dfs, ignore_index=True)
+
+        # Cache any newly found empty cells
+        if cell_mask.modified == True:
+            cell_mask.save()
+
+        # Remove any lon values without data for all latitudes from longitude array so as to avoid empty MET generation
+        final_lon_range = np.unique(np.asarray(lon_range)[np.isin(lon_indices, list(lons_with_data))])
 
         # Return results in a touple
         return (total_climate_df, final_lon_range)
@@ -4,8 +4,10 @@ import numpy as np
 import os
 import pandas as pd
 import re
+import sys
 
 from datetime import datetime as datetime
+from datetime import date, timedelta
 from jinja2 import Template
 from numpy import array
 from pathlib import Path
@@ -13,6 +15,14 @@ from tabulate import tabulate
 
 from tqdm import tqdm
 
+# Ugly but workable importing solution so that the package can be both 
+# imported as a package, run from commandline with `python -m bestiapop`
+# or from the source directory as `python bestiapop.py`
+if "bestiapop" in sys.modules:
+    from bestiapop.common import climate_grid
+else:
+    from common import climate_grid
+
 class DATAOUTPUT():
     """This class will provide different methods for data output from climate dataframes
 
@@ -24,6 +34,10 @@ class DATAOUTPUT():
             DATAOUTPUT: A class object with access to DATAOUTPUT methods
     """
 
+    # Several requested lat/lon combinations can fall inside the same grid cell of the data source (NASAPOWER cells
+    # are 0.5 degrees wide), so the rows of each combination are told apart on a finer grid, in degrees
+    point_resolution = 0.0001
+
     def __init__(self, data_source):
 
         # Setup logging
@@ -52,12 +66,410 @@ class DATAOUTPUT():
         # Setting up class variables
         self.logger = logger
         self.data_source = data_source
+        self.grid = climate_grid.ClimateGrid(data_source)
+        self.point_grid = climate_grid.ClimateGrid(data_source, resolution=self.point_resolution)
         if 'bestiapop' in __name__:
             self.tqdm_enabled = True
         else:
             self.tqdm_enabled = False
         
-    def generate_output(self, final_daily_df, lat_range, lon_range, outputdir=None, output_type="met"):
+    def get_coordinate_slices(self, final_daily_df):
+        """Split a climate dataframe into one dataframe per lat/lon combination
+
+        Each lat/lon combination is identified by its integer indices on a grid finer than the one of
+        the data source (see ClimateGrid and point_resolution) instead of its float values, so that
+        combinations falling inside the same grid cell are kept apart, and the dataframe is split in a
+        single pass rather than filtering the whole dataframe once per lat/lon combination.
+
+        Args:
+            final_daily_df (pandas.core.frame.DataFrame): a pandas dataframe containing lat and lon columns
+
+        Returns:
+            dict: a dictionary where keys are (lon_index, lat_index) tuples, see get_coordinate_key, and values are the dataframe slices
+        """
+
+        lon_keys = self.point_grid.to_index(final_daily_df.lon.to_numpy())
+        lat_keys = self.point_grid.to_index(final_daily_df.lat.to_numpy())
+
+        return {(int(lon_key), int(lat_key)): coordinate_slice_df for (lon_key, lat_key), coordinate_slice_df in final_daily_df.groupby([lon_keys, lat_keys], sort=False)}
+
+    def get_coordinate_key(self, lat, lon):
+        """Build the key identifying a lat/lon combination in the dictionary returned by get_coordinate_slices
+
+        Args:
+            lat (float): the latitude
+            lon (float): the longitude
+
+        Returns:
+            tuple: a (lon_index, lat_index) tuple
+        """
+
+        return (self.point_grid.to_index(lon), self.point_grid.to_index(lat))
+
+    def get_station_lookup(self, coordinate_aliases=None):
+        """Build a dictionary to find the stations that were snapped to a grid cell
+
+        Args:
+            coordinate_aliases (dict, optional): a dictionary where keys are (lat, lon) tuples of grid cells and values are lists of (lat, lon) tuples of the stations that fall in each cell. Defaults to None.
+
+        Returns:
+            dict: a dictionary where keys are (lat_index, lon_index) tuples (see ClimateGrid) and values are the lists of station coordinates
+        """
+
+        if not coordinate_aliases:
+            return {}
+
+        return {(self.grid.to_index(lat), self.grid.to_index(lon)): stations for (lat, lon), stations in coordinate_aliases.items()}
+
+    def get_station_coordinates(self, lat, lon, station_lookup):
+        """Obtain the coordinates that output generated for a grid cell should be labelled with
+
+        Args:
+            lat (float): the latitude of the grid cell
+            lon (float): the longitude of the grid cell
+            station_lookup (dict): the dictionary returned by get_station_lookup
+
+        Returns:
+            list: a list of (lat, lon) tuples, one per station that falls in the grid cell, or the grid cell itself when there are no stations
+        """
+
+        return station_lookup.get((self.grid.to_index(lat), self.grid.to_index(lon)), [(lat, lon)])
+
+    def fan_out_dataframe(self, final_daily_df, station_lookup):
+        """Replicate the rows of every grid cell for each of the stations that fall in it, relabelling them with the station coordinates
+
+        Args:
+            final_daily_df (pandas.core.frame.DataFrame): a pandas dataframe containing lat and lon columns
+            station_lookup (dict): the dictionary returned by get_station_lookup
+
+        Returns:
+            pandas.core.frame.DataFrame: the fanned out dataframe, or the same dataframe when there are no stations
+        """
+
+        if not station_lookup:
+            return final_daily_df
+
+        station_dfs = []
+        for coordinate_slice_df in self.get_coordinate_slices(final_daily_df).values():
+            for station_lat, station_lon in self.get_station_coordinates(coordinate_slice_df.lat.iloc[0], coordinate_slice_df.lon.iloc[0], station_lookup):
+                station_dfs.append(coordinate_slice_df.assign(lat=station_lat, lon=station_lon))
+
+        return pd.concat(station_dfs, ignore_index=True)
+
+    def get_daily_output_dataframe(self, final_daily_df):
+        """Rename the climate variables to the names used by the output formats and obtain a single row per lat/lon/year/day combination
+
+        Dataframes built from local files already contain all the climate variables for a day in the same row, in
+        which case they only need to be sorted. Dataframes built from the cloud APIs contain one row per climate
+        variable and need to be combined first.
+
+        Args:
+            final_daily_df (pandas.core.frame.DataFrame): the pandas dataframe containing all the extracted values
+
+        Returns:
+            pandas.core.frame.DataFrame: a dataframe with the lon, lat, year, day, radn, maxt, mint and rain columns, sorted by lon, lat, year and day
+        """
+
+        final_daily_df = final_daily_df.rename(columns={"days": "day","daily_rain": "rain",'min_temp':'mint','max_temp':'maxt','radiation':'radn'})
+
+        key_columns = ['lon', 'lat', 'year', 'day']
+        value_columns = ['radn', 'maxt', 'mint', 'rain']
+
+        if final_daily_df.duplicated(subset=key_columns).any() == True:
+            return final_daily_df.groupby(key_columns)[value_columns].sum().reset_index()
+
+        # Missing values are set to 0, which is what the sum above does too
+        final_daily_df = final_daily_df[key_columns + value_columns].sort_values(key_columns).reset_index(drop=True)
+        final_daily_df[value_columns] = final_daily_df[value_columns].fillna(0)
+
+        return final_daily_df
+
+    def sort_daily_output_dataframe(self, daily_df):
+        """Sort a dataframe returned by get_daily_output_dataframe (or fanned out from it) by lon, lat, year and day
+
+        Args:
+            daily_df (pandas.core.frame.DataFrame): a dataframe with the lon, lat, year and day columns
+
+        Returns:
+            pandas.core.frame.DataFrame: the sorted dataframe
+        """
+
+        return daily_df.sort_values(['lon', 'lat', 'year', 'day'], kind='mergesort').reset_index(drop=True)
+
+    def get_date(self, year, day):
+        """Obtain the date of a day of the year
+
+        Args:
+            year (int): the year
+            day (int): the day of the year, starting at 1
+
+        Returns:
+            datetime.date: the date
+        """
+
+        return date(int(year), 1, 1) + timedelta(days=int(day) - 1)
+
+    def get_date_range(self, daily_df):
+        """Obtain the first and last day contained in a daily dataframe
+
+        Args:
+            daily_df (pandas.core.frame.DataFrame): a dataframe with year and day columns
+
+        Returns:
+            tuple: a tuple consisting of (a) the first day and (b) the last day, as datetime.date. The tuple is ordered as follows: (first_date, last_date)
+        """
+
+        day_keys = daily_df.year.to_numpy() * 1000 + daily_df.day.to_numpy()
+        first_key = int(day_keys.min())
+        last_key = int(day_keys.max())
+
+        return (self.get_date(first_key // 1000, first_key % 1000), self.get_date(last_key // 1000, last_key % 1000))
+
+    def get_new_days(self, daily_df, last_date):
+        """Select the rows of a daily dataframe that come after a given day
+
+        Args:
+            daily_df (pandas.core.frame.DataFrame): a dataframe with year and day columns
+            last_date (datetime.date): the last day already present in a climate file, or None if there is no climate file yet
+
+        Returns:
+            pandas.core.frame.DataFrame: the rows after last_date
+        """
+
+        if last_date is None:
+            return daily_df
+
+        last_key = last_date.year * 1000 + last_date.timetuple().tm_yday
+
+        return daily_df[daily_df.year * 1000 + daily_df.day > last_key]
+
+    def get_last_date_from_file(self, full_output_path, output_type):
+        """Obtain the last day contained in a MET or CSV climate file by reading its last lines only
+
+        Args:
+            full_output_path (pathlib.Path): the path to the climate file
+            output_type (str): the output type of the climate file: met or csv
+
+        Returns:
+            datetime.date: the last day contained in the climate file, or None if it could not be found
+        """
+
+        with open(full_output_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 4096))
+            last_lines = f.read().decode(errors='ignore').splitlines()
+
+        # CSV rows start with the lon and lat columns, MET rows with the year and day
+        year_position = 2 if output_type == "csv" else 0
+
+        for line in reversed(last_lines):
+            tokens = line.replace(",", " ").split()
+            try:
+                return self.get_date(int(float(tokens[year_position])), int(float(tokens[year_position + 1])))
+            except (IndexError, ValueError):
+                continue
+
+        return None
+
+    def get_last_date(self, outputdir, output_type, lat, lon, update_manifest):
+        """Obtain the last day contained in the climate file of a lat/lon combination
+
+        Args:
+            outputdir (pathlib.Path): the folder containing the climate files
+            output_type (str): the output type of the climate file: met, wth or csv
+            lat (float): the latitude of the climate file
+            lon (float): the longitude of the climate file
+            update_manifest (UpdateManifest): the manifest of the output folder
+
+        Returns:
+            datetime.date: the last day contained in the climate file, or None if there is no climate file yet
+        """
+
+        entry = update_manifest.get_entry(output_type, lat, lon)
+        if entry is not None:
+            return entry["last_date"]
+
+        # Climate files generated before the manifest existed are read directly.
+        # WTH files cannot be found without the manifest (their name depends on their years).
+        if output_type == "met":
+            full_output_path = outputdir/'{}-{}.met'.format(lat, lon)
+        elif output_type == "csv":
+            full_output_path = outputdir/'{}-{}.{}.csv'.format(lat, lon, self.data_source)
+        else:
+            return None
+
+        if full_output_path.is_file() == False:
+            return None
+
+        return self.get_last_date_from_file(full_output_path, output_type)
+
+    def get_update_start_date(self, outputdir, output_type, lat_range, lon_range, update_manifest, coordinate_aliases=None, cell_mask=None):
+        """Obtain the first day missing from the climate files of all the lat/lon combinations of a run
+
+        Args:
+            outputdir (pathlib.Path): the folder containing the climate files
+            output_type (str): the output type of the climate files: met, wth or csv
+            lat_range (numpy.ndarray): an array of latitude values
+            lon_range (numpy.ndarray): an array of longitude values
+            update_manifest (UpdateManifest): the manifest of the output folder
+            coordinate_aliases (dict, optional): the stations that were snapped to each grid cell, see generate_output. Defaults to None.
+            cell_mask (ValidCellMask, optional): the mask of grid cells known to contain data. Cells known to be empty never have a climate file, so they are ignored when their file does not exist. Defaults to None.
+
+        Returns:
+            datetime.date: the day after the earliest last day of all the climate files, or None if at least one of them does not exist yet (all days are needed)
+        """
+
+        station_lookup = self.get_station_lookup(coordinate_aliases)
+        last_dates = []
+
+        for lat in lat_range:
+            for lon in lon_range:
+                for station_lat, station_lon in self.get_station_coordinates(lat, lon, station_lookup):
+                    last_date = self.get_last_date(outputdir, output_type, station_lat, station_lon, update_manifest)
+                    if last_date is None:
+                        if cell_mask is not None and cell_mask.is_valid(lat, lon) == False:
+                            continue
+                        return None
+                    last_dates.append(last_date)
+
+        if not last_dates:
+            return None
+
+        return min(last_dates) + timedelta(days=1)
+
+    def read_met_data(self, full_output_path):
+        """Read the daily values contained in a MET file
+
+        Args:
+            full_output_path (pathlib.Path): the path to the MET file
+
+        Returns:
+            pandas.core.frame.DataFrame: a dataframe with the year, day, radn, maxt, mint and rain columns
+        """
+
+        with open(full_output_path, 'r') as f:
+            met_lines = f.read().splitlines()
+
+        # Daily values start right after the line with the units
+        units_position = next(i for i, x in enumerate(met_lines) if x.startswith("()"))
+
+        met_df = pd.read_csv(io.StringIO("\n".join(met_lines[units_position + 1:])), sep=r"\s+", header=None, names=['year', 'day', 'radn', 'maxt', 'mint', 'rain'])
+
+        return met_df.dropna(subset=['year', 'day']).astype({'year': int, 'day': int})
+
+    def read_wth_data(self, full_output_path, first_year):
+        """Read the daily values contained in a WTH file
+
+        Args:
+            full_output_path (pathlib.Path): the path to the WTH file
+            first_year (int): the first year contained in the WTH file, needed to resolve the two digit years of DSSAT dates
+
+        Returns:
+            pandas.core.frame.DataFrame: a dataframe with the dssatday, year, day, radn, maxt, mint and rain columns
+        """
+
+        with open(full_output_path, 'r') as f:
+            wth_lines = f.read().splitlines()
+
+        # Daily values start right after the "@DATE" header line
+        header_position = next(i for i, x in enumerate(wth_lines) if x.strip().startswith("@DATE"))
+
+        wth_df = pd.read_csv(io.StringIO("\n".join(wth_lines[header_position:])), sep=r"\s+", dtype={'@DATE': str}).dropna(subset=['@DATE'])
+        wth_df = wth_df.rename(columns={'@DATE':'dssatday', 'RAIN':'rain', 'TMIN':'mint', 'TMAX':'maxt', 'SRAD':'radn'})
+
+        # Dates are written as YYDDD, the century is worked out from the first year and
+        # moved forward every time the two digit year goes back (e.g. from 99 to 00)
+        dssat_dates = wth_df.dssatday.str.zfill(5)
+        short_years = dssat_dates.str.slice(0, 2).astype(int).to_numpy()
+        centuries = (first_year // 100) * 100 + 100 * np.concatenate(([0], np.cumsum(np.diff(short_years) < 0)))
+
+        wth_df['dssatday'] = dssat_dates
+        wth_df.insert(1, 'year', centuries + short_years)
+        wth_df.insert(2, 'day', dssat_dates.str.slice(2).astype(int).to_numpy())
+
+        return wth_df[['dssatday', 'year', 'day', 'radn', 'maxt', 'mint', 'rain']]
+
+    def merge_new_days(self, existing_df, daily_df):
+        """Append the days that come after the last day of an existing climate file to its daily values
+
+        Args:
+            existing_df (pandas.core.frame.DataFrame): the daily values of the existing climate file, or None if there is no climate file yet
+            daily_df (pandas.core.frame.DataFrame): the newly extracted daily values
+
+        Returns:
+            pandas.core.frame.DataFrame: the merged daily values, or None if there are no new days
+        """
+
+        if existing_df is None or existing_df.empty == True:
+            return daily_df
+
+        new_days_df = self.get_new_days(daily_df, self.get_date_range(existing_df)[1])
+
+        if new_days_df.empty == True:
+            return None
+
+        return pd.concat([existing_df, new_days_df[existing_df.columns]], ignore_index=True)
+
+    def update_met(self, outputdir, met_dataframe, lat, lon, update_manifest):
+        """Append the new days of a lat/lon combination to its MET file
+
+        The whole file is rewritten, since tav and amp are calculated from all the days it contains.
+
+        Args:
+            outputdir (pathlib.Path): the folder where the MET files are stored
+            met_dataframe (pandas.core.frame.DataFrame): the newly extracted daily values
+            lat (float): the latitude of the MET file
+            lon (float): the longitude of the MET file
+            update_manifest (UpdateManifest): the manifest of the output folder
+        """
+
+        full_output_path = outputdir/'{}-{}.met'.format(lat, lon)
+        existing_df = self.read_met_data(full_output_path) if full_output_path.is_file() == True else None
+
+        merged_df = self.merge_new_days(existing_df, met_dataframe)
+
+        if merged_df is None:
+            self.logger.debug('MET file {} is already up to date'.format(full_output_path))
+            merged_df = existing_df
+        else:
+            self.generate_met(outputdir, merged_df.copy(), lat, lon)
+
+        update_manifest.set_entry("met", lat, lon, full_output_path.name, *self.get_date_range(merged_df))
+
+    def update_wth(self, outputdir, wth_dataframe, lat, lon, update_manifest):
+        """Append the new days of a lat/lon combination to its WTH file
+
+        The whole file is rewritten, since tav and amp are calculated from all the days it contains and its name
+        depends on the years it contains. The previous file is removed when the name changes.
+
+        Args:
+            outputdir (pathlib.Path): the folder where the WTH files are stored
+            wth_dataframe (pandas.core.frame.DataFrame): the newly extracted daily values
+            lat (float): the latitude of the WTH file
+            lon (float): the longitude of the WTH file
+            update_manifest (UpdateManifest): the manifest of the output folder
+        """
+
+        entry = update_manifest.get_entry("wth", lat, lon)
+        existing_path = outputdir/entry["file"] if entry is not None else None
+        existing_df = None
+        if existing_path is not None and existing_path.is_file() == True:
+            existing_df = self.read_wth_data(existing_path, entry["first_date"].year)
+
+        merged_df = self.merge_new_days(existing_df, wth_dataframe)
+
+        if merged_df is None:
+            self.logger.debug('WTH file {} is already up to date'.format(existing_path))
+            return
+
+        full_output_path = self.generate_wth(outputdir, merged_df.copy(), lat, lon)
+
+        if existing_df is not None and existing_path != full_output_path:
+            os.remove(existing_path)
+
+        update_manifest.set_entry("wth", lat, lon, full_output_path.name, *self.get_date_range(merged_df))
+
+    def generate_output(self, final_daily_df, lat_range, lon_range, outputdir=None, output_type="met", coordinate_aliases=None, update_manifest=None):
         """Generate required Output based on Output Type selected
 
         Args:
@@ -66,9 +478,14 @@ class DATAOUTPUT():
             lon_range (numpy.ndarray): an array of longitude values to select from the final_daily_df
             outputdir (str): the folder that will be used to store the output files
             output_type (str, optional): the output type: csv (not implemented yet), json(not implemented yet), met. Defaults to "met".
+            coordinate_aliases (dict, optional): a dictionary where keys are (lat, lon) tuples of grid cells and values are lists of (lat, lon) tuples of the stations that were snapped to each cell. When provided, the output of a grid cell is generated once per station and labelled with the station coordinates. Defaults to None.
+            update_manifest (UpdateManifest, optional): when provided, existing MET, WTH and CSV files are updated with the days that come after their last day instead of being generated again, and the manifest is kept up to date. Defaults to None.
 
         """
 
+        # Stations (if any) that were snapped to each of the grid cells
+        station_lookup = self.get_station_lookup(coordinate_aliases)
+
         # Determine the variable that has the highest range so we can 
         # benefit from parallel processing when active, based on the
         # variable that can be allocated the highest ammount of cores
@@ -92,9 +509,9 @@ class DATAOUTPUT():
         if output_type == "stdout":
 
             # Rename df columns and sort them
-            final_daily_df = final_daily_df.rename(columns={"days": "day","daily_rain": "rain",'min_temp':'mint','max_temp':'maxt','radiation':'radn'})
+            final_daily_df = self.get_daily_output_dataframe(final_daily_df)
 
-            final_daily_df = final_daily_df.groupby(['lon', 'lat', 'year', 'day'])[['radn', 'maxt', 'mint', 'rain']].sum().reset_index()
+            coordinate_slices = self.get_coordinate_slices(final_daily_df)
 
             for primary_data_point in tqdm(primary_var, ascii=True, desc=primary_var_desc, disable=self.tqdm_enabled):
                 
@@ -107,18 +524,25 @@ class DATAOUTPUT():
                         lon = primary_data_point
                         lat = secondary_data_point
 
-                    coordinate_slice_df = final_daily_df[(final_daily_df.lon == lon) & (final_daily_df.lat == lat)]
+                    coordinate_slice_df = coordinate_slices.get(self.get_coordinate_key(lat, lon))
 
-                    # We shall output the plain final DataFrame to stdout using tabulate
-                    print("\n")
-                    print(tabulate(
-                                    coordinate_slice_df,
-                                    headers=coordinate_slice_df.keys(),
-                                    tablefmt='psql',
-                                    numalign='right',
-                                    stralign='right',
-                                    showindex=False))
-                    print("\n")
+                    # Skip lat/lon combinations without any data (e.g. ocean cells)
+                    if coordinate_slice_df is None:
+                        continue
+
+                    for station_lat, station_lon in self.get_station_coordinates(lat, lon, station_lookup):
+                        station_slice_df = coordinate_slice_df.assign(lat=station_lat, lon=station_lon)
+
+                        # We shall output the plain final DataFrame to stdout using tabulate
+                        print("\n")
+                        print(tabulate(
+                                        station_slice_df,
+                                        headers=station_slice_df.keys(),
+                                        tablefmt='psql',
+                                        numalign='right',
+                                        stralign='right',
+                                        showindex=False))
+                        print("\n")
 
         if output_type == "met":
             # Rename variables
@@ -129,11 +553,12 @@ class DATAOUTPUT():
 
             try:
                 # Rename df columns and sort them to match order expected by MET
-                final_daily_df = final_daily_df.rename(columns={"days": "day","daily_rain": "rain",'min_temp':'mint','max_temp':'maxt','radiation':'radn'})
-                final_daily_df = final_daily_df.groupby(['lon', 'lat', 'year', 'day'])[['radn', 'maxt', 'mint', 'rain']].sum().reset_index()
+                final_daily_df = self.get_daily_output_dataframe(final_daily_df)
 
                 self.logger.info("Proceeding to the generation of MET files")
 
+                coordinate_slices = self.get_coordinate_slices(final_daily_df)
+
                 for primary_data_point in tqdm(primary_var, ascii=True, desc=primary_var_desc, disable=self.tqdm_enabled):
                     
                     for secondary_data_point in tqdm(secondary_var, ascii=True, desc=secondary_var_desc, disable=self.tqdm_enabled):
@@ -145,11 +570,22 @@ class DATAOUTPUT():
                             lon = primary_data_point
                             lat = secondary_data_point
 
-                        coordinate_slice_df = final_daily_df[(final_daily_df.lon == lon) & (final_daily_df.lat == lat)]
-                        del coordinate_slice_df['lat']
-                        del coordinate_slice_df['lon']
+                        coordinate_slice_df = coordinate_slices.get(self.get_coordinate_key(lat, lon))
+
+                        # Skip lat/lon combinations without any data (e.g. ocean cells)
+                        if coordinate_slice_df is None:
+                            continue
+
+                        # The slice is shared with any other lookup of the same coordinates, so it is not modified in place
+                        coordinate_slice_df = coordinate_slice_df.drop(columns=['lat', 'lon'])
 
-                        self.generate_met(outputdir, coordinate_slice_df, lat, lon)
+                        for station_lat, station_lon in self.get_station_coordinates(lat, lon, station_lookup):
+                            if update_manifest is not None:
+                                self.update_met(outputdir, coordinate_slice_df, station_lat, station_lon, update_manifest)
+                                continue
+
+                            # generate_met adds columns to the dataframe it receives, so each station gets its own copy
+                            self.generate_met(outputdir, coordinate_slice_df.copy(), station_lat, station_lon)
 
                         # Delete unused df
                         del coordinate_slice_df
@@ -166,8 +602,7 @@ class DATAOUTPUT():
 
             try:
                 # Rename df columns and sort them to match order expected by DSSAT
-                final_daily_df = final_daily_df.rename(columns={"days": "day","daily_rain": "rain",'min_temp':'mint','max_temp':'maxt','radiation':'radn'})
-                final_daily_df = final_daily_df.groupby(['lon', 'lat', 'year', 'day'])[['radn', 'maxt', 'mint', 'rain']].sum().reset_index()
+                final_daily_df = self.get_daily_output_dataframe(final_daily_df)
 
                 # Let's generate DSSAT Year+JulianDay time format
                 # Creating pandas series with last two digits of the year
@@ -179,6 +614,8 @@ class DATAOUTPUT():
                 
                 self.logger.info("Proceeding to the generation of WTH files")
 
+                coordinate_slices = self.get_coordinate_slices(final_daily_df)
+
                 for primary_data_point in tqdm(primary_var, ascii=True, desc=primary_var_desc, disable=self.tqdm_enabled):
                     
                     for secondary_data_point in tqdm(secondary_var, ascii=True, desc=secondary_var_desc, disable=self.tqdm_enabled):
@@ -190,11 +627,22 @@ class DATAOUTPUT():
                             lon = primary_data_point
                             lat = secondary_data_point
 
-                        coordinate_slice_df = final_daily_df[(final_daily_df.lon == lon) & (final_daily_df.lat == lat)]
-                        del coordinate_slice_df['lat']
-                        del coordinate_slice_df['lon']
+                        coordinate_slice_df = coordinate_slices.get(self.get_coordinate_key(lat, lon))
+
+                        # Skip lat/lon combinations without any data (e.g. ocean cells)
+                        if coordinate_slice_df is None:
+                            continue
 
-                        self.generate_wth(outputdir, coordinate_slice_df, lat, lon)
+                        # The slice is shared with any other lookup of the same coordinates, so it is not modified in place
+                        coordinate_slice_df = coordinate_slice_df.drop(columns=['lat', 'lon'])
+
+                        for station_lat, station_lon in self.get_station_coordinates(lat, lon, station_lookup):
+                            if update_manifest is not None:
+                                self.update_wth(outputdir, coordinate_slice_df, station_lat, station_lon, update_manifest)
+                                continue
+
+                            # generate_wth adds columns to the dataframe it receives, so each station gets its own copy
+                            self.generate_wth(outputdir, coordinate_slice_df.copy(), station_lat, station_lon)
 
                         # Delete unused df
                         del coordinate_slice_df
@@ -206,9 +654,10 @@ class DATAOUTPUT():
             try:
 
                 # Rename df columns and sort them
-                final_daily_df = final_daily_df.rename(columns={"days": "day","daily_rain": "rain",'min_temp':'mint','max_temp':'maxt','radiation':'radn'})
+                final_daily_df = self.get_daily_output_dataframe(final_daily_df)
 
-                final_daily_df = final_daily_df.groupby(['lon', 'lat', 'year', 'day'])[['radn', 'maxt', 'mint', 'rain']].sum().reset_index()
+                # Relabel the rows of each grid cell with the coordinates of the stations that were snapped to it
+                final_daily_df = self.fan_out_dataframe(final_daily_df, station_lookup)
                 
                 return final_daily_df
 
@@ -226,9 +675,12 @@ class DATAOUTPUT():
                 try:
 
                     # Rename df columns and sort them
-                    final_daily_df = final_daily_df.rename(columns={"days": "day","daily_rain": "rain",'min_temp':'mint','max_temp':'maxt','radiation':'radn'})
+                    final_daily_df = self.get_daily_output_dataframe(final_daily_df)
+
+                    coordinate_slices = self.get_coordinate_slices(final_daily_df)
 
-                    final_daily_df = final_daily_df.groupby(['lon', 'lat', 'year', 'day'])[['radn', 'maxt', 'mint', 'rain']].sum().reset_index()
+                    # When updating, only the new days of every station are appended to the CSV files
+                    new_days_dfs = []
 
                     for primary_data_point in tqdm(primary_var, ascii=True, desc=primary_var_desc, disable=self.tqdm_enabled):
                         
@@ -241,19 +693,58 @@ class DATAOUTPUT():
                                 lon = primary_data_point
                                 lat = secondary_data_point
 
-                            coordinate_slice_df = final_daily_df[(final_daily_df.lon == lon) & (final_daily_df.lat == lat)]
+                            coordinate_slice_df = coordinate_slices.get(self.get_coordinate_key(lat, lon))
+
+                            # Skip lat/lon combinations without any data (e.g. ocean cells)
+                            if coordinate_slice_df is None:
+                                continue
+
+                            for station_lat, station_lon in self.get_station_coordinates(lat, lon, station_lookup):
+                                station_slice_df = coordinate_slice_df.assign(lat=station_lat, lon=station_lon)
+
+                                # Let's create a CSV for each lat/lon combination
+                                csv_file_name = '{}-{}.{}.csv'.format(station_lat, station_lon, self.data_source)
+                                full_output_path = outputdir/csv_file_name
 
-                            # Let's create a CSV for each lat/lon combination
-                            csv_file_name = '{}-{}.{}.csv'.format(lat, lon, self.data_source)
-                            full_output_path = outputdir/csv_file_name
-                            self.logger.debug('Writting CSV file {} to {}'.format(csv_file_name, full_output_path))
-                            coordinate_slice_df.to_csv(full_output_path, sep=',', index=False, mode='a', float_format='%.2f')
+                                if update_manifest is not None:
+                                    file_exists = full_output_path.is_file()
+                                    entry = update_manifest.get_entry("csv", station_lat, station_lon)
+                                    first_date = entry["first_date"] if entry is not None else None
+                                    last_date = self.get_last_date_from_file(full_output_path, "csv") if file_exists == True else None
+
+                                    station_slice_df = self.get_new_days(station_slice_df, last_date)
+
+                                    if station_slice_df.empty == False:
+                                        self.logger.debug('Appending {} days to CSV file {}'.format(len(station_slice_df), full_output_path))
+                                        station_slice_df.to_csv(full_output_path, sep=',', index=False, header=not file_exists, mode='a', float_format='%.2f')
+                                        new_days_dfs.append(station_slice_df)
+                                        if file_exists == False:
+                                            first_date = self.get_date_range(station_slice_df)[0]
+                                        last_date = self.get_date_range(station_slice_df)[1]
+
+                                    if last_date is not None:
+                                        update_manifest.set_entry("csv", station_lat, station_lon, csv_file_name, first_date, last_date)
+                                    continue
+
+                                self.logger.debug('Writting CSV file {} to {}'.format(csv_file_name, full_output_path))
+                                station_slice_df.to_csv(full_output_path, sep=',', index=False, mode='a', float_format='%.2f')
 
                     # Let's also create a CSV containing all the datapoints
                     csv_file_name = 'bestiapop-beastly-dataframe.csv'
                     full_output_path = outputdir/csv_file_name
+
+                    if update_manifest is not None:
+                        # The new days of all stations are added to it as well, and the combined file is sorted
+                        # again so rows are in the same order as in a file generated from scratch
+                        if new_days_dfs:
+                            self.logger.debug('Adding new days to BEAST DATAFRAME :) CSV file {}'.format(full_output_path))
+                            if full_output_path.is_file() == True:
+                                new_days_dfs.insert(0, pd.read_csv(full_output_path, sep=','))
+                            self.sort_daily_output_dataframe(pd.concat(new_days_dfs, ignore_index=True)).to_csv(full_output_path, sep=',', na_rep=np.nan, index=False, mode='w', float_format='%.2f')
+                        return
+
                     self.logger.debug('Writting BEAST DATAFRAME :) CSV file {} to {}'.format(csv_file_name, full_output_path))
-                    final_daily_df.to_csv(full_output_path, sep=',', na_rep=np.nan, index=False, mode='w', float_format='%.2f')
+                    self.sort_daily_output_dataframe(self.fan_out_dataframe(final_daily_df, station_lookup)).to_csv(full_output_path, sep=',', na_rep=np.nan, index=False, mode='w', float_format='%.2f')
 
                 except Exception as e:
                     self.logger.error(e)
@@ -266,6 +757,9 @@ class DATAOUTPUT():
             met_dataframe (pandas.core.frame.DataFrame): the pandas dataframe slice to convert to MET file
             lat (float): the latitude for which this MET file is being generated
             lon (float): the longitude for which this MET file is being generated
+
+        Returns:
+            pathlib.Path: the path to the generated MET file
         """
 
         # Creating final MET file
@@ -354,6 +848,8 @@ year day radn maxt mint rain
             self.logger.info('Writting MET file {}'.format(full_output_path))
             f.write(in_memory_met)
 
+        return full_output_path
+
     def generate_wth(self, outputdir, wth_dataframe, lat, lon):
         """Generate WTH File
 
@@ -362,6 +858,9 @@ year day radn maxt mint rain
             wth_dataframe (pandas.core.frame.DataFrame): the pandas dataframe slice to convert to WTH file
             lat (float): the latitude for which this WTH file is being generated
             lon (float): the longitude for which this WTH file is being generated
+
+        Returns:
+            pathlib.Path: the path to the generated WTH file
         """
 
         # Creating final WTH file
@@ -477,4 +976,6 @@ year day radn maxt mint rain
         full_output_path = outputdir/'{}{}{}{}.WTH'.format(flat, flon, fyear, fyear_len)
         with open(full_output_path, 'w+') as f:
             self.logger.info('Writting WTH file {}'.format(full_output_path))
-            f.write(in_memory_dssat)
\ No newline at end of file
+            f.write(in_memory_dssat)
+
+        return full_output_path
\ No newline at end of file
@@ -71,6 +71,7 @@ _KEYWORDS = [
 _INSTALLREQUIRES = [
     'coloredlogs>=10.0',
     'h5netcdf>=0.7.4',
+    'h5py>=2.10.0',
     'jinja2>=2.11.1',
     'numpy>=1.16.2',
     'pandas>=0.24.2',